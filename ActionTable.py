@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from logger import debug
+from Parameters import RL_ACTION_SPACE, TRANSMITTDE_POWER, GAIN_ANTENNA_T
+
+# 波束方向增益参数 (NewRewardCalculator 共用)
+BEAM_ROLLOFF_EXPONENT = 2
+ANGLE_PER_DIRECTION = 10
+
+
+def calculate_directional_gain(horizontal_dir, vertical_dir,
+                               angle_per_direction=ANGLE_PER_DIRECTION, rolloff_exponent=BEAM_ROLLOFF_EXPONENT):
+    """方向增益 cos^n(theta_h) * cos^n(theta_v)，支持标量与数组"""
+    theta_h_rad = np.deg2rad((horizontal_dir - 1) * angle_per_direction)
+    theta_v_rad = np.deg2rad((1 - vertical_dir) * angle_per_direction)
+    gain_h = np.cos(theta_h_rad) ** rolloff_exponent
+    gain_v = np.cos(theta_v_rad) ** rolloff_exponent
+    return gain_h * gain_v
+
+
+class ActionTable:
+    """
+    动作查找表
+
+    动作空间固定为 RL_ACTION_SPACE (beam, h_dir, v_dir, power) 的笛卡尔积，
+    因此每个动作的波束数、功率比例、方向增益与总发射功率都可以预先算好，
+    按动作编号索引 (NumPy 数组)，动作 -> 编号 的映射为 O(1) 字典查询。
+    """
+
+    def __init__(self, action_space=RL_ACTION_SPACE, transmit_power=TRANSMITTDE_POWER, antenna_gain=GAIN_ANTENNA_T):
+        self.actions = action_space
+        self.components = np.array(action_space, dtype=np.int64).reshape(-1, 4)
+        self.num_actions = len(self.components)
+
+        self.beam_count = self.components[:, 0] + 1
+        self.horizontal_dir = self.components[:, 1]
+        self.vertical_dir = self.components[:, 2]
+        self.power_ratio = (self.components[:, 3] + 1) / 10.0
+        self.directional_gain = calculate_directional_gain(self.horizontal_dir, self.vertical_dir)
+        self.tx_power = transmit_power * self.power_ratio * self.beam_count * self.directional_gain * antenna_gain
+
+        self._action_to_index = {tuple(action): i for i, action in enumerate(self.components.tolist())}
+        debug(f"ActionTable built: {self.num_actions} actions")
+
+    def __len__(self):
+        return self.num_actions
+
+    def index_of(self, action):
+        """
+        动作 (list/tuple) -> 动作编号
+
+        Raises:
+            KeyError: 动作为 None 或不在动作空间中 ("无动作" 由调用方自行处理)
+        """
+        index = self._action_to_index.get(tuple(action)) if action is not None else None
+        if index is None:
+            raise KeyError(f"Unknown action {action!r}")
+        return index
+
+    def indices_of(self, actions):
+        """动作列表 -> 动作编号数组"""
+        return np.array([self.index_of(action) for action in actions], dtype=np.int64)
+
+    def decode(self, action):
+        """
+        动作 -> (总发射功率 W, 方向增益, 功率比例)
+
+        Args:
+            action: 动作 (list/tuple) 或动作编号
+        """
+        index = action if isinstance(action, (int, np.integer)) else self.index_of(action)
+        return self.tx_power[index], self.directional_gain[index], self.power_ratio[index]
+
+
+# 全局动作查找表实例
+global_action_table = ActionTable()
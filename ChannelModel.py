@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
+import math
+import time
 import numpy as np
 import torch
-from logger import debug, debug_print
+from logger import debug, debug_print, set_debug_mode
 from Parameters import (
     CENTER_FREQUENCY, ANTENNA_HEIGHT_BS, ANTENNA_HEIGHT_UE,
     PATH_LOSS_A, PATH_LOSS_B, PATH_LOSS_C, SHADOWING_STD,
     SYSTEM_BANDWIDTH, NOISE_POWER_DENSITY, BOLTZMANN_CONSTANT,
-    NOISE_TEMPERATURE
+    NOISE_TEMPERATURE, SCENE_SCALE_X, SCENE_SCALE_Y,
+    USE_PATH_LOSS_TABLE, PATH_LOSS_TABLE_MAX_ERROR_DB
 )
 
 class UMiNLOSChannel:
@@ -23,6 +26,12 @@ class UMiNLOSChannel:
         self.path_loss_C = PATH_LOSS_C
         self.shadowing_std = SHADOWING_STD
 
+        # 与距离无关的常数项 (频率 / 天线高度在一次运行中固定)，只计算一次
+        # 22.4 + 21.3*log10(fc) - 0.3*(h_UT - 1.5)
+        self._pl_constant_db = (self.path_loss_B +
+                                self.path_loss_C * np.log10(self.center_frequency / 1e9) -
+                                0.3 * (self.antenna_height_ue - 1.5))
+
         # 系统带宽 (毫米波典型带宽)
         self.system_bandwidth = SYSTEM_BANDWIDTH
 
@@ -31,8 +40,59 @@ class UMiNLOSChannel:
         self.boltzmann_constant = BOLTZMANN_CONSTANT
         self.temperature = NOISE_TEMPERATURE
 
+        # 确定性路径损耗查表 (可选)
+        self._pl_table = None
+        if USE_PATH_LOSS_TABLE:
+            self.enable_path_loss_table(PATH_LOSS_TABLE_MAX_ERROR_DB)
+
         debug("UMiNLOSChannel initialized with 28GHz UMi NLOS model")
 
+    def enable_path_loss_table(self, max_error_db=PATH_LOSS_TABLE_MAX_ERROR_DB, d_min=1.0, d_max=None):
+        """
+        启用确定性路径损耗查表模式
+
+        在 [d_min, d_max] 上建立均匀距离网格，查表时线性插值。
+        PL(d) = A*log10(d) + const 的二阶导数 |PL''| = A / (ln10 * d^2) 在 d_min 处最大，
+        线性插值误差 <= h^2 / 8 * |PL''|max，由此反推满足 max_error_db 的网格步长 h。
+        超出网格范围的距离自动回退到解析公式。
+
+        Args:
+            max_error_db: 插值误差上界 (dB)
+            d_min: 网格起点 (m)
+            d_max: 网格终点 (m)，默认取场景 3D 对角线
+        """
+        if max_error_db <= 0:
+            raise ValueError("max_error_db must be positive")
+        if d_max is None:
+            d_max = np.sqrt(SCENE_SCALE_X ** 2 + SCENE_SCALE_Y ** 2 +
+                            (self.antenna_height_bs - self.antenna_height_ue) ** 2)
+
+        max_curvature = self.path_loss_A / (np.log(10) * d_min ** 2)
+        step = np.sqrt(8 * max_error_db / max_curvature)
+        num_points = int(np.ceil((d_max - d_min) / step)) + 1
+        grid = np.linspace(d_min, d_max, num_points)
+        values = self._analytic_deterministic_path_loss(grid)
+
+        self._pl_table = {
+            'd_min': float(d_min),
+            'inv_step': float((num_points - 1) / (d_max - d_min)),
+            'num_points': num_points,
+            'values': values,
+            'values_list': values.tolist(),  # 标量查表使用纯 Python 访问，避免 NumPy 标量开销
+            'max_error_db': float(max_error_db),
+        }
+
+        # 校验: 网格中点处的实际误差
+        midpoints = (grid[:-1] + grid[1:]) / 2
+        actual_error = np.max(np.abs(self._table_deterministic_path_loss(midpoints) -
+                                     self._analytic_deterministic_path_loss(midpoints)))
+        debug(f"Path loss table enabled: {num_points} points over [{d_min:.1f}, {d_max:.1f}]m, "
+              f"max interpolation error {actual_error:.2e}dB (bound {max_error_db:.2e}dB)")
+
+    def disable_path_loss_table(self):
+        """关闭查表模式，恢复解析计算"""
+        self._pl_table = None
+
     def _calculate_noise_power(self, bandwidth):
         """计算指定带宽下的噪声功率"""
         # 方法1: 使用玻尔兹曼常数计算
@@ -66,6 +126,61 @@ class UMiNLOSChannel:
         debug(f"2D distance: {d_2d:.2f}m, 3D distance: {d_3d:.2f}m")
         return d_3d
 
+    def calculate_3d_distance_batch(self, pos_tx, pos_rx):
+        """
+        批量计算3D距离 (向量化版本)
+
+        Args:
+            pos_tx: 发射机位置数组, 形状 (..., 2)
+            pos_rx: 接收机位置数组, 形状 (..., 2), 与 pos_tx 按 NumPy 规则广播
+
+        Returns:
+            distance_3d: 3D距离数组 (m), 形状为广播后的 (...)
+        """
+        pos_tx = np.asarray(pos_tx, dtype=float)
+        pos_rx = np.asarray(pos_rx, dtype=float)
+        d_2d_sq = np.sum((pos_tx - pos_rx) ** 2, axis=-1)
+        return np.sqrt(d_2d_sq + (self.antenna_height_bs - self.antenna_height_ue) ** 2)
+
+    def _calculate_deterministic_path_loss(self, distance_3d):
+        """确定性路径损耗 (dB), 标量和数组输入均可; 启用查表模式时走插值路径"""
+        if self._pl_table is not None:
+            return self._table_deterministic_path_loss(distance_3d)
+        return self._analytic_deterministic_path_loss(distance_3d)
+
+    def _table_deterministic_path_loss(self, distance_3d):
+        """查表 + 线性插值; 超出网格范围的距离回退到解析公式"""
+        table = self._pl_table
+        last = table['num_points'] - 1
+
+        if isinstance(distance_3d, (float, int)):
+            pos = (distance_3d - table['d_min']) * table['inv_step']
+            if 0.0 <= pos < last:
+                i = int(pos)
+                values = table['values_list']
+                return values[i] + (pos - i) * (values[i + 1] - values[i])
+            return self._analytic_deterministic_path_loss(distance_3d)
+
+        distance_3d = np.asarray(distance_3d, dtype=float)
+        pos = (distance_3d - table['d_min']) * table['inv_step']
+        idx = np.clip(pos, 0, last - 1).astype(np.int64)
+        values = table['values']
+        result = values[idx] + (pos - idx) * (values[idx + 1] - values[idx])
+
+        outside = (pos < 0) | (pos > last)
+        if np.any(outside):
+            result = np.where(outside, self._analytic_deterministic_path_loss(np.maximum(distance_3d, 1e-12)),
+                              result)
+        return result
+
+    def _analytic_deterministic_path_loss(self, distance_3d):
+        """确定性路径损耗解析公式 (dB)"""
+        # 公式: PL = 35.3*log10(d_3d) + 22.4 + 21.3*log10(fc) - 0.3*(h_UT - 1.5)
+        # 标量输入走 math.log10，避免 NumPy 标量调用开销
+        if isinstance(distance_3d, (float, int)):
+            return self.path_loss_A * math.log10(distance_3d) + self._pl_constant_db
+        return self.path_loss_A * np.log10(distance_3d) + self._pl_constant_db
+
     def calculate_path_loss(self, distance_3d):
         """
         计算28GHz毫米波频段的3GPP UMi NLOS路径损耗
@@ -81,14 +196,8 @@ class UMiNLOSChannel:
         if distance_3d <= 0:
             raise ValueError("Distance must be positive")
 
-        fc_ghz = self.center_frequency / 1e9  # 转换为GHz
-        h_ut = self.antenna_height_ue
-
-        # 计算确定性路径损耗 (公式: PL = 35.3*log10(d_3d) + 22.4 + 21.3*log10(fc) - 0.3*(h_UT - 1.5))
-        pl_deterministic = (self.path_loss_A * np.log10(distance_3d) +
-                            self.path_loss_B +
-                            self.path_loss_C * np.log10(fc_ghz) -
-                            0.3 * (h_ut - 1.5))
+        # 计算确定性路径损耗
+        pl_deterministic = self._calculate_deterministic_path_loss(distance_3d)
 
         # 生成阴影衰落 (对数正态分布)
         shadowing = np.random.normal(0, self.shadowing_std)
@@ -100,6 +209,25 @@ class UMiNLOSChannel:
 
         return total_pl_db, pl_deterministic, shadowing
 
+    def calculate_path_loss_batch(self, distance_3d):
+        """
+        批量计算路径损耗 (向量化版本), 阴影衰落一次性生成
+
+        Args:
+            distance_3d: 任意形状的3D距离数组 (m)
+
+        Returns:
+            total_pl_db, pl_deterministic, shadowing: 与输入同形状的数组 (dB)
+        """
+        distance_3d = np.asarray(distance_3d, dtype=float)
+        if np.any(distance_3d <= 0):
+            raise ValueError("Distance must be positive")
+
+        pl_deterministic = self._calculate_deterministic_path_loss(distance_3d)
+        shadowing = np.random.normal(0, self.shadowing_std, size=distance_3d.shape)
+
+        return pl_deterministic + shadowing, pl_deterministic, shadowing
+
     def calculate_snr(self, tx_power, distance_3d, beamforming_gain=0, bandwidth=None):
         """
         计算接收信噪比 (SNR)
@@ -142,6 +270,34 @@ class UMiNLOSChannel:
 
         return snr_db, snr_linear, received_power
 
+    def calculate_snr_batch(self, tx_power, distance_3d, beamforming_gain=0, bandwidth=None):
+        """
+        批量计算接收信噪比 (向量化版本)
+
+        Args:
+            tx_power: 发射功率 (W), 标量或可与 distance_3d 广播的数组
+            distance_3d: 任意形状的3D距离数组 (m)
+            beamforming_gain: 波束成形增益 (dB), 标量或可广播数组
+            bandwidth: (可选) 计算SNR所用的带宽 (Hz)
+
+        Returns:
+            snr_db, snr_linear, received_power: 广播后形状的数组
+        """
+        if bandwidth is None:
+            bandwidth = self.system_bandwidth
+
+        noise_power = self._calculate_noise_power(bandwidth)
+        total_pl_db, _, _ = self.calculate_path_loss_batch(distance_3d)
+
+        effective_pl_linear = 10 ** (-(total_pl_db + beamforming_gain) / 10)
+        received_power = np.asarray(tx_power, dtype=float) * effective_pl_linear
+
+        # 数值稳定性处理, 与标量版本一致
+        snr_linear = np.maximum(received_power / noise_power, 1e-20)
+        snr_db = 10 * np.log10(snr_linear)
+
+        return snr_db, snr_linear, received_power
+
     def get_channel_state_info(self, pos_tx, pos_rx, tx_power, beamforming_gain=0, bandwidth=None):
         """
         获取完整的信道状态信息 (CSI)
@@ -194,6 +350,59 @@ def test_channel_model():
             debug_print(f"  {key}: {value}")
 
 
+def benchmark_path_loss_table(num_samples=20000, repeats=5, max_error_db=PATH_LOSS_TABLE_MAX_ERROR_DB):
+    """
+    查表模式 vs 解析公式: 标量逐次调用与批量调用的耗时对比，以及最大插值误差
+    """
+    channel = UMiNLOSChannel()
+    d_max = np.sqrt(SCENE_SCALE_X ** 2 + SCENE_SCALE_Y ** 2)
+    distances = np.random.uniform(channel.antenna_height_bs - channel.antenna_height_ue, d_max, num_samples)
+    distance_list = distances.tolist()
+
+    def _time(fn):
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _scalar_loop():
+        for d in distance_list:
+            channel._calculate_deterministic_path_loss(d)
+
+    def _batch():
+        channel._calculate_deterministic_path_loss(distances)
+
+    channel.disable_path_loss_table()
+    analytic_values = channel._calculate_deterministic_path_loss(distances)
+    t_scalar_analytic = _time(_scalar_loop)
+    t_batch_analytic = _time(_batch)
+
+    channel.enable_path_loss_table(max_error_db)
+    table_values = channel._calculate_deterministic_path_loss(distances)
+    t_scalar_table = _time(_scalar_loop)
+    t_batch_table = _time(_batch)
+
+    results = {
+        'num_samples': num_samples,
+        'table_points': channel._pl_table['num_points'],
+        'max_abs_error_db': float(np.max(np.abs(table_values - analytic_values))),
+        'scalar_analytic_us': t_scalar_analytic / num_samples * 1e6,
+        'scalar_table_us': t_scalar_table / num_samples * 1e6,
+        'scalar_speedup': t_scalar_analytic / t_scalar_table,
+        'batch_analytic_ms': t_batch_analytic * 1e3,
+        'batch_table_ms': t_batch_table * 1e3,
+        'batch_speedup': t_batch_analytic / t_batch_table,
+    }
+
+    debug_print("Path loss table benchmark:")
+    for key, value in results.items():
+        debug_print(f"  {key}: {value}")
+    return results
+
+
 if __name__ == "__main__":
     set_debug_mode(True)
-    test_channel_model()
\ No newline at end of file
+    test_channel_model()
+    benchmark_path_loss_table()
\ No newline at end of file
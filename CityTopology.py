@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from logger import debug, debug_print
+import Parameters
+from Parameters import CITY_BLOCK_SIZE, N_V2I_LINKS, MAX_SPAWN_PER_STEP
+
+# V2I 链路收发端间距 (米)，与默认场景一致
+V2I_LINK_LENGTH = 50.0
+
+
+class CityTopology:
+    """
+    城市路网描述: RSU 路段、交叉路口、车辆出生点、V2I 链路与场景尺寸
+
+    每个 RSU (DQN) 负责一条路段 (start_x, start_y, end_x, end_y)，路段同时定义了道路网络
+    (车辆在路口的转向由路段连通关系决定，见 VehicleFleet)。
+    apply() 把路网写入 Parameters 并重新配置车队与阴影衰落地图，
+    之后 formulate_global_list_dqn 按新的路段列表创建 RSU。
+    """
+
+    def __init__(self, road_segments, cross_positions, spawn_points, v2i_links, scene_x, scene_y,
+                 max_spawn_per_step=MAX_SPAWN_PER_STEP):
+        self.road_segments = [tuple(float(c) for c in seg) for seg in road_segments]
+        self.cross_positions = [tuple(float(c) for c in pos) for pos in cross_positions]
+        self.spawn_points = [tuple(float(c) for c in pos) for pos in spawn_points]
+        self.v2i_links = [{'tx': tuple(link['tx']), 'rx': tuple(link['rx'])} for link in v2i_links]
+        self.scene_x = float(scene_x)
+        self.scene_y = float(scene_y)
+        self.max_spawn_per_step = int(max_spawn_per_step)
+
+    @property
+    def num_rsu(self):
+        return len(self.road_segments)
+
+    def __repr__(self):
+        return (f"CityTopology({self.scene_x:.0f}x{self.scene_y:.0f}m, {self.num_rsu} RSU segments, "
+                f"{len(self.cross_positions)} crosses, {len(self.spawn_points)} spawn points, "
+                f"{len(self.v2i_links)} V2I links)")
+
+    def apply(self, fleet=None, shadowing_field=None):
+        """
+        使路网生效
+
+        Parameters 中的列表原地替换 (保留各模块 from Parameters import 得到的引用)，
+        场景尺寸等标量直接写入 Parameters；车队与阴影衰落地图按新路网重建。
+        """
+        from VehicleFleet import global_vehicle_fleet
+        from ShadowingField import global_shadowing_field
+        fleet = fleet if fleet is not None else global_vehicle_fleet
+        shadowing_field = shadowing_field if shadowing_field is not None else global_shadowing_field
+
+        Parameters.RSU_SEGMENT_LIST[:] = self.road_segments
+        Parameters.CROSS_POSITION_LIST[:] = self.cross_positions
+        Parameters.BOUNDARY_POSITION_LIST[:] = self.spawn_points
+        Parameters.V2I_LINK_POSITIONS[:] = self.v2i_links
+        Parameters.N_V2I_LINKS = len(self.v2i_links)
+        Parameters.SCENE_SCALE_X = self.scene_x
+        Parameters.SCENE_SCALE_Y = self.scene_y
+        Parameters.MAX_SPAWN_PER_STEP = self.max_spawn_per_step
+
+        fleet.set_road_network(self.spawn_points, self.cross_positions, self.road_segments,
+                               self.scene_x, self.scene_y, self.max_spawn_per_step)
+        shadowing_field.set_scene(self.scene_x, self.scene_y)
+        debug_print(f"Applied {self}")
+        return self
+
+
+def default_city_topology():
+    """当前 Parameters 中的路网 (默认 3x3 街区, 10 个 RSU)"""
+    return CityTopology(Parameters.RSU_SEGMENT_LIST, Parameters.CROSS_POSITION_LIST,
+                        Parameters.BOUNDARY_POSITION_LIST, Parameters.V2I_LINK_POSITIONS,
+                        Parameters.SCENE_SCALE_X, Parameters.SCENE_SCALE_Y, Parameters.MAX_SPAWN_PER_STEP)
+
+
+def generate_grid_city(blocks_x, blocks_y, block_size=CITY_BLOCK_SIZE, interior_spawn=True,
+                       num_v2i_links=N_V2I_LINKS):
+    """
+    生成 blocks_x x blocks_y 个街区的网格城市
+
+    场景为 (blocks_x * block_size) x (blocks_y * block_size)。内部有 blocks_x - 1 条纵向道路、
+    blocks_y - 1 条横向道路，全部贯通到场景边界；每条道路在路口处切分为路段，每个路段一个 RSU，
+    共 (blocks_x - 1) * blocks_y + (blocks_y - 1) * blocks_x 个 RSU
+    (例如 8x8 街区 -> 112 个，23x23 街区 -> 1012 个)。
+
+    Args:
+        blocks_x, blocks_y: 横向 / 纵向街区数 (>= 2)
+        block_size: 街区边长 (米)
+        interior_spawn: 是否在每个内部路段 (两端都是路口) 的中点增加出生点。
+            只从边界入口生车时，大路网内部需要很久才有车辆。
+        num_v2i_links: V2I 链路数，均匀分布在街区中心
+
+    Returns:
+        CityTopology
+    """
+    if blocks_x < 2 or blocks_y < 2:
+        raise ValueError(f"Grid city needs at least 2x2 blocks, got {blocks_x}x{blocks_y}")
+
+    scene_x, scene_y = blocks_x * block_size, blocks_y * block_size
+    road_x = [k * block_size for k in range(1, blocks_x)]  # 纵向道路的 x 坐标
+    road_y = [k * block_size for k in range(1, blocks_y)]  # 横向道路的 y 坐标
+    stops_x = [0.0] + road_x + [scene_x]
+    stops_y = [0.0] + road_y + [scene_y]
+
+    # 路段 (start <= end，与 RSU 区域判定一致)：先横向道路，再纵向道路
+    road_segments = [(x1, y, x2, y) for y in road_y for x1, x2 in zip(stops_x[:-1], stops_x[1:])]
+    road_segments += [(x, y1, x, y2) for x in road_x for y1, y2 in zip(stops_y[:-1], stops_y[1:])]
+    cross_positions = [(x, y) for x in road_x for y in road_y]
+
+    # 出生点: 每条道路的两个边界入口 (+ 内部路段中点)
+    spawn_points = [(0.0, y) for y in road_y] + [(scene_x, y) for y in road_y]
+    spawn_points += [(x, 0.0) for x in road_x] + [(x, scene_y) for x in road_x]
+    if interior_spawn:
+        crosses = set(cross_positions)
+        spawn_points += [((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in road_segments
+                         if (x1, y1) in crosses and (x2, y2) in crosses]
+
+    # V2I 链路: 在街区网格上均匀选取 num_v2i_links 个街区，发射端位于街区中心
+    links_x = int(np.ceil(np.sqrt(num_v2i_links))) if num_v2i_links else 0
+    links_y = int(np.ceil(num_v2i_links / links_x)) if links_x else 0
+    pick_x = np.unique(np.rint(np.linspace(0, blocks_x - 1, links_x)).astype(int)).tolist()
+    pick_y = np.unique(np.rint(np.linspace(0, blocks_y - 1, links_y)).astype(int)).tolist()
+    v2i_links = []
+    for bx in pick_x:
+        for by in pick_y:
+            tx = ((bx + 0.5) * block_size, (by + 0.5) * block_size)
+            v2i_links.append({'tx': tx, 'rx': (tx[0], tx[1] + V2I_LINK_LENGTH)})
+    v2i_links = v2i_links[:num_v2i_links]
+
+    # 生车速率随入口数量放大，保证大路网能在预热阶段达到目标车辆数
+    max_spawn_per_step = max(MAX_SPAWN_PER_STEP, len(spawn_points))
+
+    city = CityTopology(road_segments, cross_positions, spawn_points, v2i_links, scene_x, scene_y,
+                        max_spawn_per_step)
+    debug(f"Generated grid city: {city}")
+    return city
@@ -4,10 +4,12 @@ import torch
 from Parameters import RL_N_STATES_CSI, RL_TAU
 from copy import deepcopy
 from logger import debug, debug_print
+from MetricRingBuffer import MetricRingBuffer
 from Parameters import (
     RL_ALPHA, RL_EPSILON, SCENE_SCALE_X, SCENE_SCALE_Y, VEHICLE_SPEED_M3S,
     CROSS_POSITION_LIST, DIRECTION_H_LEFT, DIRECTION_H_STEADY, DIRECTION_H_RIGHT,
-    DIRECTION_V_UP, DIRECTION_V_STEADY, DIRECTION_V_DOWN, USE_UMI_NLOS_MODEL,VEHICLE_CAPACITY_PER_LANE
+    DIRECTION_V_UP, DIRECTION_V_STEADY, DIRECTION_V_DOWN, USE_UMI_NLOS_MODEL,VEHICLE_CAPACITY_PER_LANE,
+    METRIC_HISTORY_CAPACITY, VEHICLE_METRIC_HISTORY_CAPACITY
 )
 
 
@@ -49,8 +51,12 @@ class BaseDQN(torch.nn.Module):
         self.gnn_enhanced = False
         self.graph_features = None
         self.vehicle_in_dqn_range_by_distance = []
-        self.delay_list = []
-        self.snr_list = []
+        # 通信指标历史 (固定容量环形缓冲区)
+        self.delay_list = MetricRingBuffer(METRIC_HISTORY_CAPACITY)
+        self.snr_list = MetricRingBuffer(METRIC_HISTORY_CAPACITY)
+        self.v2v_success_list = MetricRingBuffer(METRIC_HISTORY_CAPACITY)
+        self.v2v_delay_ok_list = MetricRingBuffer(METRIC_HISTORY_CAPACITY)
+        self.v2v_snr_ok_list = MetricRingBuffer(METRIC_HISTORY_CAPACITY)
         self.vehicle_count_list = []
 
         # 目标网络相关
@@ -270,13 +276,14 @@ class Vehicle:
         )
         self.distance_to_bs = None
         self.communication_metrics = {
-            'snr_history': [],
-            'delay_history': [],
-            'throughput_history': []
+            'snr_history': MetricRingBuffer(VEHICLE_METRIC_HISTORY_CAPACITY),
+            'delay_history': MetricRingBuffer(VEHICLE_METRIC_HISTORY_CAPACITY),
+            'throughput_history': MetricRingBuffer(VEHICLE_METRIC_HISTORY_CAPACITY)
         }
 
         self.power_W = 0.0  # 初始发射功率为 0
         self.tx_pos = self.curr_loc  # 初始发射位置为出生点
+        self.fleet_index = None  # 在 VehicleFleet 数组中的位置 (由车队维护)
 
     def move(self, speed_m3s=VEHICLE_SPEED_M3S):
         self.first_occur = False
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+import time
+from typing import List, Tuple
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from logger import debug, debug_print, set_debug_mode
+import Parameters
+
+# 推理模块后端: "EAGER" 直接执行，"SCRIPT" 使用 torch.jit.script，"COMPILE" 使用 torch.compile
+INFERENCE_BACKENDS = ("EAGER", "SCRIPT", "COMPILE")
+
+
+def _segment_softmax(scores, index, num_segments: int):
+    """按 index 分段的 softmax (scores 为 (E, H)，与 torch_geometric.utils.softmax 相同的数值处理)"""
+    size = [num_segments, scores.size(1)]
+    seg_max = torch.zeros(size, dtype=scores.dtype, device=scores.device).scatter_reduce(
+        0, index.view(-1, 1).expand_as(scores), scores, reduce='amax', include_self=False)
+    out = (scores - seg_max.index_select(0, index)).exp()
+    seg_sum = torch.zeros(size, dtype=scores.dtype, device=scores.device).index_add_(0, index, out)
+    return out / (seg_sum.index_select(0, index) + 1e-16)
+
+
+class _SharedParams(nn.Module):
+    """按名称登记共享 Parameter 的容器 (TorchScript 可以遍历 ModuleList，但不能遍历 ParameterList)"""
+
+    def __init__(self, **params):
+        super().__init__()
+        for name, param in params.items():
+            setattr(self, name, param)
+
+
+class _FusedGATLayer(nn.Module):
+    """一层三种边类型的 GATConv (推理，与 GNNModel.fused_relational_conv 相同的计算)，参数与原卷积共享"""
+
+    def __init__(self, convs):
+        super().__init__()
+        self.heads = int(convs[0].heads)
+        self.channels = int(convs[0].out_channels)
+        self.concat = bool(convs[0].concat)
+        self.negative_slope = float(convs[0].negative_slope)
+        self.per_type = nn.ModuleList([
+            _SharedParams(lin_weight=conv.lin.weight, att_src=conv.att_src, att_dst=conv.att_dst,
+                          att_edge=conv.att_edge, lin_edge_weight=conv.lin_edge.weight, bias=conv.bias)
+            for conv in convs])
+
+    def forward(self, x, edge_index, edge_attr, edge_type, num_nodes: int):
+        num_types = len(self.per_type)
+        total_nodes = num_types * num_nodes
+        heads, channels = self.heads, self.channels
+
+        weights, att_src, att_dst, edge_att, biases = [], [], [], [], []
+        for params in self.per_type:
+            weights.append(params.lin_weight)
+            att_src.append(params.att_src)
+            att_dst.append(params.att_dst)
+            # lin_edge 与 att_edge 合并为 (H, D)
+            edge_att.append((params.lin_edge_weight.view(heads, channels, -1)
+                             * params.att_edge.view(heads, channels, 1)).sum(1))
+            biases.append(params.bias)
+
+        x_proj = torch.matmul(x, torch.stack(weights, dim=0).transpose(1, 2)).reshape(
+            num_types, num_nodes, heads, channels)
+        alpha_src = (x_proj * torch.stack(att_src, dim=0)).sum(-1).reshape(total_nodes, heads)
+        alpha_dst = (x_proj * torch.stack(att_dst, dim=0)).sum(-1).reshape(total_nodes, heads)
+        x_proj = x_proj.reshape(total_nodes, heads, channels)
+
+        alpha_edge = torch.matmul(edge_attr, torch.stack(edge_att, dim=0).reshape(num_types * heads, -1).t())
+        alpha_edge = alpha_edge.view(-1, num_types, heads).gather(
+            1, edge_type.view(-1, 1, 1).expand(-1, 1, heads)).squeeze(1)
+
+        src, dst = edge_index[0], edge_index[1]
+        alpha = F.leaky_relu(alpha_src.index_select(0, src) + alpha_dst.index_select(0, dst) + alpha_edge,
+                             self.negative_slope)
+        alpha = _segment_softmax(alpha, dst, total_nodes)
+        out = torch.zeros(total_nodes, heads, channels, dtype=x_proj.dtype, device=x_proj.device).index_add_(
+            0, dst, alpha.unsqueeze(-1) * x_proj.index_select(0, src))
+
+        if self.concat:
+            out = out.reshape(num_types, num_nodes, heads * channels)
+        else:
+            out = out.mean(dim=1).view(num_types, num_nodes, channels)
+        return out + torch.stack(biases, dim=0).unsqueeze(1)
+
+
+class _FusedGCNLayer(nn.Module):
+    """一层三种边类型的 GCNConv (推理)，参数与原卷积共享；edge_attr 为预先算好的对称归一化权重"""
+
+    def __init__(self, convs):
+        super().__init__()
+        self.per_type = nn.ModuleList([_SharedParams(lin_weight=conv.lin.weight, bias=conv.bias) for conv in convs])
+
+    def forward(self, x, edge_index, edge_attr, edge_type, num_nodes: int):
+        num_types = len(self.per_type)
+        total_nodes = num_types * num_nodes
+        weights, biases = [], []
+        for params in self.per_type:
+            weights.append(params.lin_weight)
+            biases.append(params.bias)
+        x_proj = torch.matmul(x, torch.stack(weights, dim=0).transpose(1, 2)).reshape(total_nodes, -1)
+        out = torch.zeros_like(x_proj).index_add_(
+            0, edge_index[1], edge_attr.view(-1, 1) * x_proj.index_select(0, edge_index[0]))
+        return out.view(num_types, num_nodes, -1) + torch.stack(biases, dim=0).unsqueeze(1)
+
+
+class GNNInferenceModule(nn.Module):
+    """
+    EnhancedHeteroGNN 的纯张量推理模块 (可用 torch.jit.script / torch.compile 编译)
+
+    输入只有张量: 节点特征 / 类型、三种边的 edge_index 与 edge_attr、要读出的 RSU 节点行号；
+    不访问图字典，也没有按边类型的 Python 分支。计算与 EnhancedHeteroGNN.rsu_q_values 在 eval 模式下一致
+    (无 dropout)。参数直接引用原模型的 Parameter，训练更新与 load_state_dict 无需重新导出。
+    约定: 输入图没有自环 (GraphBuilder 不生成自环)。
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.arch_type = str(model.arch_type)
+        self.use_gcn = model.arch_type == "GCN"
+        self.use_gates = model.arch_type == "HYBRID"
+        self.type_embedding = model.node_type_embedding.weight
+        self.edge_type_attention = model.edge_type_attention
+        self.edge_type_gates = model.edge_type_gates if self.use_gates else nn.Parameter(
+            torch.zeros(len(model.edge_types)), requires_grad=False)
+
+        layers = []
+        for j in range(model.num_layers):
+            convs = [model.edge_type_layers[edge_type][j] for edge_type in model.edge_types]
+            layers.append(_FusedGCNLayer(convs) if self.use_gcn else _FusedGATLayer(convs))
+        self.layers = nn.ModuleList(layers)
+
+        self.attn_pool_weight = model.attn_pool_linear.weight
+        self.attn_pool_bias = model.attn_pool_linear.bias
+        self.output_linears = nn.ModuleList([_SharedParams(weight=m.weight, bias=m.bias)
+                                             for m in model.output_layer if isinstance(m, nn.Linear)])
+        self.eval()
+
+    def forward(self, features, types, comm_index, comm_attr, interf_index, interf_attr,
+                prox_index, prox_attr, rsu_index):
+        """
+        Args:
+            features (N, F), types (N,): 节点特征与节点类型
+            comm_index / interf_index / prox_index (2, E_t), *_attr (E_t, D): 三种边 (可以为空)
+            rsu_index (K,): 要读出 Q 值的 RSU 节点行号
+
+        Returns:
+            (K, RL_N_ACTIONS)
+        """
+        num_nodes = features.size(0)
+        device = features.device
+        x = torch.cat([features, F.embedding(types, self.type_embedding)], dim=1)
+
+        counts = [comm_index.size(1), interf_index.size(1), prox_index.size(1)]
+        edge_index = torch.cat([comm_index, interf_index + num_nodes, prox_index + 2 * num_nodes], dim=1)
+        edge_type = torch.cat([torch.full([counts[t]], t, dtype=torch.long, device=device) for t in range(3)])
+        edge_attr = torch.cat([comm_attr, interf_attr, prox_attr], dim=0)
+        if self.use_gates:
+            edge_attr = edge_attr * torch.sigmoid(self.edge_type_gates).index_select(0, edge_type).unsqueeze(1)
+
+        # 每份节点副本补自环 (所有层共用): GAT 自环特征取入边均值，GCN 计算对称归一化权重
+        total_nodes = 3 * num_nodes
+        not_loop = edge_index[0] != edge_index[1]
+        edge_index, edge_attr, edge_type = edge_index[:, not_loop], edge_attr[not_loop], edge_type[not_loop]
+        in_degree = torch.zeros(total_nodes, dtype=features.dtype, device=device).index_add_(
+            0, edge_index[1], torch.ones(edge_index.size(1), dtype=features.dtype, device=device))
+        loops = torch.arange(total_nodes, device=device)
+        loop_index = torch.cat([edge_index, torch.stack([loops, loops], dim=0)], dim=1)
+        if self.use_gcn:
+            deg_inv_sqrt = (in_degree + 1).pow(-0.5)
+            edge_attr = deg_inv_sqrt.index_select(0, loop_index[0]) * deg_inv_sqrt.index_select(0, loop_index[1])
+        else:
+            loop_attr = torch.zeros(total_nodes, edge_attr.size(1), dtype=edge_attr.dtype, device=device).index_add_(
+                0, edge_index[1], edge_attr) / in_degree.clamp(min=1).unsqueeze(1)
+            edge_attr = torch.cat([edge_attr, loop_attr], dim=0)
+        edge_index = loop_index
+        edge_type = torch.cat([edge_type, loops // num_nodes])
+
+        x_edge = x
+        for j, layer in enumerate(self.layers):
+            x_edge = layer(x_edge, edge_index, edge_attr, edge_type, num_nodes)
+            if j < len(self.layers) - 1:
+                x_edge = F.elu(x_edge)
+
+        present = torch.tensor([1.0 if c > 0 else 0.0 for c in counts], dtype=features.dtype, device=device)
+        type_weights = present if self.use_gcn else F.softmax(self.edge_type_attention, dim=0) * present
+        node_embeddings = (x_edge * type_weights.view(3, 1, 1)).sum(0)
+
+        # RSU 读出: 以 RSU 为源的通信边的目标车辆做注意力池化
+        num_rsu = rsu_index.size(0)
+        slot_of_node = torch.full([num_nodes], -1, dtype=torch.long, device=device)
+        slot_of_node[rsu_index] = torch.arange(num_rsu, device=device)
+        edge_slot = slot_of_node.index_select(0, comm_index[0])
+        keep = edge_slot >= 0
+        segment, served = edge_slot[keep], comm_index[1][keep]
+        vehicle_stack = node_embeddings.index_select(0, served)
+        attn_weights = _segment_softmax(F.linear(vehicle_stack, self.attn_pool_weight, self.attn_pool_bias),
+                                        segment, num_rsu)
+        vehicle_embedding = torch.zeros(num_rsu, node_embeddings.size(1), dtype=node_embeddings.dtype,
+                                        device=device).index_add_(0, segment, attn_weights * vehicle_stack)
+
+        h = torch.cat([node_embeddings.index_select(0, rsu_index), vehicle_embedding], dim=1)
+        num_linear = len(self.output_linears)
+        for k, linear in enumerate(self.output_linears):
+            h = F.linear(h, linear.weight, linear.bias)
+            if k < num_linear - 1:
+                h = F.relu(h)
+        return h
+
+
+def graph_tensors(graph_data, slots=None) -> Tuple[torch.Tensor, ...]:
+    """
+    图数据字典 -> GNNInferenceModule 的输入张量元组
+
+    Args:
+        graph_data: 单图或 GraphBuilder.collate 得到的并图 (张量已在目标设备上)
+        slots: RSU 槽位 (单图中即 rsu_row 行号)；None 表示全部 RSU
+    """
+    features = graph_data['node_features']['features']
+    device = features.device
+    num_edge_attr = graph_data['edges']['communication']['edge_attr'].shape[1]
+    edge_tensors: List[torch.Tensor] = []
+    for edge_type in ('communication', 'interference', 'proximity'):
+        ef = graph_data['edge_features'][edge_type]
+        if ef is None:
+            edge_tensors += [torch.zeros(2, 0, dtype=torch.long, device=device),
+                             torch.zeros(0, num_edge_attr, dtype=features.dtype, device=device)]
+        else:
+            edge_tensors += [ef['edge_index'], ef['edge_attr']]
+
+    rsu_nodes = graph_data['nodes'].get('rsu_nodes')
+    if slots is None:
+        slots = np.arange(graph_data['nodes']['num_rsu'])
+    slots = np.asarray(slots, dtype=np.int64)
+    rows = slots if rsu_nodes is None else np.asarray(rsu_nodes, dtype=np.int64)[slots]
+    rsu_index = torch.as_tensor(rows, dtype=torch.long, device=device)
+    return (features, graph_data['node_features']['types'], *edge_tensors, rsu_index)
+
+
+class GNNInferenceRunner:
+    """
+    按后端缓存的推理模块 (模型对象被替换时重新导出)
+
+    GNNInferenceModule 共享模型参数，训练更新后无需重新导出；SCRIPT / COMPILE 的编译只在首次调用时进行。
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def module(self, model, backend=None):
+        backend = backend or Parameters.GNN_INFERENCE_BACKEND
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown GNN inference backend {backend}, expected one of {INFERENCE_BACKENDS}")
+        key = (id(model), model.arch_type, backend)
+        module = self._cache.get(key)
+        if module is None:
+            module = GNNInferenceModule(model)
+            if backend == "SCRIPT":
+                module = torch.jit.script(module)
+            elif backend == "COMPILE":
+                module = torch.compile(module, dynamic=True)
+            # 只保留当前模型的模块
+            self._cache = {k: v for k, v in self._cache.items() if k[0] == id(model)}
+            self._cache[key] = module
+            debug(f"GNNInferenceRunner: built {backend} inference module for {model.arch_type}")
+        return module
+
+    def q_values(self, model, graph_data, slots=None, backend=None):
+        """与 model.rsu_q_values(graph_data, slots) 相同的输出 (eval 语义，不计算梯度)"""
+        with torch.no_grad():
+            return self.module(model, backend)(*graph_tensors(graph_data, slots))
+
+
+def benchmark_gnn_inference(vehicle_count=120, warmup_steps=150, city_grid=None, repeats=20,
+                            backends=INFERENCE_BACKENDS):
+    """
+    整图推理延迟: EnhancedHeteroGNN.rsu_q_values (eager) vs GNNInferenceModule 的各后端
+
+    Args:
+        city_grid: (可选) (blocks_x, blocks_y)，在网格城市上测试大规模场景
+    """
+    from Topology import formulate_global_list_dqn, vehicle_movement
+    from LinkCache import global_link_cache
+    from RSUSpatialIndex import global_rsu_index
+    from GraphBuilder import global_graph_builder
+    from GNNModel import global_gnn_model
+
+    if city_grid is not None:
+        from CityTopology import generate_grid_city
+        generate_grid_city(*city_grid).apply()
+    dqn_list = []
+    formulate_global_list_dqn(dqn_list, torch.device('cpu'))
+    vehicle_id, vehicle_list = 0, []
+    for _ in range(warmup_steps):
+        vehicle_id, vehicle_list = vehicle_movement(vehicle_id, vehicle_list, target_count=vehicle_count)
+    global_link_cache.build(dqn_list, vehicle_list, 0)
+    global_rsu_index.build(dqn_list, vehicle_list, 0)
+    graph_data = global_graph_builder.build_dynamic_graph(dqn_list, vehicle_list, 0)
+
+    def timed(fn):
+        with torch.no_grad():
+            for _ in range(3):  # 预热 (含编译与 TorchScript 的剖析执行)
+                fn()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                out = fn()
+        return (time.perf_counter() - start) / repeats * 1e3, out
+
+    global_gnn_model.eval()
+    results = {}
+    reference_ms, reference = timed(lambda: global_gnn_model.rsu_q_values(graph_data))
+    results['model_eager_ms'] = reference_ms
+    runner = GNNInferenceRunner()
+    for backend in backends:
+        try:
+            ms, out = timed(lambda: runner.q_values(global_gnn_model, graph_data, backend=backend))
+            results[f'{backend.lower()}_ms'] = ms
+            results[f'{backend.lower()}_max_diff'] = float((out - reference).abs().max())
+        except Exception as e:
+            debug_print(f"GNN inference backend {backend} unavailable: {e}")
+            results[f'{backend.lower()}_ms'] = None
+    global_gnn_model.train()
+
+    debug_print(f"GNN inference benchmark ({len(dqn_list)} RSUs, {len(vehicle_list)} vehicles):")
+    for key, value in results.items():
+        debug_print(f"  {key}: {value}")
+    return results
+
+
+# 全局推理模块缓存
+global_gnn_inference = GNNInferenceRunner()
+
+
+if __name__ == "__main__":
+    set_debug_mode(True)
+    benchmark_gnn_inference()
+    benchmark_gnn_inference(vehicle_count=1500, warmup_steps=200, city_grid=(6, 6))
@@ -1,13 +1,84 @@
 # -*- coding: utf-8 -*-
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch_geometric.nn import GATConv, GCNConv
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_geometric.utils import add_self_loops, scatter, softmax as segment_softmax
 from logger import debug, debug_print, set_debug_mode
 from Parameters import *
 import Parameters
 
 
+def fused_relational_conv(convs, x, edge_index, edge_attr, edge_type, num_nodes):
+    """
+    多种边类型的同一层卷积合并为一次消息传递 (与逐类型调用 convs[t] 数值等价)
+
+    T 种边类型视为 T 份不相交的节点副本: 类型 t 的边下标整体偏移 t * num_nodes，
+    各类型的线性投影用一次批量矩阵乘完成，注意力 / 归一化与聚合在并图上一次计算。
+    参数直接取自各类型的 GATConv / GCNConv，因此与原模型的 state_dict 完全兼容。
+
+    Args:
+        convs: 各边类型在该层的卷积 (同为 GATConv 或同为 GCNConv)
+        x: (N, F) 所有类型共用的输入，或 (T, N, F) 各类型各自的输入
+        edge_index: (2, E) 已按类型偏移的边
+        edge_attr: (E, D) 边特征 (GCN 忽略)
+        edge_type: (E,) 每条边的类型编号
+        num_nodes: 单份节点数 N
+
+    Returns:
+        (T, N, out_channels)
+    """
+    num_types = len(convs)
+    total_nodes = num_types * num_nodes
+    weight = torch.stack([conv.lin.weight for conv in convs], dim=0)  # (T, out, F)
+    x_proj = torch.matmul(x, weight.transpose(1, 2))                   # (T, N, out)
+    bias = torch.stack([conv.bias for conv in convs], dim=0).unsqueeze(1)
+
+    if isinstance(convs[0], GCNConv):
+        x_proj = x_proj.reshape(total_nodes, -1)
+        edge_index, edge_weight = gcn_norm(edge_index, None, total_nodes, improved=False, add_self_loops=True,
+                                           dtype=x_proj.dtype)
+        out = scatter(edge_weight.unsqueeze(-1) * x_proj.index_select(0, edge_index[0]), edge_index[1], dim=0,
+                      dim_size=total_nodes, reduce='sum')
+        return out.view(num_types, num_nodes, -1) + bias
+
+    conv = convs[0]
+    heads, channels = conv.heads, conv.out_channels
+    x_proj = x_proj.reshape(num_types, num_nodes, heads, channels)
+    att_src = torch.stack([c.att_src for c in convs], dim=0)           # (T, 1, H, C)
+    att_dst = torch.stack([c.att_dst for c in convs], dim=0)
+    alpha_src = (x_proj * att_src).sum(dim=-1).reshape(total_nodes, heads)
+    alpha_dst = (x_proj * att_dst).sum(dim=-1).reshape(total_nodes, heads)
+    x_proj = x_proj.reshape(total_nodes, heads, channels)
+
+    # 与 GATConv 相同: 去掉自环后按目标节点的入边均值补自环特征；副本互不相连，因此各类型分别取均值
+    not_loop = edge_index[0] != edge_index[1]
+    edge_index, edge_attr, edge_type = edge_index[:, not_loop], edge_attr[not_loop], edge_type[not_loop]
+    edge_index, edge_attr = add_self_loops(edge_index, edge_attr, fill_value=conv.fill_value, num_nodes=total_nodes)
+    loop_type = torch.arange(total_nodes, device=x.device) // num_nodes
+    edge_type = torch.cat([edge_type, loop_type], dim=0)
+
+    # lin_edge 与 att_edge 先合并为 (T, H, D)，边注意力项只需一次 (E, D) x (D, T * H) 的乘法
+    edge_att = torch.stack([(c.lin_edge.weight.view(heads, channels, -1) * c.att_edge.view(heads, channels, 1)).sum(1)
+                            for c in convs], dim=0)
+    alpha_edge = torch.matmul(edge_attr, edge_att.reshape(num_types * heads, -1).t())
+    alpha_edge = alpha_edge.view(-1, num_types, heads).gather(
+        1, edge_type.view(-1, 1, 1).expand(-1, 1, heads)).squeeze(1)
+
+    src, dst = edge_index[0], edge_index[1]
+    alpha = F.leaky_relu(alpha_src.index_select(0, src) + alpha_dst.index_select(0, dst) + alpha_edge,
+                         conv.negative_slope)
+    alpha = segment_softmax(alpha, dst, num_nodes=total_nodes)
+    alpha = F.dropout(alpha, p=conv.dropout, training=conv.training)
+    out = scatter(alpha.unsqueeze(-1) * x_proj.index_select(0, src), dst, dim=0, dim_size=total_nodes, reduce='sum')
+
+    out = out.reshape(num_types, num_nodes, heads * channels) if conv.concat else out.mean(dim=1).view(
+        num_types, num_nodes, channels)
+    return out + bias
+
+
 class EnhancedHeteroGNN(nn.Module):
     def __init__(self, node_feature_dim=9, hidden_dim=64, num_heads=4, num_layers=2, dropout=0.2):
         super(EnhancedHeteroGNN, self).__init__()
@@ -69,6 +140,23 @@ class EnhancedHeteroGNN(nn.Module):
         )
 
     def forward(self, graph_data, dqn_id=None):
+        x_combined = self.embed(graph_data)
+
+        # 输出 Q 值
+        if dqn_id is not None:
+            q_values = self._extract_local_features(x_combined, graph_data, dqn_id)
+        else:
+            q_values = self._extract_global_features(x_combined, graph_data)
+
+        # 返回 (Q值, 辅助信息)
+        # 只有 Hybrid 模式返回 attention logits 用于计算 Entropy Loss
+        # 其他模式返回 None，Main.py 需处理
+        aux_info = self.edge_type_attention if self.arch_type == "HYBRID" else None
+
+        return q_values, aux_info
+
+    def embed(self, graph_data):
+        """消息传递: 返回全部节点的嵌入 (N, hidden_dim)"""
         node_features = graph_data['node_features']['features']
         node_types = graph_data['node_features']['types']
         edge_features = graph_data['edge_features']
@@ -85,6 +173,9 @@ class EnhancedHeteroGNN(nn.Module):
         # 边权重 (HYBRID 和 GAT 都用，GCN 用平均)
         edge_weights = F.softmax(self.edge_type_attention, dim=0)
 
+        if getattr(Parameters, 'GNN_FUSED_CONV', False):
+            return self._embed_fused(x, edge_features, edge_gates, edge_weights)
+
         for i, edge_type in enumerate(self.edge_types):
             if edge_features[edge_type] is None:
                 edge_outputs.append(torch.zeros(batch_size, self.hidden_dim, device=x.device))
@@ -133,62 +224,105 @@ class EnhancedHeteroGNN(nn.Module):
         else:
             x_combined = torch.zeros(batch_size, self.hidden_dim, device=x.device)
 
-        # 输出 Q 值
-        if dqn_id is not None:
-            q_values = self._extract_local_features(x_combined, graph_data, dqn_id)
-        else:
-            q_values = self._extract_global_features(x_combined, graph_data)
-
-        # 返回 (Q值, 辅助信息)
-        # 只有 Hybrid 模式返回 attention logits 用于计算 Entropy Loss
-        # 其他模式返回 None，Main.py 需处理
-        aux_info = self.edge_type_attention if self.arch_type == "HYBRID" else None
-
-        return q_values, aux_info
+        return x_combined
+
+    def _embed_fused(self, x, edge_features, edge_gates, edge_weights):
+        """embed 的融合实现: 每层的三种边类型卷积合并为一次 fused_relational_conv 调用"""
+        num_nodes, num_types = x.size(0), len(self.edge_types)
+        present = [(i, edge_features[edge_type]) for i, edge_type in enumerate(self.edge_types)
+                   if edge_features[edge_type] is not None]
+        if not present:
+            return torch.zeros(num_nodes, self.hidden_dim, device=x.device)
+
+        edge_index = torch.cat([ef['edge_index'] + i * num_nodes for i, ef in present], dim=1)
+        edge_attr = torch.cat([ef['edge_attr'] * edge_gates[i] if self.arch_type == "HYBRID" else ef['edge_attr']
+                               for i, ef in present], dim=0)
+        edge_type = torch.cat([torch.full((ef['edge_index'].size(1),), i, dtype=torch.long, device=x.device)
+                               for i, ef in present], dim=0)
+
+        x_edge = x
+        for j in range(self.num_layers):
+            convs = [self.edge_type_layers[edge_type_name][j] for edge_type_name in self.edge_types]
+            x_edge = fused_relational_conv(convs, x_edge, edge_index, edge_attr, edge_type, num_nodes)
+            if j < self.num_layers - 1:
+                x_edge = F.elu(x_edge)
+                x_edge = F.dropout(x_edge, p=self.dropout, training=self.training)
+
+        # 没有边的类型不参与聚合 (与逐类型实现中的零输出一致)；GCN 简单相加，GAT/HYBRID 使用可学习权重
+        present_mask = torch.zeros(num_types, device=x.device)
+        present_mask[[i for i, _ in present]] = 1.0
+        type_weights = present_mask if self.arch_type == "GCN" else edge_weights * present_mask
+        return torch.sum(x_edge * type_weights.view(num_types, 1, 1), dim=0)
 
     def _extract_local_features(self, node_embeddings, graph_data, dqn_id):
-        nodes = graph_data['nodes']
-        target_rsu_index = -1
-        for i, rsu_node in enumerate(nodes['rsu_nodes']):
-            if rsu_node['original_id'] == dqn_id:
-                target_rsu_index = i
-                break
-        if target_rsu_index == -1:
+        target_rsu_index = graph_data['rsu_row'].get(dqn_id)
+        if target_rsu_index is None:
             return torch.zeros(RL_N_ACTIONS, device=node_embeddings.device)
+        return self._pool_rsus(node_embeddings, graph_data, [target_rsu_index])[0]
 
-        rsu_embedding = node_embeddings[target_rsu_index]
-        vehicle_embeddings = []
-
-        for vehicle_node in nodes['vehicle_nodes']:
-            for edge in graph_data['edges']['communication']:
-                if (edge['source'] == f"rsu_{dqn_id}" and edge['target'] == vehicle_node['id']):
-                    vehicle_index = len(nodes['rsu_nodes']) + nodes['vehicle_nodes'].index(vehicle_node)
-                    vehicle_embeddings.append(node_embeddings[vehicle_index])
-                    break
-
-        if vehicle_embeddings:
-            vehicle_stack = torch.stack(vehicle_embeddings)
-            attn_scores = self.attn_pool_linear(vehicle_stack)
-            attn_weights = F.softmax(attn_scores, dim=0)
-            vehicle_embedding = torch.mm(attn_weights.t(), vehicle_stack).squeeze(0)
-        else:
-            vehicle_embedding = torch.zeros_like(rsu_embedding)
+    def _pool_rsus(self, node_embeddings, graph_data, slots):
+        """
+        多个 RSU 槽位的 Q 值: [RSU 嵌入, 服务车辆的注意力池化] -> 输出层 (一次批量计算)
+
+        服务车辆 = 以该 RSU 为源的通信边的目标节点 (通信边 'ptr' 给出每个槽位的 CSR 区间)。
+        所有区间拼接后一次计算注意力分数，按槽位做分段 softmax 与 scatter 求和；没有服务车辆的
+        RSU 池化结果为零向量。单图中 RSU 槽位即节点行号；并图 (GraphBuilder.collate) 由 'rsu_nodes' 给出节点行号
+
+        Returns:
+            (len(slots), RL_N_ACTIONS)
+        """
+        device = node_embeddings.device
+        slots = np.asarray(slots, dtype=np.int64)
+        rsu_nodes = graph_data['nodes'].get('rsu_nodes')
+        rsu_rows = slots if rsu_nodes is None else np.asarray(rsu_nodes, dtype=np.int64)[slots]
 
-        combined_features = torch.cat([rsu_embedding, vehicle_embedding], dim=0)
-        q_values = self.output_layer(combined_features)
-        return q_values
+        comm_edges = graph_data['edges']['communication']
+        ptr = np.asarray(comm_edges['ptr'], dtype=np.int64)
+        begin, counts = ptr[slots], ptr[slots + 1] - ptr[slots]
+        segment = np.repeat(np.arange(len(slots)), counts)
+        positions = np.repeat(begin - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        served = np.asarray(comm_edges['edge_index'][1])[positions]
+
+        rsu_embedding = node_embeddings[torch.as_tensor(rsu_rows, dtype=torch.long, device=device)]
+        vehicle_stack = node_embeddings[torch.as_tensor(served, dtype=torch.long, device=device)]
+        segment = torch.as_tensor(segment, dtype=torch.long, device=device)
+
+        attn_weights = segment_softmax(self.attn_pool_linear(vehicle_stack), segment, num_nodes=len(slots))
+        vehicle_embedding = scatter(attn_weights * vehicle_stack, segment, dim=0, dim_size=len(slots), reduce='sum')
+
+        combined_features = torch.cat([rsu_embedding, vehicle_embedding], dim=1)
+        return self.output_layer(combined_features)
 
     def _extract_global_features(self, node_embeddings, graph_data):
-        nodes = graph_data['nodes']
-        num_rsus = len(nodes['rsu_nodes'])
-        all_q_values = []
-        for dqn_id in range(1, num_rsus + 1):
-            q_value = self._extract_local_features(node_embeddings, graph_data, dqn_id)
-            all_q_values.append(q_value)
-        if all_q_values:
-            return torch.stack(all_q_values, dim=0)
-        else:
-            return torch.zeros(0, RL_N_ACTIONS, device=node_embeddings.device)
+        """按 dqn_id = 1..num_rsu_nodes 的顺序返回各 RSU 的 Q 值 (R, RL_N_ACTIONS)；图中没有的 RSU 为零"""
+        num_rsus = graph_data['metadata']['num_rsu_nodes']
+        rsu_row = graph_data['rsu_row']
+        present = [(k, rsu_row[dqn_id]) for k, dqn_id in enumerate(range(1, num_rsus + 1)) if dqn_id in rsu_row]
+        if len(present) == num_rsus:
+            return self._pool_rsus(node_embeddings, graph_data, [row for _, row in present])
+
+        all_q_values = torch.zeros(num_rsus, RL_N_ACTIONS, device=node_embeddings.device)
+        if present:
+            index = torch.as_tensor([k for k, _ in present], dtype=torch.long, device=node_embeddings.device)
+            all_q_values = all_q_values.index_copy(
+                0, index, self._pool_rsus(node_embeddings, graph_data, [row for _, row in present]))
+        return all_q_values
+
+    def rsu_q_values(self, graph_data, slots=None):
+        """
+        一次消息传递后读出多个 RSU 的 Q 值 (推理用)
+
+        Args:
+            graph_data: 单图或 GraphBuilder.collate 得到的并图
+            slots: RSU 槽位 (单图中即 rsu_row 行号)；None 表示全部 RSU
+
+        Returns:
+            (len(slots), RL_N_ACTIONS)
+        """
+        node_embeddings = self.embed(graph_data)
+        if slots is None:
+            slots = np.arange(graph_data['nodes']['num_rsu'])
+        return self._pool_rsus(node_embeddings, graph_data, slots)
 
     def get_attention_weights(self, graph_data):
         # GCN 没有内部注意力，只返回边类型权重
@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
 import random
+import numpy as np
 import torch
 from collections import deque, namedtuple
 from copy import deepcopy
 from logger import debug
 
 # GNN的经验元组，存储一个完整的系统转换
+# actions_t / rewards_t / valid_t / rows_t1 为按 graph_t 的 RSU 行号排列的稠密数组 (R,)，
+# rows_t1 为同一 RSU 在 graph_t1 中的行号 (不存在时为 -1)
 GNNExperience = namedtuple('GNNExperience',
-                           ['graph_t', 'actions_t', 'rewards_t', 'graph_t1'])
+                           ['graph_t', 'actions_t', 'rewards_t', 'graph_t1', 'valid_t', 'rows_t1'])
+
+# 采样批次: 图保持为缓冲区中的 CPU 图 (只读)，其余为 (B, R) 张量，R 为批次内最大 RSU 数，
+# valid 为 False 的位置 (没有动作 / 填充) 不参与损失
+GNNBatch = namedtuple('GNNBatch',
+                      ['graphs_t', 'graphs_t1', 'actions', 'rewards', 'valid', 'rows_t1', 'rsu_ids'])
 
 
 class GNNReplayBuffer:
@@ -67,16 +75,30 @@ class GNNReplayBuffer:
         graph_t_cpu = self._graphs_to_device(graph_t, 'cpu')
         graph_t1_cpu = self._graphs_to_device(graph_t1, 'cpu')
 
-        # 2. 确保 actions 和 rewards 也是纯 Python 类型
-        actions_t_cpu = deepcopy(actions_t)
-        rewards_t_cpu = deepcopy(rewards_t)
+        # 2. actions / rewards 字典转为按 RSU 行号排列的稠密数组
+        num_rsu = graph_t_cpu['nodes']['num_rsu']
+        actions_dense = np.zeros(num_rsu, dtype=np.int64)
+        rewards_dense = np.zeros(num_rsu, dtype=np.float32)
+        valid = np.zeros(num_rsu, dtype=bool)
+        rows_t1 = np.full(num_rsu, -1, dtype=np.int64)
+        for dqn_id_str, action_index in actions_t.items():
+            row = graph_t_cpu['rsu_row'].get(int(dqn_id_str))
+            row_t1 = graph_t1_cpu['rsu_row'].get(int(dqn_id_str))
+            if row is None or row_t1 is None:
+                continue
+            actions_dense[row] = action_index
+            rewards_dense[row] = rewards_t[dqn_id_str]
+            valid[row] = True
+            rows_t1[row] = row_t1
 
         # 3. 创建经验元组
         experience = GNNExperience(
             graph_t=graph_t_cpu,
-            actions_t=actions_t_cpu,
-            rewards_t=rewards_t_cpu,
-            graph_t1=graph_t1_cpu
+            actions_t=actions_dense,
+            rewards_t=rewards_dense,
+            graph_t1=graph_t1_cpu,
+            valid_t=valid,
+            rows_t1=rows_t1
         )
 
         # 4. 存入缓冲区
@@ -85,16 +107,17 @@ class GNNReplayBuffer:
 
     def sample(self, batch_size, device):
         """
-        从缓冲区中采样一个批次，并自动将图数据移到目标设备。
+        从缓冲区中采样一个批次。
+
+        图不再逐个深拷贝到目标设备：调用方把它们拼成并图 (GraphBuilder.collate 生成新的张量)
+        后一次性移动，因此返回的图是缓冲区中的 CPU 原件，不得原地修改。
 
         Args:
             batch_size (int): 批次大小
-            device (torch.device): 目标设备 (e.g., 'cuda')
+            device (torch.device): 动作 / 奖励张量的目标设备 (e.g., 'cuda')
 
         Returns:
-            list[GNNExperience]: 包含 (graph_t, actions_t, rewards_t, graph_t1) 的列表
-                                 其中 graph_t 和 graph_t1 已经
-                                 被移到了目标 device。
+            GNNBatch，actions / rewards / valid / rows_t1 为 (B, R) 张量，rsu_ids 为 (B, R) numpy 数组
         """
         if len(self.buffer) < batch_size:
             return None
@@ -102,18 +125,25 @@ class GNNReplayBuffer:
         # 1. 随机采样
         sampled_experiences = random.sample(self.buffer, batch_size)
 
-        # 2. 将采样到的数据的图张量移到目标设备 (e.g., 'cuda')
-        batch_on_device = []
-        for exp in sampled_experiences:
-            graph_t_dev = self._graphs_to_device(exp.graph_t, device)
-            graph_t1_dev = self._graphs_to_device(exp.graph_t1, device)
-
-            if graph_t_dev and graph_t1_dev:
-                batch_on_device.append(GNNExperience(
-                    graph_t=graph_t_dev,
-                    actions_t=exp.actions_t,  # actions 和 rewards 不需要
-                    rewards_t=exp.rewards_t,  # 移到GPU
-                    graph_t1=graph_t1_dev
-                ))
-
-        return batch_on_device
\ No newline at end of file
+        # 2. 稠密数组按批次内最大 RSU 数填充后一次性拼接、移动
+        num_rsu = max(len(exp.actions_t) for exp in sampled_experiences)
+        actions = np.zeros((batch_size, num_rsu), dtype=np.int64)
+        rewards = np.zeros((batch_size, num_rsu), dtype=np.float32)
+        valid = np.zeros((batch_size, num_rsu), dtype=bool)
+        rows_t1 = np.full((batch_size, num_rsu), -1, dtype=np.int64)
+        rsu_ids = np.zeros((batch_size, num_rsu), dtype=np.int64)
+        for b, exp in enumerate(sampled_experiences):
+            n = len(exp.actions_t)
+            actions[b, :n], rewards[b, :n], valid[b, :n], rows_t1[b, :n] = \
+                exp.actions_t, exp.rewards_t, exp.valid_t, exp.rows_t1
+            rsu_ids[b, :n] = exp.graph_t['nodes']['rsu_ids']
+
+        return GNNBatch(
+            graphs_t=[exp.graph_t for exp in sampled_experiences],
+            graphs_t1=[exp.graph_t1 for exp in sampled_experiences],
+            actions=torch.as_tensor(actions, device=device),
+            rewards=torch.as_tensor(rewards, device=device),
+            valid=torch.as_tensor(valid, device=device),
+            rows_t1=torch.as_tensor(rows_t1, device=device),
+            rsu_ids=rsu_ids
+        )
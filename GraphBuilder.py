@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import torch
-from collections import defaultdict
 from logger import debug, debug_print, set_debug_mode
 import Parameters
 from Parameters import *
 from ChannelModel import global_channel_model
+from LinkCache import global_link_cache
 from Parameters import V2V_CHANNEL_BANDWIDTH, TRANSMITTDE_POWER
 import traceback
 import sys
@@ -16,6 +16,64 @@ try:
 except ImportError:
     GNN_INFERENCE_RADIUS = 500.0
 
+# 可选: KD 树半径查询 (节点较多时代替稠密距离矩阵)
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# 可选: 转换为 PyG Data 对象 (to_pyg_data)
+try:
+    from torch_geometric.data import Data
+except ImportError:
+    Data = None
+
+# 节点数 (或二部图两侧节点数之积的平方根) 超过该值时使用 KD 树
+KDTREE_MIN_NODES = 256
+# 半径查询的相对余量: 候选对之后按与原实现相同的距离公式精确判定
+RADIUS_QUERY_SLACK = 1e-9
+
+
+def _split_positions(nodes):
+    """节点位置 -> (RSU 位置 (R, 2), 车辆位置 (V, 2))"""
+    return nodes['positions'][:nodes['num_rsu']], nodes['positions'][nodes['num_rsu']:]
+
+
+def _planar_distance(pos_a, pos_b):
+    """与逐对计算相同的运算顺序: sqrt(dx^2 + dy^2)"""
+    return np.sqrt((pos_a[..., 0] - pos_b[..., 0]) ** 2 + (pos_a[..., 1] - pos_b[..., 1]) ** 2)
+
+
+def _pairs_within(positions, radius):
+    """同一点集内距离 <= radius 的候选对 (i < j)，按 (i, j) 升序"""
+    n = len(positions)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if cKDTree is not None and n > KDTREE_MIN_NODES:
+        pairs = cKDTree(positions).query_pairs(radius * (1 + RADIUS_QUERY_SLACK), output_type='ndarray')
+        i, j = pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.int64)
+    else:
+        i, j = np.triu_indices(n, k=1)
+        near = _planar_distance(positions[i], positions[j]) <= radius * (1 + RADIUS_QUERY_SLACK)
+        i, j = i[near], j[near]
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def _pairs_between(pos_a, pos_b, radius):
+    """二部近邻: |a_i - b_j| <= radius 的候选对，按 (i, j) 升序"""
+    if not len(pos_a) or not len(pos_b):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if cKDTree is not None and len(pos_a) * len(pos_b) > KDTREE_MIN_NODES ** 2:
+        pairs = cKDTree(pos_a).sparse_distance_matrix(
+            cKDTree(pos_b), radius * (1 + RADIUS_QUERY_SLACK), output_type='ndarray')
+        i, j = pairs['i'].astype(np.int64), pairs['j'].astype(np.int64)
+    else:
+        near = _planar_distance(pos_a[:, None, :], pos_b[None, :, :]) <= radius * (1 + RADIUS_QUERY_SLACK)
+        i, j = np.nonzero(near)
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
 
 class GraphBuilder:
     """
@@ -36,45 +94,83 @@ class GraphBuilder:
         debug("GraphBuilder initialized (Stable Version)")
 
     def build_dynamic_graph(self, dqn_list, vehicle_list, epoch):
+        """
+        构建张量化的异构图
+
+        节点按 RSU 在前、车辆在后统一编号 (整数下标)，返回:
+            'nodes': {'rsu_ids': (R,), 'vehicle_ids': (V,), 'positions': (R + V, 2)}
+            'rsu_row': {dqn_id: RSU 节点行号}
+            'edges': 每类边 {'edge_index': (2, E), 'edge_attr': (E, 4)}；通信边另有按 RSU 行号分组的
+                CSR 偏移 'ptr' (R + 1,)，RSU r 服务的车辆节点为 edge_index[1, ptr[r]:ptr[r + 1]]
+            'node_features': {'features': FloatTensor (R + V, 12), 'types': LongTensor (R + V,)}
+            'edge_features': 每类边 {'edge_index': LongTensor, 'edge_attr': FloatTensor}，无边时为 None
+        需要 PyG 对象时用 to_pyg_data(graph_data)。
+        """
         try:
             nodes = self._create_nodes(dqn_list, vehicle_list)
-            edges = self._create_edges(nodes, dqn_list, vehicle_list, epoch)
-            graph_data = {
-                'nodes': nodes,
-                'edges': edges,
-                'node_features': self._extract_node_features(nodes, dqn_list, vehicle_list),
-                'edge_features': self._extract_edge_features(edges, nodes),
-                'metadata': {'epoch': epoch, 'num_rsu_nodes': len(dqn_list)}
-            }
-            return graph_data
+            return self.assemble_graph(nodes, dqn_list, vehicle_list, epoch)
         except Exception as e:
             print(f"\n[CRITICAL ERROR] Graph Build Failed at Epoch {epoch}!")
             traceback.print_exc(file=sys.stdout)
             raise e
 
+    def assemble_graph(self, nodes, dqn_list, vehicle_list, epoch, candidates=None):
+        """
+        由节点数组构建三类边并打包为图数据
+
+        Args:
+            candidates: (可选) 预先给出的候选节点对 (IncrementalGraphBuilder 使用)，
+                {'communication' / 'interference': (RSU 行号, 车辆行号), 'proximity': (i, j) 且 i < j}，
+                均按 (i, j) 升序。
+                候选只需是真实边的超集，精确判定与特征计算和整图构建相同。
+        """
+        edges = self._create_edges(nodes, dqn_list, vehicle_list, epoch, candidates)
+        return {
+            'nodes': nodes,
+            'rsu_row': {int(dqn_id): row for row, dqn_id in enumerate(nodes['rsu_ids'])},
+            'edges': edges,
+            'node_features': self._extract_node_features(nodes, dqn_list, vehicle_list),
+            'edge_features': self._extract_edge_features(edges, nodes),
+            'metadata': {'epoch': epoch, 'num_rsu_nodes': len(dqn_list)}
+        }
+
     def _create_nodes(self, dqn_list, vehicle_list):
-        nodes = {'rsu_nodes': [], 'vehicle_nodes': []}
-        for i, dqn in enumerate(dqn_list):
-            nodes['rsu_nodes'].append({
-                'id': f"rsu_{dqn.dqn_id}", 'type': 'rsu', 'original_id': dqn.dqn_id,
-                'position': (dqn.bs_loc[0], dqn.bs_loc[1]),
-                'features': self._extract_rsu_features(dqn)
-            })
-        for i, vehicle in enumerate(vehicle_list):
-            nodes['vehicle_nodes'].append({
-                'id': f"vehicle_{vehicle.id}", 'type': 'vehicle', 'original_id': vehicle.id,
-                'position': vehicle.curr_loc, 'direction': vehicle.curr_dir,
-                'features': self._extract_vehicle_features(vehicle)
-            })
-        return nodes
+        """节点数组: RSU / 车辆 ID、位置与特征矩阵 (车辆部分直接取自车队数组)"""
+        num_rsu = len(dqn_list)
+        rsu_pos = np.array([(dqn.bs_loc[0], dqn.bs_loc[1]) for dqn in dqn_list], dtype=float).reshape(-1, 2)
+        vehicle_ids, vehicle_pos, vehicle_dir, first_occur = self._vehicle_arrays(vehicle_list)
+
+        rsu_features = np.array([self._extract_rsu_features(dqn) for dqn in dqn_list],
+                                dtype=float).reshape(-1, self.rsu_feature_dim)
+        return {
+            'num_rsu': num_rsu,
+            'rsu_ids': np.array([dqn.dqn_id for dqn in dqn_list], dtype=np.int64),
+            'vehicle_ids': vehicle_ids,
+            'positions': np.concatenate([rsu_pos, vehicle_pos]),
+            'rsu_features': rsu_features,
+            'vehicle_features': self._extract_vehicle_features(vehicle_list, vehicle_pos, vehicle_dir, first_occur),
+        }
+
+    @staticmethod
+    def _vehicle_arrays(vehicle_list):
+        """车辆 ID / 位置 / 方向 / 首次出现标志；vehicle_list 就是全局车队时直接使用车队数组"""
+        from VehicleFleet import global_vehicle_fleet
+        fleet = global_vehicle_fleet
+        if vehicle_list is fleet.vehicles and len(fleet.ids) == len(vehicle_list):
+            return fleet.ids, fleet.positions, fleet.directions, fleet.first_occur
+        ids = np.array([v.id for v in vehicle_list], dtype=np.int64)
+        positions = np.array([v.curr_loc for v in vehicle_list], dtype=float).reshape(-1, 2)
+        directions = np.array([v.curr_dir for v in vehicle_list], dtype=np.int64).reshape(-1, 2)
+        first_occur = np.array([v.first_occur for v in vehicle_list], dtype=bool)
+        return ids, positions, directions, first_occur
 
     def _extract_rsu_features(self, dqn):
         # 1. 基础特征 (5)
         vehicle_count = len(dqn.vehicle_in_dqn_range_by_distance) if hasattr(dqn,
                                                                              'vehicle_in_dqn_range_by_distance') else 0
         features = [
-            dqn.bs_loc[0] / SCENE_SCALE_X,
-            dqn.bs_loc[1] / SCENE_SCALE_Y,
+            dqn.bs_loc[0] / Parameters.SCENE_SCALE_X,
+            dqn.bs_loc[1] / Parameters.SCENE_SCALE_Y,
             float(getattr(dqn, 'vehicle_exist_curr', False)),
             vehicle_count / 10.0,
             getattr(dqn, 'prev_snr', 0.0) / 50.0,
@@ -126,211 +222,163 @@ class GraphBuilder:
 
         return features
 
-    def _extract_vehicle_features(self, vehicle):
-        features = [
-            vehicle.curr_loc[0] / SCENE_SCALE_X,
-            vehicle.curr_loc[1] / SCENE_SCALE_Y,
-            (vehicle.curr_dir[0] + 1) / 2.0,
-            (vehicle.curr_dir[1] + 1) / 2.0,
-            float(vehicle.first_occur),
-        ]
-        dist = vehicle.distance_to_bs / 1000.0 if (
-                    hasattr(vehicle, 'distance_to_bs') and vehicle.distance_to_bs is not None) else 0.0
-        features.append(dist)
-
-        if len(features) < self.vehicle_feature_dim:
-            features.extend([0.0] * (self.vehicle_feature_dim - len(features)))
-        else:
-            features = features[:self.vehicle_feature_dim]
+    def _extract_vehicle_features(self, vehicle_list, positions, directions, first_occur):
+        """车辆特征矩阵 (V, 6): [x, y 归一化位置, 方向 (0~1), 首次出现, 到 RSU 距离 (km)]"""
+        distance = np.fromiter((v.distance_to_bs if getattr(v, 'distance_to_bs', None) is not None else 0.0
+                                for v in vehicle_list), dtype=float, count=len(vehicle_list))
+        features = np.zeros((len(vehicle_list), self.vehicle_feature_dim))
+        features[:, 0] = positions[:, 0] / Parameters.SCENE_SCALE_X
+        features[:, 1] = positions[:, 1] / Parameters.SCENE_SCALE_Y
+        features[:, 2] = (directions[:, 0] + 1) / 2.0
+        features[:, 3] = (directions[:, 1] + 1) / 2.0
+        features[:, 4] = first_occur
+        features[:, 5] = distance / 1000.0
         return features
 
-    def _create_edges(self, nodes, dqn_list, vehicle_list, epoch):
-        # 1. 先计算通信边，因为我们需要知道谁在服务谁
-        comm_edges = self._calculate_communication_edges(nodes, dqn_list, vehicle_list)
+    def _create_edges(self, nodes, dqn_list, vehicle_list, epoch, candidates=None):
+        """
+        构建三类边
+
+        每类边都以数组形式给出: {'edge_index': (2, E) 节点下标, 'edge_attr': (E, 4)}，
+        节点下标按 RSU 节点在前、车辆节点在后的顺序编号。
+        """
+        candidates = candidates or {}
 
-        # 2. 建立一个映射表：记录哪个 RSU 正在服务哪个 Vehicle
-        # 格式: {rsu_node_id: set(served_vehicle_node_ids)}
-        rsu_service_map = defaultdict(set)
-        for edge in comm_edges:
-            rsu_service_map[edge['source']].add(edge['target'])
+        # 1. 先计算通信边，因为我们需要知道谁在服务谁
+        comm_edges = self._calculate_communication_edges(nodes, dqn_list, vehicle_list,
+                                                         candidates.get('communication'))
 
         edges = {
             'communication': comm_edges,
-            # 3. 传入服务映射表来计算正确的干扰边
-            'interference': self._calculate_interference_edges(nodes, rsu_service_map),
-            'proximity': self._calculate_proximity_edges(nodes, dqn_list, vehicle_list)
+            # 2. 通信边即服务关系，用来计算正确的干扰边
+            'interference': self._calculate_interference_edges(nodes, comm_edges, candidates.get('interference')),
+            'proximity': self._calculate_proximity_edges(nodes, dqn_list, vehicle_list, candidates.get('proximity'))
         }
         return edges
 
-    def _calculate_interference_edges(self, nodes, rsu_service_map):
+    def _calculate_interference_edges(self, nodes, comm_edges, candidates=None):
         """
-        物理感知 + 信道模型一致的干扰边构建
+        物理感知 + 信道模型一致的干扰边构建 (向量化)
+
+        RSU 与非本 RSU 服务的车辆距离小于 interference_threshold 时，连一条 车辆 -> RSU 的干扰边。
+        候选对由半径查询得到，路径损耗 (确定性损耗 + 阴影衰落) 从本 epoch 的链路实现批量读取。
         """
-        interference_edges = []
         interf_threshold = self.interference_threshold
+        num_rsu = nodes['num_rsu']
+        rsu_pos, veh_pos = _split_positions(nodes)
+
+        r, v = _pairs_between(rsu_pos, veh_pos, interf_threshold) if candidates is None else candidates
+        dist = _planar_distance(rsu_pos[r], veh_pos[v])
+        keep = dist < interf_threshold
+
+        # 排除自己人 (本 RSU 正在服务的车辆，即通信边 RSU -> 车辆)
+        served_rsu, served_vehicle = comm_edges['edge_index']
+        served = served_rsu * len(veh_pos) + (served_vehicle - num_rsu)
+        keep &= ~np.isin(r * len(veh_pos) + v, served)
+        r, v, dist = r[keep], v[keep], dist[keep]
+
+        # 读取本 epoch 的链路实现，与奖励计算使用同一阴影衰落
+        if len(r):
+            _, total_pl_db, _, _ = global_link_cache.get_link(rsu_pos[r], veh_pos[v])
+        else:
+            total_pl_db = np.zeros(0)
 
+        # === 特征工程: [权重 (距离越近越大), 归一化距离, 真实 PathLoss (与通信边同样除以 100), 0.0] ===
+        edge_attr = np.zeros((len(r), self.comm_edge_feature_dim))
+        edge_attr[:, 0] = 1.0 - (dist / interf_threshold)
+        edge_attr[:, 1] = dist / 1000.0
+        edge_attr[:, 2] = np.asarray(total_pl_db, dtype=float).reshape(-1) / 100.0
 
-        for rsu_node in nodes['rsu_nodes']:
-            rsu_id = rsu_node['id']
-            rsu_pos = np.array(rsu_node['position'])
-            my_served_vehicles = rsu_service_map.get(rsu_id, set())
-
-            for vehicle_node in nodes['vehicle_nodes']:
-                veh_id = vehicle_node['id']
-                if veh_id in my_served_vehicles: continue  # 排除自己人
-
-                veh_pos = np.array(vehicle_node['position'])
-                dist = np.linalg.norm(rsu_pos - veh_pos)
-
-                if dist < interf_threshold:
-
-                    # 计算准确的 Path Loss (包含 UMi 模型的确定性损耗 + 阴影衰落)
-                    # 为了严谨，我们加上高度差 (假设 RSU 10m, 车 1.5m)
-                    delta_h = 10.0 - 1.5
-                    dist_3d = np.sqrt(dist ** 2 + delta_h ** 2)
-
-                    # 调用 ChannelModel
-                    total_pl_db, _, _ = global_channel_model.calculate_path_loss(dist_3d)
-
-                    # === 特征工程 ===
-                    # 1. 权重: 距离越近权重越大 (用于聚合)
-                    weight = 1.0 - (dist / interf_threshold)
-
-                    # 2. 距离归一化 (Input Feature 1)
-                    norm_dist = dist / 1000.0
-
-                    # 3. Path Loss 归一化 (Input Feature 2)
-                    # 你的通信边是除以 100.0，这里保持一致
-                    norm_pl = total_pl_db / 100.0
-
-                    # 4. 构造 4 维特征: [权重, 归一化距离, 真实PathLoss, 0.0]
-                    features = [weight, norm_dist, norm_pl, 0.0]
-
-                    interference_edges.append({
-                        'source': veh_id,
-                        'target': rsu_id,
-                        'type': 'interference',
-                        'features': features
-                    })
-
-        return interference_edges
-
-    def _calculate_communication_edges(self, nodes, dqn_list, vehicle_list):
-        communication_edges = []
-        for rsu_node in nodes['rsu_nodes']:
-            rsu_dqn = next((d for d in dqn_list if d.dqn_id == rsu_node['original_id']), None)
-            if not rsu_dqn: continue
-
-            for vehicle_node in nodes['vehicle_nodes']:
-                vehicle = next((v for v in vehicle_list if v.id == vehicle_node['original_id']), None)
-                if not vehicle: continue
-
-                if (rsu_dqn.start[0] <= vehicle.curr_loc[0] <= rsu_dqn.end[0] and
-                        rsu_dqn.start[1] <= vehicle.curr_loc[1] <= rsu_dqn.end[1]):
-                    try:
-                        distance = global_channel_model.calculate_3d_distance(
-                            (rsu_dqn.bs_loc[0], rsu_dqn.bs_loc[1]), vehicle.curr_loc)
-
-                        base_power = TRANSMITTDE_POWER * 0.1
-                        csi_info = global_channel_model.get_channel_state_info(
-                            (rsu_dqn.bs_loc[0], rsu_dqn.bs_loc[1]), vehicle.curr_loc,
-                            tx_power=base_power, bandwidth=V2V_CHANNEL_BANDWIDTH
-                        )
-                        features = [
-                            1.0 - (distance / self.communication_threshold),
-                            distance / 1000.0,
-                            csi_info['path_loss_total_db'] / 100.0,
-                            csi_info['snr_db'] / 20.0
-                        ]
-                        if distance <= self.communication_threshold:
-                            communication_edges.append({
-                                'source': rsu_node['id'], 'target': vehicle_node['id'],
-                                'type': 'communication', 'distance': distance, 'features': features
-                            })
-                    except:
-                        pass
-        return communication_edges
-
-
-    def _calculate_proximity_edges(self, nodes, dqn_list, vehicle_list):
-        proximity_edges = []
-        all_nodes = nodes['rsu_nodes'] + nodes['vehicle_nodes']
-        for i, node_i in enumerate(all_nodes):
-            for j, node_j in enumerate(all_nodes):
-                if i >= j: continue
-                dist = np.sqrt((node_i['position'][0] - node_j['position'][0]) ** 2 + (
-                            node_i['position'][1] - node_j['position'][1]) ** 2)
-                if dist <= self.proximity_threshold:
-                    proximity_edges.append({
-                        'source': node_i['id'], 'target': node_j['id'],
-                        'type': 'proximity', 'distance': dist, 'weight': 1.0 - (dist / self.proximity_threshold)
-                    })
-        return proximity_edges
+        # 方向: 车辆 (source) -> RSU (target)
+        edge_index = np.stack([v + num_rsu, r]).astype(np.int64)
+        return {'edge_index': edge_index, 'edge_attr': edge_attr}
 
-    def _extract_node_features(self, nodes, dqn_list, vehicle_list):
-        """
-        提取节点特征矩阵
+    def _calculate_communication_edges(self, nodes, dqn_list, vehicle_list, candidates=None):
         """
-        all_features = []
-        node_types = []
+        RSU -> 车辆 通信边 (向量化)
 
-        # 1. 收集 RSU 特征
-        for rsu_node in nodes['rsu_nodes']:
-            all_features.append(rsu_node['features'])
-            node_types.append(0)  # 0 代表 RSU 类型
-
-        # 2. 收集 Vehicle 特征
-        for vehicle_node in nodes['vehicle_nodes']:
-            all_features.append(vehicle_node['features'])
-            node_types.append(1)  # 1 代表 Vehicle 类型
-
-        # 3. 维度对齐 (Padding)
-        # 确保所有特征向量长度一致，不足的补 0
-        feature_lengths = [len(f) for f in all_features]
-        max_len = max(feature_lengths) if feature_lengths else 0
-
-        for i in range(len(all_features)):
-            if len(all_features[i]) < max_len:
-                all_features[i].extend([0.0] * (max_len - len(all_features[i])))
+        车辆位于 RSU 路段包围盒内且 3D 距离不超过 communication_threshold 时连边。
+        候选对来自半径查询 (2D 距离不超过 3D 距离，候选集合不会漏边)，
+        包围盒与距离阈值均为向量掩码，CSI 特征从本 epoch 的链路实现批量计算。
+        特征: [1 - d / 阈值, d / 1000, 总路径损耗 / 100, SNR(dB) / 20]
+        """
+        num_rsu = nodes['num_rsu']
+        rsu_pos, veh_pos = _split_positions(nodes)
+
+        # RSU 节点行号与 dqn_list 顺序一致 -> 路段包围盒
+        box = np.array([(dqn.start[0], dqn.start[1], dqn.end[0], dqn.end[1]) for dqn in dqn_list],
+                       dtype=float).reshape(-1, 4)
+
+        r, v = _pairs_between(rsu_pos, veh_pos, self.communication_threshold) if candidates is None else candidates
+        p = veh_pos[v]
+        in_box = ((box[r, 0] <= p[:, 0]) & (p[:, 0] <= box[r, 2]) &
+                  (box[r, 1] <= p[:, 1]) & (p[:, 1] <= box[r, 3]))
+        r, v = r[in_box], v[in_box]
+
+        # 与 ChannelModel.calculate_3d_distance 相同的运算顺序
+        d_2d = _planar_distance(rsu_pos[r], veh_pos[v])
+        height = global_channel_model.antenna_height_bs - global_channel_model.antenna_height_ue
+        distance = np.sqrt(d_2d ** 2 + height ** 2)
+        keep = distance <= self.communication_threshold
+        r, v, distance = r[keep], v[keep], distance[keep]
+
+        edge_attr = np.zeros((len(r), self.comm_edge_feature_dim))
+        if len(r):
+            # 与 LinkCache.get_channel_state_info 一致 (基准功率 10%，V2V 带宽，无波束增益)
+            _, total_pl_db, _, _ = global_link_cache.get_link(rsu_pos[r], veh_pos[v])
+            total_pl_db = np.asarray(total_pl_db, dtype=float).reshape(-1)
+            base_power = TRANSMITTDE_POWER * 0.1
+            noise_power = global_channel_model._calculate_noise_power(V2V_CHANNEL_BANDWIDTH)
+            received_power = base_power * 10 ** (-(total_pl_db + 0) / 10)
+            snr_db = 10 * np.log10(np.maximum(received_power / noise_power, 1e-20))
+
+            edge_attr[:, 0] = 1.0 - (distance / self.communication_threshold)
+            edge_attr[:, 1] = distance / 1000.0
+            edge_attr[:, 2] = total_pl_db / 100.0
+            edge_attr[:, 3] = snr_db / 20.0
+
+        edge_index = np.stack([r, v + num_rsu]).astype(np.int64)
+        # 边已按 (RSU, 车辆) 排序: CSR 偏移给出每个 RSU 服务的车辆区间
+        ptr = np.searchsorted(r, np.arange(num_rsu + 1)).astype(np.int64)
+        return {'edge_index': edge_index, 'edge_attr': edge_attr, 'ptr': ptr}
+
+    def _calculate_proximity_edges(self, nodes, dqn_list, vehicle_list, candidates=None):
+        """所有节点 (RSU + 车辆) 之间距离不超过 proximity_threshold 的无向邻近边 (i < j)，特征为 [权重, 0, 0, 0]"""
+        positions = nodes['positions']
+        i, j = _pairs_within(positions, self.proximity_threshold) if candidates is None else candidates
+        dist = _planar_distance(positions[i], positions[j])
+        keep = dist <= self.proximity_threshold
+        i, j, dist = i[keep], j[keep], dist[keep]
+
+        edge_attr = np.zeros((len(i), self.comm_edge_feature_dim))
+        edge_attr[:, 0] = 1.0 - (dist / self.proximity_threshold)
+        return {'edge_index': np.stack([i, j]).astype(np.int64), 'edge_attr': edge_attr}
 
-        # 4. 转换为 Tensor
+    def _extract_node_features(self, nodes, dqn_list, vehicle_list):
+        """
+        节点特征矩阵 (RSU 在前、车辆在后，车辆特征右侧补 0 对齐到 RSU 特征维度) 与节点类型 (0 = RSU, 1 = 车辆)
+        """
+        num_rsu, num_vehicle = nodes['num_rsu'], len(nodes['vehicle_ids'])
+        features = np.zeros((num_rsu + num_vehicle, self.max_feature_dim))
+        features[:num_rsu, :self.rsu_feature_dim] = nodes['rsu_features']
+        features[num_rsu:, :self.vehicle_feature_dim] = nodes['vehicle_features']
+        node_types = np.concatenate([np.zeros(num_rsu, dtype=np.int64), np.ones(num_vehicle, dtype=np.int64)])
         return {
-            'features': torch.FloatTensor(all_features),
-            'types': torch.LongTensor(node_types)
+            'features': torch.as_tensor(features, dtype=torch.float32),
+            'types': torch.as_tensor(node_types)
         }
 
     def _extract_edge_features(self, edges, nodes):
+        """数组形式的边 -> Tensor (edge_index: LongTensor (2, E), edge_attr: FloatTensor (E, 4))；无边时为 None"""
         edge_features = {}
-        node_id_to_index = {node['id']: idx for idx, node in enumerate(nodes['rsu_nodes'] + nodes['vehicle_nodes'])}
-
         for edge_type in self.edge_types:
-            edge_list = edges[edge_type]
-            if not edge_list:
+            edge_arrays = edges[edge_type]
+            if edge_arrays['edge_index'].shape[1] == 0:
                 edge_features[edge_type] = None
                 continue
-
-            edge_indices = []
-            edge_attrs = []
-            for edge in edge_list:
-                # 构建边索引
-                edge_indices.append([node_id_to_index[edge['source']], node_id_to_index[edge['target']]])
-                # 只要字典里有 'features' 就直接用，没有再补 0
-
-                if 'features' in edge:
-                    # 情况 A: 这是一个包含完整 4 维特征的边 (通信边 OR 干扰边)
-                    edge_attrs.append(edge['features'])
-                elif 'weight' in edge:
-                    # 情况 B: 这是一个只有权重的边 (比如 proximity)，需要补 0 对齐到 4 维
-                    # padding 逻辑: [weight, 0, 0, 0]
-                    padding = [0.0] * (self.comm_edge_feature_dim - 1)
-                    edge_attrs.append([edge['weight']] + padding)
-                else:
-                    # 情况 C: 既没特征也没权重 (防御性编程)，全补 0
-                    edge_attrs.append([0.0] * self.comm_edge_feature_dim)
-
             edge_features[edge_type] = {
-                'edge_index': torch.LongTensor(edge_indices).t().contiguous(),
-                'edge_attr': torch.FloatTensor(edge_attrs)  # 转换为 Tensor
+                'edge_index': torch.as_tensor(edge_arrays['edge_index'], dtype=torch.long).contiguous(),
+                'edge_attr': torch.as_tensor(edge_arrays['edge_attr'], dtype=torch.float32)
             }
         return edge_features
 
@@ -344,5 +392,143 @@ class GraphBuilder:
             (v.curr_loc[0] - center_pos[0]) ** 2 + (v.curr_loc[1] - center_pos[1]) ** 2) <= radius]
         return self.build_dynamic_graph(filtered_dqns, filtered_vehicles, epoch)
 
+    def spatial_subgraph(self, graph_data, center_dqn, radius=GNN_INFERENCE_RADIUS):
+        """
+        从已构建的全局图中切出以 center_dqn 为中心的子图 (与 build_spatial_subgraph 的节点选取规则相同)
+
+        所有节点特征与边都只取决于节点自身或节点对，因此诱导子图与在过滤后的节点上重新构建逐位一致，
+        但只需要一次节点掩码与边过滤。
+        """
+        nodes = graph_data['nodes']
+        center_row = graph_data['rsu_row'][center_dqn.dqn_id]
+        center_pos = nodes['positions'][center_row]
+        delta = nodes['positions'] - center_pos
+        node_mask = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2) <= radius
+        node_mask[center_row] = True
+        return self.slice_subgraph(graph_data, node_mask)
+
+    def slice_subgraph(self, graph_data, node_mask):
+        """
+        诱导子图: 保留 node_mask 选中的节点与两端都被选中的边，节点按原顺序重新编号
+
+        Args:
+            graph_data: build_dynamic_graph 的输出
+            node_mask: (R + V,) 布尔数组
+        """
+        nodes = graph_data['nodes']
+        num_rsu = nodes['num_rsu']
+        new_index = np.cumsum(node_mask) - 1  # 原节点下标 -> 子图节点下标 (未选中的节点无意义)
+        rsu_mask, vehicle_mask = node_mask[:num_rsu], node_mask[num_rsu:]
+        sub_num_rsu = int(np.count_nonzero(rsu_mask))
+        keep_rows = torch.as_tensor(np.flatnonzero(node_mask), dtype=torch.long)
+
+        sub_nodes = {
+            'num_rsu': sub_num_rsu,
+            'rsu_ids': nodes['rsu_ids'][rsu_mask],
+            'vehicle_ids': nodes['vehicle_ids'][vehicle_mask],
+            'positions': nodes['positions'][node_mask],
+            'rsu_features': nodes['rsu_features'][rsu_mask],
+            'vehicle_features': nodes['vehicle_features'][vehicle_mask],
+        }
+
+        # 边过滤与重新编号: 保留顺序不变，因此各类边仍按 (源, 目标) 有序
+        sub_edges = {}
+        for edge_type, edge_arrays in graph_data['edges'].items():
+            src, dst = edge_arrays['edge_index']
+            keep = node_mask[src] & node_mask[dst]
+            sub_edges[edge_type] = {
+                'edge_index': np.stack([new_index[src[keep]], new_index[dst[keep]]]).astype(np.int64),
+                'edge_attr': edge_arrays['edge_attr'][keep],
+            }
+        comm_src = sub_edges['communication']['edge_index'][0]
+        sub_edges['communication']['ptr'] = np.searchsorted(comm_src, np.arange(sub_num_rsu + 1)).astype(np.int64)
+
+        node_features = graph_data['node_features']
+        device = node_features['features'].device
+        keep_rows = keep_rows.to(device)
+        return {
+            'nodes': sub_nodes,
+            'rsu_row': {int(dqn_id): row for row, dqn_id in enumerate(sub_nodes['rsu_ids'])},
+            'edges': sub_edges,
+            'node_features': {
+                'features': node_features['features'].index_select(0, keep_rows),
+                'types': node_features['types'].index_select(0, keep_rows),
+            },
+            'edge_features': self._extract_edge_features(sub_edges, sub_nodes),
+            'metadata': dict(graph_data['metadata'], num_rsu_nodes=sub_num_rsu)
+        }
+
+    def collate(self, graphs):
+        """
+        多个图 -> 不相交并图 (一次消息传递即可处理全部图)
+
+        节点按图依次拼接，边下标加上所在图的节点偏移。并图中 RSU 节点不再连续，
+        因此用 RSU 槽位描述: 'rsu_nodes' (K,) 为各 RSU 的节点行号 (按图、再按图内 RSU 行号排列)，
+        'rsu_graph' (K,) 为所属图，'rsu_ptr' (B + 1,) 为每个图的 RSU 槽位区间；
+        通信边的 'ptr' (K + 1,) 按槽位给出服务车辆区间 (与单图的含义相同)。
+        节点 / 边张量保持原设备，可直接用于已在 GPU 上的图。
+        """
+        num_nodes = [g['node_features']['features'].size(0) for g in graphs]
+        node_offsets = np.concatenate([[0], np.cumsum(num_nodes)]).astype(np.int64)
+        num_rsu = [g['nodes']['num_rsu'] for g in graphs]
+        rsu_ptr = np.concatenate([[0], np.cumsum(num_rsu)]).astype(np.int64)
+
+        rsu_nodes = np.concatenate([np.arange(r, dtype=np.int64) + off for r, off in zip(num_rsu, node_offsets)])
+        nodes = {
+            'num_rsu': int(rsu_ptr[-1]),
+            'rsu_nodes': rsu_nodes,
+            'rsu_ids': np.concatenate([g['nodes']['rsu_ids'] for g in graphs]).astype(np.int64),
+            'rsu_graph': np.repeat(np.arange(len(graphs)), num_rsu).astype(np.int64),
+            'rsu_ptr': rsu_ptr,
+            'graph_ptr': node_offsets,
+        }
+
+        edges, edge_features = {}, {}
+        for edge_type in self.edge_types:
+            edges[edge_type] = {
+                'edge_index': np.concatenate([g['edges'][edge_type]['edge_index'] + off
+                                              for g, off in zip(graphs, node_offsets)], axis=1).astype(np.int64),
+                'edge_attr': np.concatenate([g['edges'][edge_type]['edge_attr'] for g in graphs]),
+            }
+            parts = [(g['edge_features'][edge_type], off) for g, off in zip(graphs, node_offsets)
+                     if g['edge_features'][edge_type] is not None]
+            edge_features[edge_type] = None if not parts else {
+                'edge_index': torch.cat([ef['edge_index'] + int(off) for ef, off in parts], dim=1),
+                'edge_attr': torch.cat([ef['edge_attr'] for ef, _ in parts], dim=0),
+            }
+        # 各图的通信边按源 RSU 有序，拼接后整体仍有序: 槽位 k 的区间起点即其节点行号在源数组中的位置
+        comm_src = edges['communication']['edge_index'][0]
+        edges['communication']['ptr'] = np.append(np.searchsorted(comm_src, rsu_nodes),
+                                                  len(comm_src)).astype(np.int64)
+
+        return {
+            'nodes': nodes,
+            'edges': edges,
+            'node_features': {
+                'features': torch.cat([g['node_features']['features'] for g in graphs], dim=0),
+                'types': torch.cat([g['node_features']['types'] for g in graphs], dim=0),
+            },
+            'edge_features': edge_features,
+            'metadata': {'num_graphs': len(graphs), 'num_rsu_nodes': int(rsu_ptr[-1])}
+        }
+
+def to_pyg_data(graph_data):
+    """
+    张量化图 -> torch_geometric.data.Data
+
+    x / node_type 为节点特征与类型；每类边保存为 edge_index_<类型> / edge_attr_<类型>
+    (名称含 "index"，Batch.from_data_list 拼接时按节点数自动偏移)；rsu_ids 为 RSU 节点行号对应的 dqn_id。
+    """
+    if Data is None:
+        raise ImportError("torch_geometric is required for to_pyg_data")
+    node_features = graph_data['node_features']
+    data = Data(x=node_features['features'], node_type=node_features['types'],
+                rsu_ids=torch.as_tensor(graph_data['nodes']['rsu_ids']),
+                num_nodes=node_features['features'].size(0))
+    for edge_type, edge_arrays in graph_data['edges'].items():
+        data[f'edge_index_{edge_type}'] = torch.as_tensor(edge_arrays['edge_index'], dtype=torch.long)
+        data[f'edge_attr_{edge_type}'] = torch.as_tensor(edge_arrays['edge_attr'], dtype=torch.float32)
+    return data
+
 
 global_graph_builder = GraphBuilder()
\ No newline at end of file
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+import time
+import numpy as np
+import torch
+from logger import debug, debug_print, set_debug_mode
+from GraphBuilder import global_graph_builder, RADIUS_QUERY_SLACK
+
+# 车辆网格单元坐标的偏移量 (单元坐标 + 偏移后编码为单个 int64 键，允许负坐标)
+_CELL_KEY_OFFSET = 1 << 20
+# 3x3 邻域偏移
+_NEIGHBOR_OFFSETS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+class IncrementalGraphBuilder:
+    """
+    增量维护的动态图 (与 GraphBuilder.build_dynamic_graph 输出逐位一致)
+
+    RSU 不移动: RSU-RSU 邻近候选对与 "网格单元 -> 通信半径内 RSU" 查找表只在 RSU 集合变化时构建。
+    车辆按 ID 与上一步对齐 (离开的车辆删除，新生车辆加入)，持久保存每辆车的网格单元
+    (边长 = 邻近阈值) 与车辆-车辆候选对 (所在单元相邻的车辆对)。每一步只有新生车辆和
+    跨越网格单元的车辆需要重新查找邻居，其余候选对直接保留。
+    候选对是真实边的超集，精确判定与边特征 (距离 / 路径损耗 / SNR) 仍由 GraphBuilder 批量计算；
+    由于所有车辆每步都在移动，节点特征与边特征每步都要更新，增量部分是邻域结构。
+
+    返回的图数据不引用内部状态，可以直接放入经验回放。
+    """
+
+    def __init__(self, graph_builder=global_graph_builder, cell_size=None):
+        self.graph_builder = graph_builder
+        self.cell_size = float(cell_size if cell_size is not None else graph_builder.proximity_threshold)
+        # 查找表覆盖的最大 RSU 半径
+        self.rsu_radius = max(graph_builder.communication_threshold, graph_builder.interference_threshold,
+                              graph_builder.proximity_threshold)
+        if self.cell_size < graph_builder.proximity_threshold:
+            raise ValueError(f"cell_size {self.cell_size} must be >= proximity threshold "
+                             f"{graph_builder.proximity_threshold}")
+        self.reset()
+
+    def reset(self):
+        """丢弃全部持久状态 (下一次 update 等价于整图构建)"""
+        self._rsu_key = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.cells = np.zeros((0, 2), dtype=np.int64)
+        self.pair_i = np.zeros(0, dtype=np.int64)
+        self.pair_j = np.zeros(0, dtype=np.int64)
+        self.stats = {'vehicles': 0, 'spawned': 0, 'removed': 0, 'cell_crossings': 0, 'candidate_pairs': 0}
+
+    # ------------------------------------------------------------------
+    # RSU 静态结构
+    # ------------------------------------------------------------------
+    def _build_rsu_tables(self, rsu_pos, rsu_box):
+        """
+        RSU-RSU 邻近候选对与 "网格单元 -> RSU" 查找表 (CSR，每类边一张):
+        通信边要求单元与 RSU 路段包围盒相交且在通信半径内，干扰 / 邻近边只看半径
+        """
+        num_rsu = len(rsu_pos)
+        i, j = np.triu_indices(num_rsu, k=1)
+        self.rsu_pairs = np.stack([i, j]).astype(np.int64)
+
+        radius = self.rsu_radius * (1 + RADIUS_QUERY_SLACK)
+        if num_rsu:
+            self.origin = np.floor((rsu_pos.min(axis=0) - radius) / self.cell_size) * self.cell_size
+            extent = rsu_pos.max(axis=0) + radius - self.origin
+        else:
+            self.origin, extent = np.zeros(2), np.zeros(2)
+        self.grid_shape = np.floor(extent / self.cell_size).astype(np.int64) + 1
+
+        # 单元矩形到 RSU 的最近距离
+        cx, cy = np.meshgrid(np.arange(self.grid_shape[0]), np.arange(self.grid_shape[1]), indexing='ij')
+        lo = np.stack([cx.ravel(), cy.ravel()], axis=-1) * self.cell_size + self.origin
+        hi = lo + self.cell_size
+        gap = np.maximum(np.maximum(lo[:, None, :] - rsu_pos[None, :, :], rsu_pos[None, :, :] - hi[:, None, :]), 0.0)
+        cell_distance = np.sqrt(gap[..., 0] ** 2 + gap[..., 1] ** 2)
+
+        overlaps_box = np.all((lo[:, None, :] <= rsu_box[None, :, 2:]) & (rsu_box[None, :, :2] <= hi[:, None, :]),
+                              axis=-1)
+        builder = self.graph_builder
+        self._tables = {
+            'communication': self._cell_table(overlaps_box & (cell_distance <= radius)),
+            'interference': self._cell_table(
+                cell_distance <= builder.interference_threshold * (1 + RADIUS_QUERY_SLACK)),
+            'proximity': self._cell_table(cell_distance <= builder.proximity_threshold * (1 + RADIUS_QUERY_SLACK)),
+        }
+        debug(f"IncrementalGraphBuilder RSU tables: {num_rsu} RSUs, grid {tuple(self.grid_shape)}, "
+              f"{ {k: len(t[1]) for k, t in self._tables.items()} } cell-RSU entries")
+
+    @staticmethod
+    def _cell_table(near):
+        """(单元数, R) 布尔矩阵 -> CSR (单元偏移, RSU 行号)"""
+        cell_id, rsu_row = np.nonzero(near)
+        return np.searchsorted(cell_id, np.arange(near.shape[0] + 1)).astype(np.int64), rsu_row.astype(np.int64)
+
+    def _rsu_vehicle_candidates(self, cells, table):
+        """车辆所在单元登记的 RSU -> (RSU 行号, 车辆行号)，按 (RSU, 车辆) 升序"""
+        cell_ptr, cell_rsu = table
+        inside = np.all((cells >= 0) & (cells < self.grid_shape), axis=1)
+        vehicle = np.flatnonzero(inside)
+        cell_id = cells[vehicle, 0] * self.grid_shape[1] + cells[vehicle, 1]
+        begin = cell_ptr[cell_id]
+        counts = cell_ptr[cell_id + 1] - begin
+        cand_vehicle = np.repeat(vehicle, counts)
+        offsets = np.arange(len(cand_vehicle)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cand_rsu = cell_rsu[np.repeat(begin, counts) + offsets]
+        order = np.lexsort((cand_vehicle, cand_rsu))
+        return cand_rsu[order], cand_vehicle[order]
+
+    # ------------------------------------------------------------------
+    # 车辆邻域的增量维护
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _cell_keys(cells):
+        return (cells[:, 0] + _CELL_KEY_OFFSET) * (2 * _CELL_KEY_OFFSET) + (cells[:, 1] + _CELL_KEY_OFFSET)
+
+    def _neighbors(self, query_rows, cells):
+        """query_rows 中每辆车与其 3x3 邻域单元内的全部其他车辆 -> (query 行号, 邻居行号)"""
+        keys = self._cell_keys(cells)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        query = np.repeat(query_rows, len(_NEIGHBOR_OFFSETS))
+        neighbor_cells = (cells[query_rows][:, None, :] + _NEIGHBOR_OFFSETS[None, :, :]).reshape(-1, 2)
+        neighbor_keys = self._cell_keys(neighbor_cells)
+        begin = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+        counts = np.searchsorted(sorted_keys, neighbor_keys, side='right') - begin
+
+        a = np.repeat(query, counts)
+        offsets = np.arange(len(a)) - np.repeat(np.cumsum(counts) - counts, counts)
+        b = order[np.repeat(begin, counts) + offsets]
+        keep = a != b
+        return a[keep], b[keep]
+
+    def _update_vehicle_pairs(self, ids, cells):
+        """
+        对齐车辆 ID 并维护车辆-车辆候选对 (当前车辆行号 i < j，按 (i, j) 升序)
+
+        不变量: 候选对 = 所在网格单元相邻 (含同一单元) 的全部车辆对。
+        两端都未跨单元的候选对只把行号映射到新的车辆顺序；新生 / 跨单元车辆的候选对重新查找。
+        车队删除车辆时保持剩余车辆的相对顺序，此时映射单调，保留的候选对无需重新排序。
+        """
+        num_vehicle = len(ids)
+        existed = np.zeros(num_vehicle, dtype=bool)
+        moved_cell = np.ones(num_vehicle, dtype=bool)
+        remap = np.full(len(self.ids), -1, dtype=np.int64)  # 上一步行号 -> 当前行号 (-1: 离开或跨单元)
+        if len(self.ids):
+            prev_sorter = np.argsort(self.ids)
+            pos = np.minimum(np.searchsorted(self.ids, ids, sorter=prev_sorter), len(self.ids) - 1)
+            prev_rows = prev_sorter[pos]
+            existed = self.ids[prev_rows] == ids
+            moved_cell[existed] = np.any(self.cells[prev_rows[existed]] != cells[existed], axis=1)
+            stable = existed & ~moved_cell
+            remap[prev_rows[stable]] = np.flatnonzero(stable)
+        dirty = moved_cell  # 新生车辆与跨单元车辆
+
+        # 保留两端都仍在场且都未跨单元的候选对
+        kept_i, kept_j = remap[self.pair_i], remap[self.pair_j]
+        keep = (kept_i >= 0) & (kept_j >= 0)
+        kept_i, kept_j = kept_i[keep], kept_j[keep]
+        kept_i, kept_j = np.minimum(kept_i, kept_j), np.maximum(kept_i, kept_j)
+        kept = kept_i * num_vehicle + kept_j
+        survivors = remap[remap >= 0]
+        if np.any(survivors[1:] < survivors[:-1]):
+            kept.sort()
+
+        # 为变化的车辆重新查找邻居 (两端都变化的对会出现两次)
+        a, b = self._neighbors(np.flatnonzero(dirty), cells)
+        fresh = np.unique(np.minimum(a, b) * num_vehicle + np.maximum(a, b))
+
+        # 两段有序数组合并 (稳定排序对已排序的段是线性的)
+        pair_keys = np.concatenate([kept, fresh])
+        pair_keys.sort(kind='stable')
+
+        self.stats.update({
+            'vehicles': num_vehicle,
+            'spawned': int(np.count_nonzero(~existed)),
+            'removed': len(self.ids) - int(np.count_nonzero(existed)),
+            'cell_crossings': int(np.count_nonzero(dirty & existed)),
+            'candidate_pairs': len(pair_keys),
+        })
+        self.ids, self.cells = ids.copy(), cells
+        self.pair_i, self.pair_j = pair_keys // max(num_vehicle, 1), pair_keys % max(num_vehicle, 1)
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+    def update(self, dqn_list, vehicle_list, epoch):
+        """
+        推进到当前车辆状态并返回图数据 (与 build_dynamic_graph 的签名和输出相同)
+        """
+        builder = self.graph_builder
+        nodes = builder._create_nodes(dqn_list, vehicle_list)
+        num_rsu = nodes['num_rsu']
+        rsu_pos, veh_pos = nodes['positions'][:num_rsu], nodes['positions'][num_rsu:]
+
+        rsu_key = tuple((dqn.dqn_id, tuple(dqn.bs_loc[:2]), tuple(dqn.start), tuple(dqn.end)) for dqn in dqn_list)
+        if rsu_key != self._rsu_key:
+            # 网格原点随 RSU 集合变化，车辆单元坐标不再可比: 从空状态重建
+            self.reset()
+            rsu_box = np.array([(dqn.start[0], dqn.start[1], dqn.end[0], dqn.end[1]) for dqn in dqn_list],
+                               dtype=float).reshape(-1, 4)
+            self._build_rsu_tables(rsu_pos, rsu_box)
+            self._rsu_key = rsu_key
+
+        ids = nodes['vehicle_ids']
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("IncrementalGraphBuilder requires unique vehicle ids")
+        cells = np.floor((veh_pos - self.origin) / self.cell_size).astype(np.int64)
+        self._update_vehicle_pairs(ids, cells)
+
+        # 候选对: 通信 / 干扰边的 (RSU, 车辆) 与 全部节点的邻近候选 (i < j)
+        # (RSU 对与 RSU-车辆对的 i < R，车辆对的 i >= R，因此只需分别排序后拼接)
+        near_rsu, near_vehicle = self._rsu_vehicle_candidates(cells, self._tables['proximity'])
+        rsu_i = np.concatenate([self.rsu_pairs[0], near_rsu])
+        rsu_j = np.concatenate([self.rsu_pairs[1], near_vehicle + num_rsu])
+        rsu_order = np.lexsort((rsu_j, rsu_i))
+        candidates = {
+            'communication': self._rsu_vehicle_candidates(cells, self._tables['communication']),
+            'interference': self._rsu_vehicle_candidates(cells, self._tables['interference']),
+            'proximity': (np.concatenate([rsu_i[rsu_order], self.pair_i + num_rsu]),
+                          np.concatenate([rsu_j[rsu_order], self.pair_j + num_rsu])),
+        }
+
+        debug(f"IncrementalGraphBuilder epoch {epoch}: {self.stats}")
+        return builder.assemble_graph(nodes, dqn_list, vehicle_list, epoch, candidates)
+
+    def validate(self, graph_data, dqn_list, vehicle_list, epoch):
+        """
+        与整图构建逐位比较 (节点特征 / 类型 / 三类边的下标与特征)
+
+        Returns:
+            bool，不一致时记录第一处差异
+        """
+        reference = self.graph_builder.build_dynamic_graph(dqn_list, vehicle_list, epoch)
+        for key in ('features', 'types'):
+            if not torch.equal(graph_data['node_features'][key], reference['node_features'][key]):
+                debug_print(f"IncrementalGraphBuilder mismatch: node {key} (epoch {epoch})")
+                return False
+        for edge_type, ref_edges in reference['edges'].items():
+            edges = graph_data['edges'][edge_type]
+            for key in ref_edges:
+                if not np.array_equal(edges[key], ref_edges[key]):
+                    debug_print(f"IncrementalGraphBuilder mismatch: {edge_type} {key} (epoch {epoch})")
+                    return False
+        return True
+
+
+def benchmark_incremental_graph(steps=50, vehicle_count=120, warmup_steps=150, city_grid=None, validate=True):
+    """
+    增量维护 vs 整图构建: 每步耗时对比 (并逐步校验输出一致)
+
+    Args:
+        city_grid: (可选) (blocks_x, blocks_y)，在网格城市上测试大规模场景
+    """
+    import Parameters
+    from Topology import formulate_global_list_dqn, vehicle_movement
+    from VehicleFleet import VehicleFleet
+    from LinkCache import global_link_cache
+    from RSUSpatialIndex import global_rsu_index
+
+    if city_grid is not None:
+        from CityTopology import generate_grid_city
+        generate_grid_city(*city_grid).apply()
+    dqn_list = []
+    formulate_global_list_dqn(dqn_list, torch.device('cpu'))
+    fleet = VehicleFleet(Parameters.BOUNDARY_POSITION_LIST, Parameters.CROSS_POSITION_LIST,
+                         Parameters.RSU_SEGMENT_LIST, Parameters.SCENE_SCALE_X, Parameters.SCENE_SCALE_Y,
+                         Parameters.MAX_SPAWN_PER_STEP)
+
+    vehicle_id, vehicle_list = 0, []
+    for _ in range(warmup_steps):
+        vehicle_id, vehicle_list = vehicle_movement(vehicle_id, vehicle_list, target_count=vehicle_count, fleet=fleet)
+
+    incremental = IncrementalGraphBuilder()
+    t_full, t_incremental, matched = 0.0, 0.0, 0
+    for step in range(steps):
+        vehicle_id, vehicle_list = vehicle_movement(vehicle_id, vehicle_list, target_count=vehicle_count, fleet=fleet)
+        global_link_cache.build(dqn_list, vehicle_list, step)
+        global_rsu_index.build(dqn_list, vehicle_list, step)
+        for dqn in dqn_list:
+            dqn.vehicle_in_dqn_range_by_distance = global_rsu_index.service_list(dqn)
+
+        start = time.perf_counter()
+        global_graph_builder.build_dynamic_graph(dqn_list, vehicle_list, step)
+        t_full += time.perf_counter() - start
+
+        start = time.perf_counter()
+        graph_data = incremental.update(dqn_list, vehicle_list, step)
+        t_incremental += time.perf_counter() - start
+
+        if validate:
+            matched += incremental.validate(graph_data, dqn_list, vehicle_list, step)
+
+    results = {
+        'rsus': len(dqn_list),
+        'vehicles': len(vehicle_list),
+        'steps': steps,
+        'full_ms': t_full / steps * 1e3,
+        'incremental_ms': t_incremental / steps * 1e3,
+        'speedup': t_full / t_incremental if t_incremental > 0 else float('inf'),
+        'validated_steps': matched if validate else None,
+        'last_step': dict(incremental.stats),
+    }
+    debug_print("Incremental graph benchmark:")
+    for key, value in results.items():
+        debug_print(f"  {key}: {value}")
+    return results
+
+
+# 全局增量图构建器实例
+global_incremental_graph = IncrementalGraphBuilder()
+
+
+if __name__ == "__main__":
+    set_debug_mode(True)
+    benchmark_incremental_graph()
+    benchmark_incremental_graph(vehicle_count=1500, warmup_steps=200, city_grid=(6, 6))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from LinkCache import global_link_cache
+from logger import debug
+import Parameters
+
+
+class InterferenceField:
+    """
+    按 epoch 聚合的干扰场 (Aggregate Interference Field)
+
+    在所有智能体的发射功率确定之后，对每个 V2I 接收端与每个服务车辆 (V2V 接收端)
+    只计算一次来自全部 V2V 干扰源的总接收干扰。
+    某个智能体的 "留一" 干扰 = 总干扰 - 自身 (位于其服务车辆处的干扰源) 的贡献，
+    因此干扰计算从 O(N^2) 降为 O(N)。
+
+    位置相同的干扰源先按功率合并 (同一位置的链路实现相同，功率线性叠加)，
+    与逐个排除 tx_pos == 服务车辆位置 的干扰源的原始语义一致。
+    """
+
+    def __init__(self, link_cache=global_link_cache):
+        self.link_cache = link_cache
+        self.valid = False
+        self.v2i_rx = np.zeros((0, 2))
+        self.source_positions = np.zeros((0, 2))
+        self.source_power = np.zeros(0)
+        self._source_index = {}
+        self._receiver_index = {}
+        self.v2i_contribution = np.zeros((0, 0))
+        self.v2i_total = np.zeros(0)
+        self.receiver_total = np.zeros(0)
+
+    def build(self, interferer_arrays, receiver_positions=None):
+        """
+        计算当前功率分配下的干扰场
+
+        Args:
+            interferer_arrays: {'tx_pos': (K, 2), 'power_W': (K,)}
+            receiver_positions: (可选) V2V 接收端 (服务车辆) 位置 (R, 2)
+        """
+        tx_pos = np.asarray(interferer_arrays['tx_pos'], dtype=float).reshape(-1, 2)
+        power_W = np.asarray(interferer_arrays['power_W'], dtype=float).reshape(-1)
+
+        # 同一位置的干扰源合并为一个 (S 个)
+        if len(tx_pos):
+            self.source_positions, inverse = np.unique(tx_pos, axis=0, return_inverse=True)
+            self.source_power = np.bincount(inverse.reshape(-1), weights=power_W,
+                                            minlength=len(self.source_positions))
+        else:
+            self.source_positions, self.source_power = np.zeros((0, 2)), np.zeros(0)
+        self._source_index = {(x, y): i for i, (x, y) in enumerate(self.source_positions.tolist())}
+
+        # V2I 接收端: 每个干扰源的贡献 (S, L) 与总干扰 (L,)
+        self.v2i_rx = np.array([link['rx'] for link in Parameters.V2I_LINK_POSITIONS], dtype=float).reshape(-1, 2)
+        self.v2i_contribution = np.zeros((len(self.source_positions), len(self.v2i_rx)))
+        if self.v2i_contribution.size:
+            self.v2i_contribution = self.link_cache.get_received_power(
+                self.source_power[:, None], self.source_positions[:, None, :], self.v2i_rx[None, :, :])
+        self.v2i_total = np.sum(self.v2i_contribution, axis=0)
+
+        # V2V 接收端: 直接排除位于接收端自身的干扰源 (避免大数相减的精度损失)
+        if receiver_positions is None:
+            receiver_positions = np.zeros((0, 2))
+        receivers = np.unique(np.asarray(receiver_positions, dtype=float).reshape(-1, 2), axis=0)
+        self._receiver_index = {(x, y): i for i, (x, y) in enumerate(receivers.tolist())}
+        self.receiver_total = self._interference_excluding_colocated(receivers)
+
+        self.valid = True
+        debug(f"InterferenceField built: {len(self.source_positions)} sources, "
+              f"{len(self.v2i_rx)} V2I receivers, {len(receivers)} V2V receivers")
+        return self
+
+    def _interference_excluding_colocated(self, receivers):
+        """接收端 (R, 2) 处来自所有不与其同位置的干扰源的总干扰 (R,)"""
+        if not len(receivers) or not len(self.source_positions):
+            return np.zeros(len(receivers))
+        received = self.link_cache.get_received_power(
+            self.source_power[:, None], self.source_positions[:, None, :], receivers[None, :, :])
+        colocated = np.all(self.source_positions[:, None, :] == receivers[None, :, :], axis=-1)
+        return np.sum(np.where(colocated, 0.0, received), axis=0)
+
+    def v2v_interference(self, receiver_positions):
+        """
+        服务车辆处的留一 V2V 干扰
+
+        Args:
+            receiver_positions: (A, 2) 服务车辆位置
+
+        Returns:
+            (A,) 干扰功率 (W)；build 时未登记的接收端单独计算
+        """
+        receiver_positions = np.asarray(receiver_positions, dtype=float).reshape(-1, 2)
+        interference = np.empty(len(receiver_positions))
+        missing = []
+        for a, (x, y) in enumerate(receiver_positions.tolist()):
+            idx = self._receiver_index.get((x, y))
+            if idx is None:
+                missing.append(a)
+            else:
+                interference[a] = self.receiver_total[idx]
+        if missing:
+            interference[missing] = self._interference_excluding_colocated(receiver_positions[missing])
+        return interference
+
+    def v2i_leave_one_out(self, own_positions):
+        """
+        各智能体视角下的 V2I 背景干扰 = 总干扰 - 位于其服务车辆处的干扰源贡献
+
+        Args:
+            own_positions: (A, 2) 各智能体服务车辆 (自身发射端) 位置
+
+        Returns:
+            (A, L) 背景干扰功率 (W)
+        """
+        own_positions = np.asarray(own_positions, dtype=float).reshape(-1, 2)
+        own = np.zeros((len(own_positions), len(self.v2i_rx)))
+        for a, (x, y) in enumerate(own_positions.tolist()):
+            idx = self._source_index.get((x, y))
+            if idx is not None:
+                own[a] = self.v2i_contribution[idx]
+        return np.maximum(self.v2i_total[None, :] - own, 0.0)
+
+
+# 全局干扰场实例
+global_interference_field = InterferenceField()
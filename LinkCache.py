@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from ChannelModel import global_channel_model
+from ShadowingField import global_shadowing_field
+from logger import debug
+import Parameters
+
+
+class LinkRealizationCache:
+    """
+    按 epoch 缓存的链路实现 (Link Realization Cache)
+
+    在每次 vehicle_movement 之后对场景中所有收发节点 (RSU / 车辆 / V2I 收发端)
+    一次性计算两两之间的 3D 距离、确定性路径损耗与阴影衰落矩阵。
+    同一 epoch 内的所有消费者 (V2I 容量、背景干扰、下一状态干扰、CSI 状态、图构建)
+    读取同一个信道实现，而不是各自重新计算距离并重新抽取阴影衰落。
+    车辆下一次移动时缓存失效。
+    """
+
+    def __init__(self, channel_model=global_channel_model, shadowing_field=global_shadowing_field):
+        self.channel_model = channel_model
+        self.shadowing_field = shadowing_field
+        self.valid = False
+        self.epoch = None
+        # 位置 -> 节点索引: 位置编码为复数 x + iy 后排序，查找时 searchsorted 向量化完成
+        self._sorted_keys = np.zeros(0, dtype=complex)
+        self._sorted_nodes = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros((0, 2))
+        self.distance = np.zeros((0, 0))
+        self.pl_deterministic = np.zeros((0, 0))
+        self.shadowing = np.zeros((0, 0))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def invalidate(self):
+        """车辆移动后调用：丢弃当前实现"""
+        self.valid = False
+
+    def build(self, dqn_list, vehicle_list, epoch=None):
+        """
+        为当前 epoch 构建链路实现
+
+        Args:
+            dqn_list: RSU (DQN) 列表，使用 bs_loc 作为节点位置
+            vehicle_list: 车辆列表，使用 curr_loc 作为节点位置
+            epoch: (可选) 仅用于调试记录
+        """
+        candidates = [(dqn.bs_loc[0], dqn.bs_loc[1]) for dqn in dqn_list]
+        candidates.extend(vehicle.curr_loc for vehicle in vehicle_list)
+        for link in Parameters.V2I_LINK_POSITIONS:
+            candidates.append(link['tx'])
+            candidates.append(link['rx'])
+
+        # 去重后按首次出现的顺序编号节点 (节点顺序决定阴影衰落的抽取顺序)
+        candidates = np.array(candidates, dtype=float).reshape(-1, 2)
+        sorted_keys, first = np.unique(_position_keys(candidates), return_index=True)
+        order = np.argsort(first, kind='stable')
+        self._sorted_keys = sorted_keys
+        self._sorted_nodes = np.empty(len(order), dtype=np.int64)
+        self._sorted_nodes[order] = np.arange(len(order))
+
+        self.positions = candidates[first[order]]
+        self.distance = self.channel_model.calculate_3d_distance_batch(
+            self.positions[:, None, :], self.positions[None, :, :])
+        self.pl_deterministic = self.channel_model._calculate_deterministic_path_loss(self.distance)
+        if Parameters.USE_SHADOWING_FIELD:
+            self.shadowing = self.shadowing_field.link_shadowing(
+                self.positions[:, None, :], self.positions[None, :, :])
+        else:
+            self.shadowing = self._draw_shadowing(len(self.positions))
+
+        self.valid = True
+        self.epoch = epoch
+        debug(f"LinkRealizationCache built with {len(self.positions)} nodes (epoch {epoch})")
+
+    def _draw_shadowing(self, num_nodes):
+        """链路互易: 只抽取上三角并镜像，保证 (a, b) 与 (b, a) 的阴影衰落一致"""
+        draws = np.random.normal(0, self.channel_model.shadowing_std, size=(num_nodes, num_nodes))
+        upper = np.triu(draws)
+        return upper + np.triu(draws, k=1).T
+
+    def _lookup(self, positions):
+        """位置数组 (..., 2) -> 节点索引数组 (...)，任一位置不在缓存中时返回 None"""
+        positions = np.asarray(positions, dtype=float)
+        keys = _position_keys(positions.reshape(-1, 2))
+        if not len(self._sorted_keys):
+            return None if len(keys) else np.zeros(positions.shape[:-1], dtype=np.int64)
+        slot = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self._sorted_keys) - 1)
+        if not np.all(self._sorted_keys[slot] == keys):
+            return None
+        return self._sorted_nodes[slot].reshape(positions.shape[:-1])
+
+    def get_link(self, pos_tx, pos_rx):
+        """
+        获取链路实现 (按 NumPy 规则广播 pos_tx 与 pos_rx)
+
+        Args:
+            pos_tx: 发射机位置, 形状 (..., 2)
+            pos_rx: 接收机位置, 形状 (..., 2)
+
+        Returns:
+            distance_3d, total_pl_db, pl_deterministic, shadowing: 广播后形状的数组
+            缓存无效或位置不在缓存中时，回退到信道模型的批量计算 (重新抽取阴影衰落)
+        """
+        if self.valid:
+            idx_tx = self._lookup(pos_tx)
+            idx_rx = self._lookup(pos_rx) if idx_tx is not None else None
+            if idx_rx is not None:
+                pl_det = self.pl_deterministic[idx_tx, idx_rx]
+                shadowing = self.shadowing[idx_tx, idx_rx]
+                return self.distance[idx_tx, idx_rx], pl_det + shadowing, pl_det, shadowing
+
+        distance_3d = self.channel_model.calculate_3d_distance_batch(pos_tx, pos_rx)
+        if Parameters.USE_SHADOWING_FIELD:
+            pl_det = self.channel_model._calculate_deterministic_path_loss(distance_3d)
+            shadowing = self.shadowing_field.link_shadowing(pos_tx, pos_rx)
+            return distance_3d, pl_det + shadowing, pl_det, shadowing
+
+        total_pl_db, pl_det, shadowing = self.channel_model.calculate_path_loss_batch(distance_3d)
+        return distance_3d, total_pl_db, pl_det, shadowing
+
+    def get_received_power(self, tx_power, pos_tx, pos_rx):
+        """接收功率 (W) = 发射功率 * 10^(-PL/10)，tx_power 可与链路形状广播"""
+        _, total_pl_db, _, _ = self.get_link(pos_tx, pos_rx)
+        return np.asarray(tx_power, dtype=float) * 10 ** (-total_pl_db / 10)
+
+    def get_channel_state_info(self, pos_tx, pos_rx, tx_power, beamforming_gain=0, bandwidth=None):
+        """
+        与 UMiNLOSChannel.get_channel_state_info 字段一致的 CSI，
+        但路径损耗与 SNR 基于同一个 (缓存的) 信道实现
+        """
+        if bandwidth is None:
+            bandwidth = self.channel_model.system_bandwidth
+
+        distance_3d, total_pl_db, pl_deterministic, shadowing = self.get_link(pos_tx, pos_rx)
+        noise_power = self.channel_model._calculate_noise_power(bandwidth)
+        received_power = tx_power * 10 ** (-(total_pl_db + beamforming_gain) / 10)
+        snr_linear = max(float(received_power / noise_power), 1e-20)
+
+        return {
+            'distance_3d': float(distance_3d),
+            'path_loss_total_db': float(total_pl_db),
+            'path_loss_deterministic_db': float(pl_deterministic),
+            'shadowing_db': float(shadowing),
+            'snr_db': 10 * np.log10(snr_linear),
+            'snr_linear': snr_linear,
+            'received_power': float(received_power),
+            'is_los': False,  # UMi NLOS 模型
+            'frequency': self.channel_model.center_frequency
+        }
+
+
+def _position_keys(positions):
+    """(N, 2) 位置 -> (N,) 复数键 x + iy (逐位保留坐标，按 (x, y) 字典序排序)"""
+    keys = np.empty(len(positions), dtype=complex)
+    keys.real = positions[:, 0]
+    keys.imag = positions[:, 1]
+    return keys
+
+
+# 全局链路缓存实例
+global_link_cache = LinkRealizationCache()
@@ -17,11 +17,22 @@ from Parameters import (
     RL_N_STATES_BASE, RL_N_STATES_CSI
 )
 from GraphBuilder import global_graph_builder
+from IncrementalGraph import global_incremental_graph
+from GNNInference import global_gnn_inference
 from GNNModel import (
     global_gnn_model, global_target_gnn_model,
     update_target_gnn, update_target_gnn_soft
 )
 from GNNReplayBuffer import GNNReplayBuffer
+from LinkCache import global_link_cache
+from InterferenceField import InterferenceField, global_interference_field
+from ActionTable import global_action_table
+from ShadowingField import global_shadowing_field
+from VehicleFleet import global_vehicle_fleet
+from RSUSpatialIndex import global_rsu_index
+from CityTopology import generate_grid_city
+from MobilityTrace import open_mobility_trace
+from ScenarioBank import ScenarioBank
 from Parameters import (
     GNN_REPLAY_CAPACITY, GNN_BATCH_SIZE,
     GNN_TRAIN_START_SIZE, GNN_SOFT_UPDATE_TAU
@@ -53,6 +64,92 @@ def move_graph_to_device(graph_data, device):
     return graph_data
 
 
+def gnn_q_values(graph_data, dqns, device, mode=None):
+    """
+    按 GNN_INFERENCE_MODE 计算一组 RSU 的 Q 值 (不计算梯度)
+
+    Args:
+        graph_data: 全局图 (build_dynamic_graph / IncrementalGraphBuilder.update 的输出，不会被修改)
+        dqns: 需要决策的 RSU
+        mode: "SUBGRAPH" / "BATCHED" / "GLOBAL"，默认 Parameters.GNN_INFERENCE_MODE
+
+    Returns:
+        (len(dqns), RL_N_ACTIONS) 张量，行顺序与 dqns 一致
+    """
+    mode = mode or Parameters.GNN_INFERENCE_MODE
+    if Parameters.GNN_INFERENCE_BACKEND == "MODEL":
+        rsu_q_values = global_gnn_model.rsu_q_values
+    else:
+        # 纯张量推理模块 (与模型共享参数)，见 GNNInference
+        def rsu_q_values(graph, slots):
+            return global_gnn_inference.q_values(global_gnn_model, graph, slots)
+    with torch.no_grad():
+        if not dqns:
+            return torch.zeros(0, RL_N_ACTIONS, device=device)
+        if mode == "GLOBAL":
+            # 浅拷贝特征字典，避免把回放缓冲区中的全局图原地移到 GPU
+            graph = dict(graph_data, node_features=dict(graph_data['node_features']),
+                         edge_features={t: None if f is None else dict(f)
+                                        for t, f in graph_data['edge_features'].items()})
+            graph = move_graph_to_device(graph, device)
+            return rsu_q_values(graph, [graph_data['rsu_row'][dqn.dqn_id] for dqn in dqns])
+
+        subgraphs = [global_graph_builder.spatial_subgraph(graph_data, dqn) for dqn in dqns]
+        if mode == "BATCHED":
+            union = move_graph_to_device(global_graph_builder.collate(subgraphs), device)
+            rsu_ptr = union['nodes']['rsu_ptr']
+            slots = [rsu_ptr[k] + sub['rsu_row'][dqn.dqn_id] for k, (sub, dqn) in enumerate(zip(subgraphs, dqns))]
+            return rsu_q_values(union, slots)
+
+        return torch.stack([global_gnn_model(move_graph_to_device(sub, device), dqn_id=dqn.dqn_id)[0]
+                            for sub, dqn in zip(subgraphs, dqns)], dim=0)
+
+
+def gnn_td_loss(batch):
+    """
+    一个采样批次的 Double-DQN TD 损失 (批量、稠密计算)
+
+    全部 graph_t 与 graph_t1 拼成一个不相交并图 (GraphBuilder.collate)，在线网络一次前向同时得到
+    Q(s_t) 与用于选动作的 Q(s_t+1)；目标网络对 graph_t1 的并图一次前向。
+    (经验, RSU) 的 Q 值按 RSU 槽位排成 (B, R)，TD 目标与带掩码的损失一次算出。
+
+    Args:
+        batch: GNNReplayBuffer.sample 返回的 GNNBatch
+
+    Returns:
+        td_loss: 有效 (经验, RSU) 对的均方 TD 误差 (标量)，没有有效对时为 None
+        pair_losses: (B, R) numpy 数组，各对的 TD 误差平方，无效位置为 NaN (一次拷回主机)
+    """
+    device = batch.actions.device
+    num_graphs = len(batch.graphs_t)
+    union = move_graph_to_device(global_graph_builder.collate(batch.graphs_t + batch.graphs_t1), device)
+    union_t1 = move_graph_to_device(global_graph_builder.collate(batch.graphs_t1), device)
+    rsu_ptr = torch.as_tensor(union['nodes']['rsu_ptr'], device=device)
+    rsu_ptr_t1 = torch.as_tensor(union_t1['nodes']['rsu_ptr'], device=device)
+
+    q_values = global_gnn_model.rsu_q_values(union)
+    with torch.no_grad():
+        q_values_t1_target = global_target_gnn_model.rsu_q_values(union_t1)
+
+    # 各 (经验, RSU) 在并图中的槽位；无效位置指向槽位 0，结果由掩码丢弃
+    valid = batch.valid
+    columns = torch.arange(valid.size(1), device=device)
+    slots_t = torch.where(valid, rsu_ptr[:num_graphs, None] + columns, 0)
+    slots_t1 = torch.where(valid, rsu_ptr[num_graphs:2 * num_graphs, None] + batch.rows_t1, 0)
+    slots_t1_target = torch.where(valid, rsu_ptr_t1[:num_graphs, None] + batch.rows_t1, 0)
+
+    q_estimate = q_values[slots_t, batch.actions]
+    best_action_t1 = q_values[slots_t1].detach().argmax(dim=-1)
+    q_target = batch.rewards + RL_GAMMA * q_values_t1_target[slots_t1_target, best_action_t1]
+
+    squared_error = (q_estimate - q_target.detach()) ** 2
+    pair_losses = torch.where(valid, squared_error.detach(), float('nan')).cpu().numpy()
+    num_valid = int(np.count_nonzero(~np.isnan(pair_losses)))
+    if num_valid == 0:
+        return None, pair_losses
+    return (squared_error * valid).sum() / num_valid, pair_losses
+
+
 if USE_UMI_NLOS_MODEL:
     from ChannelModel import global_channel_model
     from NewRewardCalculator import new_reward_calculator
@@ -62,6 +159,52 @@ else:
     debug_print("Main.py: Using original RewardCalculator")
 
 
+def calculate_v2i_sum_capacity_bps(interference_field):
+    """V2I 总容量 (bps): 所有 V2I 链路的信号批量计算，干扰取自已构建的干扰场总干扰"""
+    if not V2I_LINK_POSITIONS:
+        return 0.0
+
+    v2i_tx = np.array([link['tx'] for link in V2I_LINK_POSITIONS], dtype=float)
+    v2i_rx = np.array([link['rx'] for link in V2I_LINK_POSITIONS], dtype=float)
+    v2i_signal_power_W = global_link_cache.get_received_power(V2I_TX_POWER, v2i_tx, v2i_rx)
+
+    total_interference_W = interference_field.v2i_total
+
+    noise_power_W = global_channel_model._calculate_noise_power(SYSTEM_BANDWIDTH)
+    v2i_sinr_linear = v2i_signal_power_W / (total_interference_W + noise_power_W)
+    return float(np.sum(SYSTEM_BANDWIDTH * np.log2(1 + v2i_sinr_linear)))
+
+
+def choose_greedy_oracle_actions(dqn_list):
+    """
+    Greedy Oracle 基线: 以各 RSU 上一步的发射功率 (当前服务车辆位置) 作为固定干扰，
+    每个 RSU 穷举全部动作并选择奖励最高者 (一轮 best response)。
+
+    Returns:
+        按新动作构建的 active_v2v_interferers 列表
+    """
+    served = [dqn for dqn in dqn_list if dqn.vehicle_exist_curr and dqn.vehicle_in_dqn_range_by_distance]
+    if not served:
+        return []
+
+    positions = np.array([dqn.vehicle_in_dqn_range_by_distance[0].curr_loc for dqn in served], dtype=float)
+    # 上一步无动作时按最大功率估计 (保守)
+    prev_power = np.array([global_action_table.decode(dqn.action)[0] if dqn.action is not None
+                           else np.max(global_action_table.tx_power) for dqn in served])
+    fixed_field = InterferenceField(global_link_cache).build({'tx_pos': positions, 'power_W': prev_power}, positions)
+
+    best_action_indices, _ = new_reward_calculator.evaluate_all_actions(served, fixed_field)
+
+    active_v2v_interferers = []
+    for dqn, action_index in zip(served, best_action_indices):
+        dqn.action = RL_ACTION_SPACE[action_index]
+        active_v2v_interferers.append({
+            'tx_pos': dqn.vehicle_in_dqn_range_by_distance[0].curr_loc,
+            'power_W': global_action_table.tx_power[action_index]
+        })
+    return active_v2v_interferers
+
+
 def calculate_mean_metrics(dqn_list):
     """安全计算平均指标 (包含 P95 延迟)"""
     delays = []
@@ -73,28 +216,20 @@ def calculate_mean_metrics(dqn_list):
     debug("=== Calculating Mean Metrics ===")
 
     for dqn in dqn_list:
-        if hasattr(dqn, 'delay_list') and dqn.delay_list:
-            valid_delays = [d for d in dqn.delay_list
-                            if d is not None and not np.isnan(d) and d > 0]
-            if valid_delays:
-                recent_delays = valid_delays[-min(20, len(valid_delays)):]
-                delays.extend(recent_delays)
-
-        if hasattr(dqn, 'snr_list') and dqn.snr_list:
-            valid_snrs = [s for s in dqn.snr_list
-                          if s is not None and not np.isnan(s) and not np.isinf(s)]
-            if valid_snrs:
-                recent_snrs = valid_snrs[-min(20, len(valid_snrs)):]
-                snrs.extend(recent_snrs)
-
-        if hasattr(dqn, 'v2v_success_list') and dqn.v2v_success_list:
-            recent_successes = dqn.v2v_success_list[-min(20, len(dqn.v2v_success_list)):]
-            v2v_successes.extend(recent_successes)
-
-        if hasattr(dqn, 'v2v_delay_ok_list') and dqn.v2v_delay_ok_list:
-            v2v_delay_ok.extend(dqn.v2v_delay_ok_list[-min(20, len(dqn.v2v_delay_ok_list)):])
-        if hasattr(dqn, 'v2v_snr_ok_list') and dqn.v2v_snr_ok_list:
-            v2v_snr_ok.extend(dqn.v2v_snr_ok_list[-min(20, len(dqn.v2v_snr_ok_list)):])
+        # 环形缓冲区容量固定，过滤与取最近 20 个样本的开销不随训练轮数增长
+        if dqn.delay_list:
+            valid_delays = dqn.delay_list.values()
+            valid_delays = valid_delays[~np.isnan(valid_delays) & (valid_delays > 0)]
+            delays.extend(valid_delays[-20:].tolist())
+
+        if dqn.snr_list:
+            valid_snrs = dqn.snr_list.values()
+            valid_snrs = valid_snrs[np.isfinite(valid_snrs)]
+            snrs.extend(valid_snrs[-20:].tolist())
+
+        v2v_successes.extend(dqn.v2v_success_list.recent(20).tolist())
+        v2v_delay_ok.extend(dqn.v2v_delay_ok_list.recent(20).tolist())
+        v2v_snr_ok.extend(dqn.v2v_snr_ok_list.recent(20).tolist())
 
     mean_delay = np.mean(delays) if delays else 1.0
     p95_delay = np.percentile(delays, 95) if delays else 1.0
@@ -203,7 +338,8 @@ def traditional_training_step(dqn, device):
         curr_q_values = dqn(curr_state_tensor)
         if curr_q_values.dim() == 1: curr_q_values = curr_q_values.unsqueeze(0)
 
-        action_index = RL_ACTION_SPACE.index(dqn.action) if dqn.action in RL_ACTION_SPACE else 0
+        # 没有动作时按 0 号动作处理 (与原实现一致)
+        action_index = global_action_table.index_of(dqn.action) if dqn.action is not None else 0
         action_index_tensor = torch.tensor([[action_index]], dtype=torch.long, device=device)
         dqn.q_estimate = curr_q_values.gather(1, action_index_tensor).squeeze()
 
@@ -234,6 +370,10 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
     global_vehicle_id = 0
     overall_vehicle_list = []
 
+    # 车辆移动来源: 配置了轨迹文件时回放轨迹，否则使用随机生车 / 转向模型
+    mobility_trace = open_mobility_trace()
+    move_vehicles = mobility_trace.vehicle_movement if mobility_trace is not None else vehicle_movement
+
     global_per_buffer = None
     global_gnn_buffer = None
 
@@ -249,16 +389,15 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
             global_per_buffer = initialize_enhanced_training()
 
     for dqn in global_dqn_list:
-        if not hasattr(dqn, 'delay_list'): dqn.delay_list = []
-        if not hasattr(dqn, 'snr_list'): dqn.snr_list = []
-        if not hasattr(dqn, 'v2v_success_list'): dqn.v2v_success_list = []
-        if not hasattr(dqn, 'v2v_delay_ok_list'): dqn.v2v_delay_ok_list = []
-        if not hasattr(dqn, 'v2v_snr_ok_list'): dqn.v2v_snr_ok_list = []
         if not hasattr(dqn, 'prev_v2i_interference'): dqn.prev_v2i_interference = 0.0
 
     graph_data_t = None
     max_epochs = Parameters.RL_N_EPOCHS if hasattr(Parameters, 'RL_N_EPOCHS') else 1500
 
+    # 阴影衰落地图: 训练开始时生成，之后每次密度切换 (新的 episode) 重新生成
+    if Parameters.USE_SHADOWING_FIELD:
+        global_shadowing_field.generate(seed=np.random.randint(2 ** 31))
+
     while epoch <= max_epochs:
         # 动态密度调度器 (Dynamic Density Scheduler)
         # 每 50 个 Epoch 随机切换一次密度
@@ -269,6 +408,8 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
 
             # 2. 更新全局目标 (告诉环境我们要多少车)
             Parameters.TRAINING_VEHICLE_TARGET = new_target
+            if Parameters.USE_SHADOWING_FIELD:
+                global_shadowing_field.generate(seed=np.random.randint(2 ** 31))
 
             print(f"\n" + "=" * 50)
             print(f"[Dynamic Density] Epoch {epoch}: Switching target to {new_target} Vehicles!")
@@ -278,14 +419,20 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
             # 如果从 100 辆切到 20 辆，必须立刻删掉 80 辆，否则模型会面对错误的密度
             if len(overall_vehicle_list) > new_target:
                 # 随机保留 new_target 辆
-                overall_vehicle_list = random.sample(overall_vehicle_list, new_target)
+                global_vehicle_fleet.adopt(overall_vehicle_list)
+                global_vehicle_fleet.prune(new_target)
+                overall_vehicle_list = global_vehicle_fleet.vehicles
                 print(f"   -> Pruned excess vehicles. Current count: {len(overall_vehicle_list)}")
         # 步骤 1: 车辆移动
-        global_vehicle_id, overall_vehicle_list = vehicle_movement(
+        global_vehicle_id, overall_vehicle_list = move_vehicles(
             global_vehicle_id,
             overall_vehicle_list,
             target_count=Parameters.TRAINING_VEHICLE_TARGET
         )
+        # 本 epoch 的信道实现 (距离 / 路径损耗 / 阴影衰落) 只计算一次，所有消费者共享
+        global_link_cache.build(global_dqn_list, overall_vehicle_list, epoch)
+        # RSU 区域归属与按距离排序的服务列表同样只计算一次
+        global_rsu_index.build(global_dqn_list, overall_vehicle_list, epoch)
 
         loss_list_per_epoch = []
         mean_loss = 0.0
@@ -299,18 +446,10 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
         else:
             debug_print(f"Epoch {epoch}")
 
-        # 干扰列表初始化
-        active_v2v_interferers = []
-
-        # 步骤 2: 构建图
+        # 步骤 2: 图在步骤 4 中所有 RSU 状态更新之后构建 (全局一次，动作选择与经验回放共用)
         graph_data_t_plus_1 = None
         if USE_GNN_ENHANCEMENT:
             global_gnn_model.train()
-            try:
-                graph_data_t_plus_1 = global_graph_builder.build_dynamic_graph(global_dqn_list, overall_vehicle_list,
-                                                                               epoch)
-            except Exception as e:
-                debug(f"GNN S_t+1 graph build/forward pass failed: {e}")
 
         # 步骤 3: GNN 训练
         if USE_GNN_ENHANCEMENT and global_gnn_buffer is not None:
@@ -320,49 +459,32 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
 
         if (USE_GNN_ENHANCEMENT and global_gnn_buffer is not None and len(global_gnn_buffer) >= GNN_TRAIN_START_SIZE):
             batch = global_gnn_buffer.sample(GNN_BATCH_SIZE, device)
-            if batch is not None:
-                total_gnn_loss = torch.tensor(0.0, device=device)
-                agents_trained = 0
+            if batch:
+                # 整个批次一次在线前向 + 一次目标前向 (见 gnn_td_loss)
+                try:
+                    mean_batch_loss_td, pair_losses = gnn_td_loss(batch)
+                except Exception as e:
+                    debug(f"GNN batched TD loss failed: {e}")
+                    mean_batch_loss_td, pair_losses = None, np.zeros((0, 0))
+                pair_b, pair_col = np.nonzero(~np.isnan(pair_losses))
+                agents_trained = len(pair_b) if mean_batch_loss_td is not None else 0
+
+                # 边类型注意力的熵只与参数有关，各经验相同
                 entropy_loss = torch.tensor(0.0, device=device)
-
-                for experience in batch:
-                    graph_t_dev, actions_t, rewards_t, graph_t1_dev = experience
-                    all_q_values_t, aux_info_t = global_gnn_model(graph_t_dev)
-
-                    with torch.no_grad():
-                        all_q_values_t1_online, _ = global_gnn_model(graph_t1_dev)
-                        all_q_values_t1_target, _ = global_target_gnn_model(graph_t1_dev)
-
-                    current_arch = getattr(Parameters, 'GNN_ARCH', 'HYBRID')
-                    if current_arch == "HYBRID" and aux_info_t is not None:
-                        P = F.softmax(aux_info_t, dim=0)
-                        entropy = -torch.sum(P * torch.log(P + 1e-9))
-                        entropy_loss += entropy
-
-                    for dqn_id_str, action_index in actions_t.items():
-                        try:
-                            dqn_id = int(dqn_id_str)
-                            dqn_id_index = dqn_id - 1
-                            q_estimate = all_q_values_t[dqn_id_index, action_index]
-                            with torch.no_grad():
-                                reward = rewards_t[dqn_id_str]
-                                best_action_t1 = torch.argmax(all_q_values_t1_online[dqn_id_index])
-                                q_target_next = all_q_values_t1_target[dqn_id_index, best_action_t1]
-                                q_target = reward + RL_GAMMA * q_target_next
-                            loss = torch.nn.functional.mse_loss(q_estimate, q_target.detach())
-                            total_gnn_loss += loss
-                            agents_trained += 1
-                            for dqn in global_dqn_list:
-                                if dqn.dqn_id == dqn_id:
-                                    dqn.loss = loss.item()
-                                    loss_list_per_epoch.append(dqn.loss)
-                                    break
-                        except Exception:
-                            pass
+                current_arch = getattr(Parameters, 'GNN_ARCH', 'HYBRID')
+                if current_arch == "HYBRID" and global_gnn_model.arch_type == "HYBRID":
+                    P = F.softmax(global_gnn_model.edge_type_attention, dim=0)
+                    entropy_loss = -torch.sum(P * torch.log(P + 1e-9)) * len(batch.graphs_t)
+
+                dqn_by_id = {dqn.dqn_id: dqn for dqn in global_dqn_list}
+                for dqn_id, pair_loss in zip(batch.rsu_ids[pair_b, pair_col].tolist(),
+                                             pair_losses[pair_b, pair_col].tolist()):
+                    if dqn_id in dqn_by_id:
+                        dqn_by_id[dqn_id].loss = pair_loss
+                        loss_list_per_epoch.append(pair_loss)
 
                 if agents_trained > 0:
                     gnn_optimizer.zero_grad()
-                    mean_batch_loss_td = total_gnn_loss / agents_trained
                     mean_entropy = entropy_loss / GNN_BATCH_SIZE
                     final_loss = mean_batch_loss_td - LAMBDA_ENTROPY * mean_entropy
                     final_loss.backward()
@@ -374,10 +496,7 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
                             dqn.epsilon *= RL_EPSILON_DECAY
 
         # 在智能体决策前，强制所有车辆“静默”。只有稍后被服务的车辆会被赋予功率。
-        for vehicle in overall_vehicle_list:
-            vehicle.power_W = 0.0
-            # 同时更新一下 tx_pos 为当前位置，确保位置也是最新的
-            vehicle.tx_pos = vehicle.curr_loc
+        global_vehicle_fleet.reset_power()
 
 
         # ==================================================================
@@ -386,20 +505,11 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
         current_actions_t = {}
         current_rewards_t = {}
 
+        # 4.1 状态构建
         for dqn in global_dqn_list:
-            dqn.vehicle_exist_curr = False
             base_state = []
-            dqn.vehicle_in_dqn_range_by_distance = []
-
-            for vehicle in overall_vehicle_list:
-                if (dqn.start[0] <= vehicle.curr_loc[0] <= dqn.end[0] and
-                        dqn.start[1] <= vehicle.curr_loc[1] <= dqn.end[1]):
-                    dqn.vehicle_exist_curr = True
-                    vehicle.distance_to_bs = new_reward_calculator.channel_model.calculate_3d_distance(
-                        (dqn.bs_loc[0], dqn.bs_loc[1]), vehicle.curr_loc)
-                    dqn.vehicle_in_dqn_range_by_distance.append(vehicle)
-
-            dqn.vehicle_in_dqn_range_by_distance.sort(key=lambda x: x.distance_to_bs, reverse=False)
+            dqn.vehicle_in_dqn_range_by_distance = global_rsu_index.service_list(dqn)
+            dqn.vehicle_exist_curr = bool(dqn.vehicle_in_dqn_range_by_distance)
 
             if dqn.vehicle_exist_curr:
                 # 状态构建
@@ -432,28 +542,39 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
 
                 v2i_state = [interf_norm, dir_x, dir_y]
                 dqn.curr_state = base_state + dqn.csi_states_curr + v2i_state
-
-                # 动作选择
-                if USE_GNN_ENHANCEMENT:
-                    try:
-                        global_gnn_model.eval()
-                        graph_data_local = global_graph_builder.build_spatial_subgraph(dqn, global_dqn_list,
-                                                                                       overall_vehicle_list, epoch)
-                        graph_data_local = move_graph_to_device(graph_data_local, device)
-                        with torch.no_grad():
-                            actions_tensor, _ = global_gnn_model(graph_data_local, dqn_id=dqn.dqn_id)
-                        global_gnn_model.train()
-                        choose_action_from_tensor(dqn, actions_tensor, RL_ACTION_SPACE, device)
-                    except Exception as e:
-                        debug(f"!!! GNN action selection failed: {e}")
-                        global_gnn_model.train()
-                        choose_action(dqn, RL_ACTION_SPACE, device)
-                else:
-                    choose_action(dqn, RL_ACTION_SPACE, device)
             else:
                 dqn.curr_state = [0.0] * RL_N_STATES
                 dqn.action = None
 
+        # 4.2 构建图: 所有 RSU 状态更新之后全局构建一次，各 RSU 的推理子图从中切片
+        # 注意: 原实现在状态更新之前建图，经验回放中 S_t+1 的 RSU 特征 (CSI / 干扰) 落后一步；
+        # 现在存入的是动作选择实际使用的特征，因此 GNN 训练结果与原实现不同 (有意为之)
+        if USE_GNN_ENHANCEMENT:
+            try:
+                if Parameters.GNN_INCREMENTAL_GRAPH:
+                    graph_data_t_plus_1 = global_incremental_graph.update(global_dqn_list, overall_vehicle_list, epoch)
+                else:
+                    graph_data_t_plus_1 = global_graph_builder.build_dynamic_graph(global_dqn_list,
+                                                                                   overall_vehicle_list, epoch)
+            except Exception as e:
+                debug(f"GNN S_t+1 graph build/forward pass failed: {e}")
+
+        # 4.3 动作选择: GNN 一次推理得到所有决策 RSU 的 Q 值 (见 gnn_q_values)
+        deciding = [dqn for dqn in global_dqn_list if dqn.vehicle_exist_curr]
+        gnn_q = None
+        if USE_GNN_ENHANCEMENT and deciding:
+            try:
+                global_gnn_model.eval()
+                gnn_q = gnn_q_values(graph_data_t_plus_1, deciding, device)
+            except Exception as e:
+                debug(f"!!! GNN action selection failed: {e}")
+            global_gnn_model.train()
+        for k, dqn in enumerate(deciding):
+            if gnn_q is not None:
+                choose_action_from_tensor(dqn, gnn_q[k], RL_ACTION_SPACE, device)
+            else:
+                choose_action(dqn, RL_ACTION_SPACE, device)
+
         # ==================================================================
         # [修改] 步骤 4.5: 物理状态同步 (Phase 2 Sync)
         # ==================================================================
@@ -461,91 +582,61 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
         for dqn in global_dqn_list:
             # 只有当：1.车在范围内 且 2.智能体选择了动作 时，才计算功率
             if dqn.vehicle_exist_curr and dqn.action is not None:
-                # 解析动作
-                beam_count = dqn.action[0] + 1
-                horizontal_dir = dqn.action[1]
-                vertical_dir = dqn.action[2]
-                power_ratio = (dqn.action[3] + 1) / 10.0
-
-                # 计算增益 (调用 reward_calculator 的辅助函数)
-                directional_gain = new_reward_calculator._calculate_directional_gain(horizontal_dir,
-                                                                                             vertical_dir)
-
-                # 计算总功率 (Watts)
-                total_power_W = TRANSMITTDE_POWER * power_ratio * beam_count * directional_gain * Parameters.GAIN_ANTENNA_T
+                # 查表解析动作: 总功率 (Watts)
+                total_power_W = global_action_table.tx_power[global_action_table.index_of(dqn.action)]
 
                 # 赋值给对应的车辆
                 if dqn.vehicle_in_dqn_range_by_distance:
-                    serving_vehicle = dqn.vehicle_in_dqn_range_by_distance[0]
-                    serving_vehicle.power_W = total_power_W
-                    serving_vehicle.tx_pos = serving_vehicle.curr_loc  # 确保位置同步
-
-        # 2. 构建【真实】的干扰列表 (用于后续 V2I 和 V2V 的干扰计算)
-        # 这一步非常关键：只收集 power_W > 0 的车作为干扰源
-        active_v2v_interferers = []
-        for vehicle in overall_vehicle_list:
-            if hasattr(vehicle, 'power_W') and vehicle.power_W > 0:
-                active_v2v_interferers.append({
-                    'tx_pos': vehicle.curr_loc,  # 使用真实物理位置
-                    'power_W': vehicle.power_W  # 使用刚才计算出的真实功率
-                })
+                    global_vehicle_fleet.set_power(dqn.vehicle_in_dqn_range_by_distance[0], total_power_W)
+
+        # 2. 构建【真实】的干扰源数组 (用于后续 V2I 和 V2V 的干扰计算)
+        # 这一步非常关键：只收集 power_W > 0 的车作为干扰源 (车队数组直接掩码，使用真实物理位置)
+        interferer_arrays = global_vehicle_fleet.interferer_arrays()
+
+        # 干扰场: V2I 接收端与服务车辆处的总干扰只计算一次，供容量与奖励共享
+        global_interference_field.build(interferer_arrays, [
+            dqn.vehicle_in_dqn_range_by_distance[0].curr_loc
+            for dqn in global_dqn_list if dqn.vehicle_in_dqn_range_by_distance])
 
         # ==================================================================
         # 步骤 5: V2I 容量计算
         # ==================================================================
         total_v2i_capacity_bps = 0.0
         if USE_UMI_NLOS_MODEL:
-            for link in V2I_LINK_POSITIONS:
-                v2i_tx_pos = link['tx']
-                v2i_rx_pos = link['rx']
-                v2i_dist = global_channel_model.calculate_3d_distance(v2i_tx_pos, v2i_rx_pos)
-                _, _, v2i_signal_power_W = global_channel_model.calculate_snr(V2I_TX_POWER, v2i_dist,
-                                                                              bandwidth=SYSTEM_BANDWIDTH)
-
-                total_interference_W = 0.0
-                for interferer in active_v2v_interferers:
-                    interf_dist = global_channel_model.calculate_3d_distance(interferer['tx_pos'], v2i_rx_pos)
-                    pl_db, _, _ = global_channel_model.calculate_path_loss(interf_dist)
-                    pl_linear = 10 ** (-pl_db / 10)
-                    total_interference_W += interferer['power_W'] * pl_linear
-
-                noise_power_W = global_channel_model._calculate_noise_power(SYSTEM_BANDWIDTH)
-                v2i_sinr_linear = v2i_signal_power_W / (total_interference_W + noise_power_W)
-                total_v2i_capacity_bps += SYSTEM_BANDWIDTH * np.log2(1 + v2i_sinr_linear)
+            total_v2i_capacity_bps = calculate_v2i_sum_capacity_bps(global_interference_field)
             v2i_sum_capacity_mbps = total_v2i_capacity_bps / 1e6
 
         # ==================================================================
         # 步骤 6: 奖励结算与经验存储
         # ==================================================================
+        # 所有有车智能体的奖励一次批量计算 (传入真实干扰源数组)
+        reward_agents = [dqn for dqn in global_dqn_list if dqn.vehicle_exist_curr]
+        batch_rewards, batch_breakdown = new_reward_calculator.calculate_complete_reward_batch(
+            reward_agents, [dqn.action for dqn in reward_agents],
+            interferer_arrays, global_interference_field
+        )
+        reward_row = {dqn.dqn_id: i for i, dqn in enumerate(reward_agents)}
+
         for dqn in global_dqn_list:
             dqn.vehicle_exist_next = False
             base_state_next = []
 
             # 检查 Next 车辆
             if not USE_GNN_ENHANCEMENT:
-                dqn.vehicle_in_dqn_range_by_distance = []
-                for vehicle in overall_vehicle_list:
-                    if (dqn.start[0] <= vehicle.curr_loc[0] <= dqn.end[0] and dqn.start[1] <= vehicle.curr_loc[1] <=
-                            dqn.end[1]):
-                        dqn.vehicle_exist_next = True
-                        vehicle.distance_to_bs = new_reward_calculator.channel_model.calculate_3d_distance(
-                            (dqn.bs_loc[0], dqn.bs_loc[1]), vehicle.curr_loc)
-                        dqn.vehicle_in_dqn_range_by_distance.append(vehicle)
-                dqn.vehicle_in_dqn_range_by_distance.sort(key=lambda x: x.distance_to_bs, reverse=False)
+                dqn.vehicle_in_dqn_range_by_distance = global_rsu_index.service_list(dqn)
+                dqn.vehicle_exist_next = bool(dqn.vehicle_in_dqn_range_by_distance)
 
             if dqn.vehicle_exist_curr:
-                # 【关键】传入 active_v2v_interferers
-                dqn.reward, breakdown = new_reward_calculator.calculate_complete_reward(
-                    dqn, dqn.vehicle_in_dqn_range_by_distance, dqn.action, active_v2v_interferers
-                )
+                row = reward_row[dqn.dqn_id]
+                dqn.reward = float(batch_rewards[row])
 
-                if breakdown:
-                    for k, v in breakdown.items():
-                        if k in epoch_breakdown_stats: epoch_breakdown_stats[k].append(v)
+                if not np.isnan(batch_breakdown['total_reward'][row]):
+                    for k, v in batch_breakdown.items():
+                        if k in epoch_breakdown_stats: epoch_breakdown_stats[k].append(float(v[row]))
                 cumulative_reward_per_epoch += dqn.reward
 
                 if USE_GNN_ENHANCEMENT and dqn.action is not None:
-                    current_actions_t[str(dqn.dqn_id)] = RL_ACTION_SPACE.index(dqn.action)
+                    current_actions_t[str(dqn.dqn_id)] = global_action_table.index_of(dqn.action)
                     current_rewards_t[str(dqn.dqn_id)] = dqn.reward
 
                 # Next State 构建
@@ -567,13 +658,11 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
 
                     # Next State V2I Interference (Use current power as estimate)
                     v2i_interf_next = 0.0
-                    if dqn.vehicle_in_dqn_range_by_distance:
+                    if dqn.vehicle_in_dqn_range_by_distance and V2I_LINK_POSITIONS:
                         my_power = dqn.vehicle_in_dqn_range_by_distance[0].power_W
                         my_pos = dqn.vehicle_in_dqn_range_by_distance[0].curr_loc
-                        for link in V2I_LINK_POSITIONS:
-                            d = new_reward_calculator.channel_model.calculate_3d_distance(my_pos, link['rx'])
-                            pl, _, _ = new_reward_calculator.channel_model.calculate_path_loss(d)
-                            v2i_interf_next += my_power * (10 ** (-pl / 10))
+                        v2i_rx = np.array([link['rx'] for link in V2I_LINK_POSITIONS], dtype=float)
+                        v2i_interf_next = float(np.sum(global_link_cache.get_received_power(my_power, my_pos, v2i_rx)))
                     dqn.prev_v2i_interference = v2i_interf_next
 
                     interf_log = np.log10(dqn.prev_v2i_interference + 1e-20)
@@ -591,7 +680,7 @@ def rl(mean_loss_across_epochs=None, gnn_optimizer=None, device=None):
                     dqn.next_state = base_state_next + dqn.csi_states_next + v2i_state
 
                     if global_per_buffer is not None:
-                        action_index = RL_ACTION_SPACE.index(dqn.action) if dqn.action in RL_ACTION_SPACE else 0
+                        action_index = global_action_table.index_of(dqn.action) if dqn.action is not None else 0
                         global_per_buffer.add(state=dqn.curr_state, action=action_index, reward=dqn.reward,
                                               next_state=dqn.next_state, done=False)
 
@@ -708,9 +797,15 @@ def test():
     test_scenarios = {
         "GNN-DRL": {"model_path": MODEL_PATH_GNN, "use_gnn": True},
         "No-GNN DRL": {"model_path": MODEL_PATH_NO_GNN, "use_gnn": False},
-        "Standard DQN": {"model_path": MODEL_PATH_DQN, "use_gnn": False}
+        "Standard DQN": {"model_path": MODEL_PATH_DQN, "use_gnn": False},
+        # 无需模型: 每步穷举全部动作的贪心基线 (上界参考)
+        "Greedy Oracle": {"model_path": None, "use_gnn": False, "oracle": True}
     }
     results = []
+    mobility_trace = open_mobility_trace()
+    move_vehicles = mobility_trace.vehicle_movement if mobility_trace is not None else vehicle_movement
+    # 未使用外部轨迹时，由场景库为每个车辆数生成一次预热后的交通，所有模型回放同一份
+    scenario_bank = ScenarioBank() if Parameters.USE_SCENARIO_BANK and mobility_trace is None else None
     global_gnn_model.to(device)
     global_gnn_model.eval()
 
@@ -719,10 +814,13 @@ def test():
         Parameters.USE_GNN_ENHANCEMENT = config["use_gnn"]
         Parameters.USE_DUELING_DQN = True if model_name != "Standard DQN" else False
         is_gnn_model = Parameters.USE_GNN_ENHANCEMENT
+        is_oracle_model = config.get("oracle", False)
 
         formulate_global_list_dqn(global_dqn_list, device)
         try:
-            if is_gnn_model:
+            if is_oracle_model:
+                pass
+            elif is_gnn_model:
                 global_gnn_model.load_state_dict(torch.load(config["model_path"], map_location=device))
                 global_gnn_model.eval()
             else:
@@ -739,41 +837,44 @@ def test():
             episode_p95_delays_ms = []
             episode_v2i_capacities = []
             episode_decision_times = []
+            episode_step_latencies = []
+            episode_rsu_latencies = []
             global_vehicle_id = 0
             overall_vehicle_list = []
 
-            print(f"    >>> Warming up environment to reach {vehicle_count} vehicles...")
-            # 跑 50-100 步，只移动和生车，不计算 Reward，不计入统计
-            for _ in range(100):
-                global_vehicle_id, overall_vehicle_list = vehicle_movement(
-                    global_vehicle_id, overall_vehicle_list, target_count=vehicle_count
-                )
-            # 再多跑 50 步，让刚生成的车从边缘开到路中间
-            for _ in range(50):
-                global_vehicle_id, overall_vehicle_list = vehicle_movement(
-                    global_vehicle_id, overall_vehicle_list, target_count=vehicle_count
-                )
-            print(f"    >>> Ready. Current vehicles: {len(overall_vehicle_list)}")
+            # 同一车辆密度下所有模型使用同一张阴影衰落地图 (固定种子)，保证信道实现可复现
+            if Parameters.USE_SHADOWING_FIELD:
+                global_shadowing_field.generate(seed=Parameters.RANDOM_SEED * 1000 + vehicle_count)
+            # 轨迹回放时每个模型 / 车辆密度都从轨迹起点开始
+            if mobility_trace is not None:
+                mobility_trace.rewind()
+
+            if scenario_bank is not None:
+                # 场景已包含预热，直接回放每个 episode 的车队
+                move_vehicles = scenario_bank.load(Parameters.RANDOM_SEED, vehicle_count).vehicle_movement
+                print(f"    >>> Replaying scenario bank for {vehicle_count} vehicles...")
+            else:
+                print(f"    >>> Warming up environment to reach {vehicle_count} vehicles...")
+                # 只移动和生车，不计算 Reward，不计入统计，让刚生成的车从边缘开到路中间
+                for _ in range(Parameters.TEST_WARMUP_STEPS):
+                    global_vehicle_id, overall_vehicle_list = move_vehicles(
+                        global_vehicle_id, overall_vehicle_list, target_count=vehicle_count
+                    )
+                print(f"    >>> Ready. Current vehicles: {len(overall_vehicle_list)}")
 
             for i_episode in range(TEST_EPISODES_PER_COUNT):
-                global_vehicle_id, overall_vehicle_list = vehicle_movement(global_vehicle_id, overall_vehicle_list,
-                                                                           target_count=vehicle_count)
+                global_vehicle_id, overall_vehicle_list = move_vehicles(global_vehicle_id, overall_vehicle_list,
+                                                                        target_count=vehicle_count)
+                global_link_cache.build(global_dqn_list, overall_vehicle_list, i_episode)
+                global_rsu_index.build(global_dqn_list, overall_vehicle_list, i_episode)
                 active_v2v_interferers = []
                 step_decision_times = []
 
                 # First Loop: 动作选择 & 构建干扰列表
                 for dqn in global_dqn_list:
-                    dqn.vehicle_exist_curr = False
                     base_state = []
-                    dqn.vehicle_in_dqn_range_by_distance = []
-                    for vehicle in overall_vehicle_list:
-                        if (dqn.start[0] <= vehicle.curr_loc[0] <= dqn.end[0] and dqn.start[1] <= vehicle.curr_loc[1] <=
-                                dqn.end[1]):
-                            dqn.vehicle_exist_curr = True
-                            vehicle.distance_to_bs = new_reward_calculator.channel_model.calculate_3d_distance(
-                                (dqn.bs_loc[0], dqn.bs_loc[1]), vehicle.curr_loc)
-                            dqn.vehicle_in_dqn_range_by_distance.append(vehicle)
-                    dqn.vehicle_in_dqn_range_by_distance.sort(key=lambda x: x.distance_to_bs, reverse=False)
+                    dqn.vehicle_in_dqn_range_by_distance = global_rsu_index.service_list(dqn)
+                    dqn.vehicle_exist_curr = bool(dqn.vehicle_in_dqn_range_by_distance)
 
                     if dqn.vehicle_exist_curr:
                         iState = 0
@@ -809,32 +910,14 @@ def test():
                         dqn.curr_state = base_state + dqn.csi_states_curr + v2i_state
                         dqn.epsilon = 0.0
 
-                        if is_gnn_model:
-                            try:
-                                start_t = time.time()
-                                graph_data_local = move_graph_to_device(
-                                    global_graph_builder.build_spatial_subgraph(dqn, global_dqn_list,
-                                                                                overall_vehicle_list, i_episode),
-                                    device)
-                                with torch.no_grad():
-                                    actions_tensor, _ = global_gnn_model(graph_data_local, dqn_id=dqn.dqn_id)
-                                dqn.last_decision_time = (time.time() - start_t) * 1000.0
-                                step_decision_times.append(dqn.last_decision_time)
-                                choose_action_from_tensor(dqn, actions_tensor, RL_ACTION_SPACE, device)
-                            except Exception:
-                                choose_action(dqn, RL_ACTION_SPACE, device)
-                        else:
-                            choose_action(dqn, RL_ACTION_SPACE, device)
-                            if not is_gnn_model: step_decision_times.append(dqn.last_decision_time)
+                        if is_oracle_model or is_gnn_model:
+                            # Greedy Oracle / GNN 在所有 RSU 状态更新后统一决策 (见下方)
+                            continue
+                        choose_action(dqn, RL_ACTION_SPACE, device)
+                        step_decision_times.append(dqn.last_decision_time)
 
                         if dqn.action is not None and USE_UMI_NLOS_MODEL:
-                            beam_count = dqn.action[0] + 1
-                            horizontal_dir = dqn.action[1]
-                            vertical_dir = dqn.action[2]
-                            power_ratio = (dqn.action[3] + 1) / 10.0
-                            directional_gain = new_reward_calculator._calculate_directional_gain(horizontal_dir,
-                                                                                                 vertical_dir)
-                            total_power_W = TRANSMITTDE_POWER * power_ratio * beam_count * directional_gain
+                            total_power_W, _, _ = global_action_table.decode(dqn.action)
                             # 1. 获取正在服务的车辆 (发射源)
                             serving_vehicle = dqn.vehicle_in_dqn_range_by_distance[0]
 
@@ -844,44 +927,59 @@ def test():
                     else:
                         dqn.action = None
 
+                if is_oracle_model:
+                    start_t = time.perf_counter()
+                    active_v2v_interferers = choose_greedy_oracle_actions(global_dqn_list)
+                    step_decision_times.append((time.perf_counter() - start_t) * 1000.0)
+
+                if is_gnn_model:
+                    # 全局图构建一次 + 一次推理 (gnn_q_values)；整步耗时均摊到各 RSU 的决策时间
+                    deciding = [dqn for dqn in global_dqn_list if dqn.vehicle_exist_curr]
+                    start_t = time.perf_counter()
+                    try:
+                        graph_data = global_graph_builder.build_dynamic_graph(global_dqn_list, overall_vehicle_list,
+                                                                              i_episode)
+                        gnn_q = gnn_q_values(graph_data, deciding, device)
+                    except Exception as e:
+                        debug(f"GNN inference failed: {e}")
+                        gnn_q = None
+                    step_time = (time.perf_counter() - start_t) * 1000.0
+                    for k, dqn in enumerate(deciding):
+                        if gnn_q is not None:
+                            dqn.last_decision_time = step_time / len(deciding)
+                            step_decision_times.append(dqn.last_decision_time)
+                            choose_action_from_tensor(dqn, gnn_q[k], RL_ACTION_SPACE, device)
+                        else:
+                            choose_action(dqn, RL_ACTION_SPACE, device)
+                            step_decision_times.append(dqn.last_decision_time)
+
+                        if dqn.action is not None and USE_UMI_NLOS_MODEL:
+                            total_power_W, _, _ = global_action_table.decode(dqn.action)
+                            active_v2v_interferers.append(
+                                {'tx_pos': dqn.vehicle_in_dqn_range_by_distance[0].curr_loc, 'power_W': total_power_W})
 
                 # Second Loop: 在 test() 循环中补充 V2V 链路计算
                 # 利用已经构建好的 active_v2v_interferers
+                # 借用 reward calculator 的批量计算记录指标 (需要传入 active_v2v_interferers)
+                measured_agents = [dqn for dqn in global_dqn_list
+                                   if dqn.vehicle_exist_curr and dqn.vehicle_in_dqn_range_by_distance]
+                interferer_arrays = new_reward_calculator.build_interferer_arrays(active_v2v_interferers)
+                global_interference_field.build(interferer_arrays, [
+                    dqn.vehicle_in_dqn_range_by_distance[0].curr_loc for dqn in measured_agents])
+                new_reward_calculator.calculate_complete_reward_batch(
+                    measured_agents, [dqn.action for dqn in measured_agents],
+                    interferer_arrays, global_interference_field
+                )
                 for dqn in global_dqn_list:
-                    if dqn.vehicle_exist_curr and dqn.vehicle_in_dqn_range_by_distance:
-                        # 借用 reward calculator 中的记录函数，或者手动计算
-                        # 注意：需要传入 active_v2v_interferers
-                        new_reward_calculator.calculate_complete_reward(
-                            dqn,
-                            dqn.vehicle_in_dqn_range_by_distance,
-                            dqn.action,
-                            active_v2v_interferers
-                        )
-                    else:
+                    if not (dqn.vehicle_exist_curr and dqn.vehicle_in_dqn_range_by_distance):
                         # 如果没有车或未激活，记录默认失败值
-                        if not hasattr(dqn, 'delay_list'): dqn.delay_list = []
-                        if not hasattr(dqn, 'snr_list'): dqn.snr_list = []
-                        if not hasattr(dqn, 'v2v_success_list'): dqn.v2v_success_list = []
                         # 记录一次失败数据，保持列表长度一致
                         dqn.delay_list.append(1.0)
                         dqn.snr_list.append(-100.0)
                         dqn.v2v_success_list.append(0)
 
 
-                total_v2i_capacity_bps = 0.0
-                for link in V2I_LINK_POSITIONS:
-                    v2i_tx_pos, v2i_rx_pos = link['tx'], link['rx']
-                    _, _, v2i_sig = global_channel_model.calculate_snr(V2I_TX_POWER,
-                                                                       global_channel_model.calculate_3d_distance(
-                                                                           v2i_tx_pos, v2i_rx_pos),
-                                                                       bandwidth=SYSTEM_BANDWIDTH)
-                    total_interf = 0.0
-                    for interf in active_v2v_interferers:
-                        d = global_channel_model.calculate_3d_distance(interf['tx_pos'], v2i_rx_pos)
-                        pl, _, _ = global_channel_model.calculate_path_loss(d)
-                        total_interf += interf['power_W'] * (10 ** (-pl / 10))
-                    total_v2i_capacity_bps += SYSTEM_BANDWIDTH * np.log2(
-                        1 + v2i_sig / (total_interf + global_channel_model._calculate_noise_power(SYSTEM_BANDWIDTH)))
+                total_v2i_capacity_bps = calculate_v2i_sum_capacity_bps(global_interference_field)
                 v2i_sum_capacity_mbps = total_v2i_capacity_bps / 1e6
 
                 mean_delay, p95_delay, _, v2v_success_rate, _, _ = calculate_mean_metrics(global_dqn_list)
@@ -890,17 +988,24 @@ def test():
                 episode_v2i_capacities.append(v2i_sum_capacity_mbps)
                 if step_decision_times: episode_decision_times.append(
                     np.mean(step_decision_times) if is_gnn_model else np.sum(step_decision_times))
+                num_deciding = sum(1 for dqn in global_dqn_list if dqn.vehicle_exist_curr)
+                if step_decision_times and num_deciding:
+                    # 每步决策总延迟 与 均摊到每个决策 RSU 的延迟
+                    episode_step_latencies.append(np.sum(step_decision_times))
+                    episode_rsu_latencies.append(np.sum(step_decision_times) / num_deciding)
                 for dqn in global_dqn_list:
-                    dqn.delay_list = []
-                    dqn.snr_list = []
-                    dqn.v2v_success_list = []
+                    dqn.delay_list.clear()
+                    dqn.snr_list.clear()
+                    dqn.v2v_success_list.clear()
 
             results.append({
                 "model": model_name, "vehicle_count": vehicle_count,
                 "v2v_success_rate": np.mean(episode_v2v_success_rates),
                 "v2i_sum_capacity_mbps": np.mean(episode_v2i_capacities),
                 "p95_delay_ms": np.mean(episode_p95_delays_ms),
-                "decision_time_ms": np.mean(episode_decision_times) if episode_decision_times else 0.0
+                "decision_time_ms": np.mean(episode_decision_times) if episode_decision_times else 0.0,
+                "step_decision_time_ms": np.mean(episode_step_latencies) if episode_step_latencies else 0.0,
+                "rsu_decision_time_ms": np.mean(episode_rsu_latencies) if episode_rsu_latencies else 0.0
             })
     pd.DataFrame(results).to_csv(f"{global_logger.log_dir}/scalability{Parameters.ABLATION_SUFFIX}.csv", index=False)
 
@@ -941,6 +1046,16 @@ if __name__ == "__main__":
     parser.add_argument('--gnn_arch', type=str, default="HYBRID", choices=["HYBRID", "GAT", "GCN"],
                         help='GNN Architecture Type')
 
+    # 大规模路网 (例如 "8x8" -> 112 个 RSU)
+    parser.add_argument('--city_grid', type=str, default=None,
+                        help='Generate an N x M block grid city instead of the default 3x3 map (e.g., 8x8)')
+    parser.add_argument('--city_block_size', type=float, default=Parameters.CITY_BLOCK_SIZE,
+                        help='Block edge length (m) of the generated grid city')
+
+    # 车辆轨迹回放 (代替随机生车 / 转向模型)
+    parser.add_argument('--mobility_trace', type=str, default=None,
+                        help='Replay vehicle positions from a trace file (.npy, or .csv converted on first use)')
+
     # 解析参数
     args, unknown = parser.parse_known_args()
 
@@ -976,6 +1091,16 @@ if __name__ == "__main__":
     else:
         Parameters.USE_DUELING_DQN = True
 
+    if args.mobility_trace:
+        Parameters.MOBILITY_TRACE_PATH = args.mobility_trace
+
+    # 3.4 路网: 生成 N x M 网格城市 (需在创建 RSU 与车队之前生效)
+    if args.city_grid:
+        Parameters.CITY_GRID_BLOCKS = tuple(int(n) for n in args.city_grid.lower().split("x"))
+        Parameters.CITY_BLOCK_SIZE = args.city_block_size
+    if Parameters.CITY_GRID_BLOCKS:
+        generate_grid_city(*Parameters.CITY_GRID_BLOCKS, block_size=Parameters.CITY_BLOCK_SIZE).apply()
+
     # 打印最终配置以供检查
     print("=" * 30)
     print(f"RUN CONFIGURATION:")
@@ -984,6 +1109,7 @@ if __name__ == "__main__":
     print(f"  > GNN Arch: {Parameters.GNN_ARCH}")
     print(f"  > Dueling DQN: {Parameters.USE_DUELING_DQN}")
     print(f"  > Vehicle Count: {getattr(Parameters, 'NUM_VEHICLES', 'Default/Test Loop')}")
+    print(f"  > RSU Segments: {len(Parameters.RSU_SEGMENT_LIST)}")
     print(f"  > SNR Multiplier: {Parameters.SNR_MULTIPLIER}")
     print("=" * 30)
 
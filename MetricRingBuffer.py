@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from Parameters import METRIC_HISTORY_CAPACITY
+
+
+class MetricRingBuffer:
+    """
+    固定容量的指标环形缓冲区
+
+    替代无限增长的 Python 列表 (delay_list / snr_list / v2v_success_list 等)：
+    内存恒定，写满后覆盖最旧的样本；values / recent 以 NumPy 数组返回样本，便于向量化过滤与统计。
+    支持 append / len / bool / 迭代，可以按原列表的方式使用。
+    """
+
+    def __init__(self, capacity=METRIC_HISTORY_CAPACITY, dtype=float):
+        self.capacity = int(capacity)
+        self.dtype = dtype
+        self._data = None  # 首次写入时分配
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.values().tolist())
+
+    def __repr__(self):
+        return f"MetricRingBuffer(size={self._size}, capacity={self.capacity})"
+
+    def append(self, value):
+        if self._data is None:
+            self._data = np.empty(self.capacity, dtype=self.dtype)
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+    def values(self):
+        """按时间顺序 (旧 -> 新) 返回全部样本"""
+        return self.recent(self._size)
+
+    def recent(self, window):
+        """按时间顺序返回最近 window 个样本"""
+        count = min(int(window), self._size)
+        if count <= 0:
+            return np.zeros(0, dtype=self.dtype)
+        start = (self._next - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._data[start:start + count].copy()
+        return np.concatenate([self._data[start:], self._data[:self._next]])
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+import pandas as pd
+from logger import debug, debug_print
+import Parameters
+from Parameters import VEHICLE_SPEED_KMH, TRACE_CHUNK_RECORDS
+
+# 轨迹记录格式 (按 t 非降序存储): 时间步、车辆 ID、位置、航向角 (度, 0 = +x, 90 = +y)
+TRACE_DTYPE = np.dtype([('t', '<i8'), ('id', '<i8'), ('x', '<f8'), ('y', '<f8'), ('heading', '<f4')])
+TRACE_CSV_COLUMNS = ('time', 'id', 'x', 'y', 'heading')
+
+
+def heading_to_direction(heading_deg):
+    """航向角 (度) -> 主轴方向 (dx, dy) ∈ {-1, 0, 1}，与车队的四方向表示一致"""
+    theta = np.deg2rad(np.asarray(heading_deg, dtype=float))
+    cos, sin = np.cos(theta), np.sin(theta)
+    horizontal = np.abs(cos) >= np.abs(sin)
+    dx = np.where(horizontal, np.sign(cos), 0).astype(np.int64)
+    dy = np.where(horizontal, 0, np.sign(sin)).astype(np.int64)
+    return np.stack([dx, dy], axis=-1)
+
+
+def convert_csv_trace(csv_path, npy_path, columns=TRACE_CSV_COLUMNS, chunk_records=TRACE_CHUNK_RECORDS):
+    """
+    浮动车数据 CSV (time, id, x, y, heading) -> 轨迹 .npy (TRACE_DTYPE)
+
+    分块读取 CSV 并写入内存映射的 .npy，内存占用与文件大小无关。
+    若 CSV 未按时间排序，转换结束后按时间做一次稳定排序 (此时需要把整份轨迹读入内存)。
+    """
+    t_col, id_col, x_col, y_col, heading_col = columns
+    num_records = sum(len(chunk) for chunk in pd.read_csv(csv_path, usecols=[t_col], chunksize=chunk_records))
+
+    records = np.lib.format.open_memmap(npy_path, mode='w+', dtype=TRACE_DTYPE, shape=(num_records,))
+    offset, last_t, is_sorted = 0, None, True
+    for chunk in pd.read_csv(csv_path, usecols=list(columns), chunksize=chunk_records):
+        block = records[offset:offset + len(chunk)]
+        block['t'] = chunk[t_col].to_numpy(dtype=np.int64)
+        block['id'] = chunk[id_col].to_numpy(dtype=np.int64)
+        block['x'] = chunk[x_col].to_numpy(dtype=float)
+        block['y'] = chunk[y_col].to_numpy(dtype=float)
+        block['heading'] = chunk[heading_col].to_numpy(dtype=np.float32)
+
+        t = block['t']
+        if len(t):
+            is_sorted &= bool(np.all(t[1:] >= t[:-1])) and (last_t is None or t[0] >= last_t)
+            last_t = t[-1]
+        offset += len(chunk)
+
+    if not is_sorted:
+        debug_print(f"Trace {csv_path} is not sorted by time, sorting {num_records} records in memory")
+        records[:] = records[np.argsort(records['t'], kind='stable')]
+    records.flush()
+    del records
+    debug_print(f"Converted trace {csv_path} -> {npy_path} ({num_records} records)")
+    return npy_path
+
+
+class MobilityTrace:
+    """
+    基于内存映射文件的车辆轨迹回放
+
+    轨迹文件 (.npy, TRACE_DTYPE) 以 mmap 方式打开，只建立 "时间步 -> 记录偏移" 索引
+    (分块扫描 t 列，内存占用与文件大小无关)。每个 epoch 只读取当前时间步对应的记录切片，
+    转换为车队数组后交给 VehicleFleet.load_frame，因此多 GB 的轨迹也能以恒定内存回放。
+
+    vehicle_movement 与 Topology.vehicle_movement 的签名和返回值相同，可直接替换。
+
+    默认只回放轨迹中出现过的时间步；给定 num_steps 时按显式时间步 t = 0 .. num_steps - 1 回放，
+    轨迹中没有记录的时间步 (该步没有车辆) 回放为空帧。
+    """
+
+    def __init__(self, path, loop=None, num_steps=None, chunk_records=TRACE_CHUNK_RECORDS):
+        self.path = path
+        self.loop = Parameters.MOBILITY_TRACE_LOOP if loop is None else loop
+        self.num_steps = num_steps
+        self.records = np.load(path, mmap_mode='r')
+        if self.records.dtype.names is None or not set(TRACE_DTYPE.names) <= set(self.records.dtype.names):
+            raise ValueError(f"Trace {path} must be a structured array with fields {TRACE_DTYPE.names}")
+
+        self.times, self.offsets = self._build_index(chunk_records)
+        self.cursor = 0
+        debug_print(f"MobilityTrace opened: {path}, {len(self.records)} records, {len(self.times)} timesteps")
+
+    def __len__(self):
+        return len(self.times) if self.num_steps is None else self.num_steps
+
+    def time_of(self, index):
+        """第 index 个回放步对应的时间步 t"""
+        return int(self.times[index]) if self.num_steps is None else index
+
+    def _build_index(self, chunk_records):
+        """分块扫描 t 列，返回各时间步的取值 (T,) 与记录起始偏移 (T + 1,)"""
+        times, starts = [], []
+        last_t = None
+        for begin in range(0, len(self.records), chunk_records):
+            t = np.asarray(self.records['t'][begin:begin + chunk_records])
+            if (last_t is not None and t[0] < last_t) or np.any(t[1:] < t[:-1]):
+                raise ValueError(f"Trace {self.path} is not sorted by time")
+            change = np.flatnonzero(t[1:] != t[:-1]) + 1
+            if last_t is None or t[0] != last_t:
+                change = np.concatenate([[0], change])
+            times.append(t[change])
+            starts.append(change + begin)
+            last_t = t[-1]
+
+        times = np.concatenate(times) if times else np.zeros(0, dtype=np.int64)
+        starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+        return times, np.append(starts, len(self.records)).astype(np.int64)
+
+    def rewind(self):
+        """回到轨迹起点 (test() 中每个模型 / 车辆密度从同一帧开始)"""
+        self.cursor = 0
+
+    def frame(self, index):
+        """
+        读取第 index 个时间步
+
+        Returns:
+            ids (N,), positions (N, 2), directions (N, 2)；没有记录的时间步 N = 0
+        """
+        if self.num_steps is not None:
+            t, index = index, int(np.searchsorted(self.times, index))
+            if index >= len(self.times) or self.times[index] != t:
+                return np.zeros(0, dtype=np.int64), np.zeros((0, 2)), np.zeros((0, 2), dtype=np.int64)
+        block = np.asarray(self.records[self.offsets[index]:self.offsets[index + 1]])
+        positions = np.stack([block['x'], block['y']], axis=-1)
+        return block['id'].astype(np.int64), positions, heading_to_direction(block['heading'])
+
+    def frames(self):
+        """按时间顺序惰性产出全部帧"""
+        for index in range(len(self)):
+            yield self.frame(index)
+
+    def vehicle_movement(self, vehicle_id, vehicle_list, target_count=None, speed_kmh=VEHICLE_SPEED_KMH, fleet=None):
+        """
+        推进到下一时间步并把该帧装入车队
+
+        Args:
+            target_count: (可选) 帧内车辆多于 target_count 时只保留 ID 最小的 target_count 辆，
+                便于用同一份轨迹回放不同车辆密度
+        """
+        from VehicleFleet import global_vehicle_fleet
+        from LinkCache import global_link_cache
+        from RSUSpatialIndex import global_rsu_index
+
+        global_link_cache.invalidate()
+        global_rsu_index.invalidate()
+
+        if self.cursor >= len(self):
+            if not self.loop or not len(self):
+                raise RuntimeError(f"Mobility trace {self.path} exhausted")
+            self.cursor = 0
+
+        ids, positions, directions = self.frame(self.cursor)
+        self.cursor += 1
+        if target_count is not None and len(ids) > target_count:
+            keep = np.sort(np.argsort(ids, kind='stable')[:target_count])
+            ids, positions, directions = ids[keep], positions[keep], directions[keep]
+
+        fleet = fleet if fleet is not None else global_vehicle_fleet
+        fleet.adopt(vehicle_list)
+        fleet.load_frame(ids, positions, directions, speed_m3s=speed_kmh * 1000 / 3600)
+
+        debug(f"Trace step {self.cursor - 1} (t={self.time_of(self.cursor - 1)}): {len(ids)} vehicles")
+        vehicle_id = max(vehicle_id, int(ids.max())) if len(ids) else vehicle_id
+        return vehicle_id, fleet.vehicles
+
+
+def open_mobility_trace(path=None):
+    """
+    按 Parameters.MOBILITY_TRACE_PATH 打开轨迹；.csv 首次使用时转换为同名 .npy。
+    未配置轨迹时返回 None (使用 vehicle_movement)。
+    """
+    path = path if path is not None else Parameters.MOBILITY_TRACE_PATH
+    if not path:
+        return None
+    if path.lower().endswith('.csv'):
+        npy_path = os.path.splitext(path)[0] + '.npy'
+        if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(path):
+            convert_csv_trace(path, npy_path)
+        path = npy_path
+    return MobilityTrace(path)
@@ -1,5 +1,10 @@
 import numpy as np
 from ChannelModel import global_channel_model
+from LinkCache import global_link_cache
+from InterferenceField import InterferenceField
+from ActionTable import (
+    global_action_table, calculate_directional_gain, BEAM_ROLLOFF_EXPONENT, ANGLE_PER_DIRECTION
+)
 from logger import debug
 import Parameters
 from Parameters import (
@@ -12,8 +17,10 @@ from Parameters import (
 class NewRewardCalculator:
     def __init__(self):
         self.channel_model = global_channel_model
-        self.BEAM_ROLLOFF_EXPONENT = 2
-        self.ANGLE_PER_DIRECTION = 10
+        self.link_cache = global_link_cache
+        self.action_table = global_action_table
+        self.BEAM_ROLLOFF_EXPONENT = BEAM_ROLLOFF_EXPONENT
+        self.ANGLE_PER_DIRECTION = ANGLE_PER_DIRECTION
 
         # [IEEE FIX 1] 物理层处理时延 (Processing Latency)
         self.PHY_MAC_LATENCY_OFFSET = 0.001  # 1ms
@@ -32,13 +39,8 @@ class NewRewardCalculator:
         return np.clip(norm, 0.0, 1.0)
 
     def _calculate_directional_gain(self, horizontal_dir, vertical_dir):
-        theta_h = (horizontal_dir - 1) * self.ANGLE_PER_DIRECTION
-        theta_v = (1 - vertical_dir) * self.ANGLE_PER_DIRECTION
-        theta_h_rad = np.deg2rad(theta_h)
-        theta_v_rad = np.deg2rad(theta_v)
-        gain_h = np.cos(theta_h_rad) ** self.BEAM_ROLLOFF_EXPONENT
-        gain_v = np.cos(theta_v_rad) ** self.BEAM_ROLLOFF_EXPONENT
-        return gain_h * gain_v
+        return calculate_directional_gain(horizontal_dir, vertical_dir,
+                                          self.ANGLE_PER_DIRECTION, self.BEAM_ROLLOFF_EXPONENT)
 
     def calculate_delay(self, distance_3d, dqn_action, directional_gain=1.0, snr_linear=None):
         try:
@@ -64,14 +66,82 @@ class NewRewardCalculator:
         is_snr_ok = 1 if snr >= V2V_MIN_SNR_DB else 0
         success = 1 if (is_delay_ok and is_snr_ok) else 0
 
-        if not hasattr(dqn, 'v2v_success_list'): dqn.v2v_success_list = []
         dqn.v2v_success_list.append(success)
-
-        if not hasattr(dqn, 'v2v_delay_ok_list'): dqn.v2v_delay_ok_list = []
-        if not hasattr(dqn, 'v2v_snr_ok_list'): dqn.v2v_snr_ok_list = []
         dqn.v2v_delay_ok_list.append(is_delay_ok)
         dqn.v2v_snr_ok_list.append(is_snr_ok)
 
+    def _interferer_arrays(self, active_v2v_interferers, exclude_pos=None):
+        """
+        将干扰源字典列表转换为 (位置数组 (K, 2), 功率数组 (K,))，
+        可选地排除位于 exclude_pos 的干扰源 (即自身服务的车辆)。
+        """
+        if not active_v2v_interferers:
+            return np.zeros((0, 2)), np.zeros(0)
+
+        interferers = active_v2v_interferers
+        if exclude_pos is not None:
+            interferers = [i for i in interferers if i['tx_pos'] != exclude_pos]
+        if not interferers:
+            return np.zeros((0, 2)), np.zeros(0)
+
+        tx_pos = np.array([i['tx_pos'] for i in interferers], dtype=float)
+        power_W = np.array([i['power_W'] for i in interferers], dtype=float)
+        return tx_pos, power_W
+
+    def _tiered_reward(self, snr_db, delay, v2i_capacity, power_ratio):
+        """
+        分层奖励 (Reliability -> V2I Constraint -> Efficiency)，对标量与数组均适用
+
+        Returns:
+            reward, n_snr, n_delay, n_v2i, n_power: 与输入广播后形状相同的数组
+        """
+        snr_db = np.asarray(snr_db, dtype=float)
+        v2i_capacity = np.asarray(v2i_capacity, dtype=float)
+
+        n_snr = self.normalize_value('snr', snr_db)
+        n_delay = self.normalize_value('delay', np.asarray(delay, dtype=float))
+        n_v2i = self.normalize_value('v2i', v2i_capacity)
+        n_power = np.clip(power_ratio, 0.0, 1.0)
+
+        SNR_THRESHOLD = Parameters.V2V_MIN_SNR_DB
+        V2I_THRESHOLD = Parameters.V2I_CAPACITY_THRESHOLD
+
+        # --- Level 1: Reliability (Survival) with Smoothing ---
+        # 使用 tanh 函数构造平滑惩罚:
+        # 当 diff = 0 时, penalty = 1.0 (保持硬截断的基准)
+        # 当 diff 增大时, penalty 平滑增加，最大趋近于 2.0 (1 + 1)
+        # 除以 5.0 是为了控制斜率，避免梯度过大
+        # 保留梯度引导项 (给予微弱的正向反馈，指引优化方向)
+        failure_reward = -(1.0 + np.tanh((SNR_THRESHOLD - snr_db) / 5.0)) \
+            + 0.1 * Parameters.SNR_MULTIPLIER * n_snr
+
+        # --- Level 2: Constraint (V2I) ---
+        # Quadratic Penalty for Constraint Violation, 超过 10 后软截断
+        # (无 V2I 链路时容量为 inf，走满足约束的分支)
+        with np.errstate(invalid='ignore', over='ignore'):
+            diff = V2I_THRESHOLD - v2i_capacity
+            penalty = diff ** 2
+            penalty = np.where(penalty > 10.0, 10.0 + (diff - np.sqrt(10.0)), penalty)
+        constraint_reward = np.where(v2i_capacity < V2I_THRESHOLD,
+                                     -2.0 * Parameters.V2I_MULTIPLIER * penalty,
+                                     0.2 * Parameters.V2I_MULTIPLIER * n_v2i)
+
+        # --- Level 3: Efficiency ---
+        SNR_SATURATION = 15.0
+        overkill = (snr_db - SNR_SATURATION) / 10.0
+        efficiency_reward = np.where(snr_db > SNR_SATURATION,
+                                     -0.2 * Parameters.POWER_MULTIPLIER * n_power * (1.0 + overkill),
+                                     -0.05 * Parameters.POWER_MULTIPLIER * n_power)
+
+        # 1.0 为连接基础奖励；最后对总 Reward 进行 Clip，保证数值稳定性
+        # 这一步是为了防止任何意外的数值（如 log(0) 产生的 -inf）
+        success_reward = np.clip(
+            1.0 + constraint_reward + efficiency_reward + 0.3 * Parameters.DELAY_MULTIPLIER * (1.0 - n_delay),
+            -10.0, 10.0)
+
+        reward = np.where(snr_db < SNR_THRESHOLD, failure_reward, success_reward)
+        return reward, n_snr, n_delay, n_v2i, n_power
+
     def calculate_complete_reward(self, dqn, vehicles, action, active_v2v_interferers=None):
         """
         核心奖励计算函数 (集成平滑惩罚 + V2I修正)
@@ -84,26 +154,20 @@ class NewRewardCalculator:
             # --- 物理计算部分 ---
             closest_vehicle = vehicles[0]
             vehicle_loc = closest_vehicle.curr_loc
-            distance_3d = self.channel_model.calculate_3d_distance(
+            distance_3d, pl_sig, _, _ = self.link_cache.get_link(
                 (dqn.bs_loc[0], dqn.bs_loc[1]), vehicle_loc)
 
-            beam_count = action[0] + 1
-            h_dir, v_dir = action[1], action[2]
-            power_ratio = (action[3] + 1) / 10.0
+            total_tx_power, directional_gain, power_ratio = self.action_table.decode(action)
 
-            directional_gain = self._calculate_directional_gain(h_dir, v_dir)
-            total_tx_power = Parameters.TRANSMITTDE_POWER * power_ratio * beam_count * directional_gain * Parameters.GAIN_ANTENNA_T
+            # 干扰源数组 (排除自身服务车辆)
+            interf_pos, interf_power = self._interferer_arrays(active_v2v_interferers, exclude_pos=vehicle_loc)
 
             # A. V2V Link
             total_v2v_interference_W = 0.0
-            if active_v2v_interferers:
-                for interferer in active_v2v_interferers:
-                    if interferer['tx_pos'] == vehicle_loc: continue
-                    d = self.channel_model.calculate_3d_distance(interferer['tx_pos'], vehicle_loc)
-                    pl, _, _ = self.channel_model.calculate_path_loss(d)
-                    total_v2v_interference_W += interferer['power_W'] * (10 ** (-pl / 10))
-
-            pl_sig, _, _ = self.channel_model.calculate_path_loss(distance_3d)
+            if interf_power.size:
+                total_v2v_interference_W = float(np.sum(
+                    self.link_cache.get_received_power(interf_power, interf_pos, vehicle_loc)))
+
             signal_W = total_tx_power * (10 ** (-pl_sig / 10))
             noise_W = self.channel_model._calculate_noise_power(V2V_CHANNEL_BANDWIDTH)
 
@@ -112,34 +176,21 @@ class NewRewardCalculator:
             delay = self.calculate_delay(distance_3d, action, directional_gain, sinr_lin)
 
             # B. V2I Constraint (With Background Interference)
-            background_interference_on_v2i = {}
-            for idx, link in enumerate(Parameters.V2I_LINK_POSITIONS):
-                rx_pos = link['rx']
-                interf_sum = 0.0
-                if active_v2v_interferers:
-                    for interferer in active_v2v_interferers:
-                        if interferer['tx_pos'] == vehicle_loc: continue
-                        d_other = self.channel_model.calculate_3d_distance(interferer['tx_pos'], rx_pos)
-                        pl_other, _, _ = self.channel_model.calculate_path_loss(d_other)
-                        interf_sum += interferer['power_W'] * (10 ** (-pl_other / 10))
-                background_interference_on_v2i[idx] = interf_sum
-
-            min_v2i_capacity = float('inf')
-            for idx, link in enumerate(Parameters.V2I_LINK_POSITIONS):
-                rx_pos = link['rx']
-                d_sig = self.channel_model.calculate_3d_distance(link['tx'], rx_pos)
-                _, _, v2i_sig_W = self.channel_model.calculate_snr(Parameters.V2I_TX_POWER, d_sig)
-
-                d_int = self.channel_model.calculate_3d_distance(vehicle_loc, rx_pos)
-                pl_int, _, _ = self.channel_model.calculate_path_loss(d_int)
-                my_interference_W = total_tx_power * (10 ** (-pl_int / 10))
-
-                total_interference = my_interference_W + background_interference_on_v2i[idx] + noise_W
-                v2i_sinr = v2i_sig_W / (total_interference + 1e-20)
-                cap = np.log2(1 + v2i_sinr)
-                if cap < min_v2i_capacity: min_v2i_capacity = cap
-
-            current_v2i_capacity = min_v2i_capacity
+            v2i_tx = np.array([link['tx'] for link in Parameters.V2I_LINK_POSITIONS], dtype=float).reshape(-1, 2)
+            v2i_rx = np.array([link['rx'] for link in Parameters.V2I_LINK_POSITIONS], dtype=float).reshape(-1, 2)
+
+            # 背景干扰: (K, L) 路径损耗矩阵按干扰源求和
+            background_interference_on_v2i = np.zeros(len(v2i_rx))
+            if interf_power.size:
+                background_interference_on_v2i = np.sum(self.link_cache.get_received_power(
+                    interf_power[:, None], interf_pos[:, None, :], v2i_rx[None, :, :]), axis=0)
+
+            v2i_sig_W = self.link_cache.get_received_power(Parameters.V2I_TX_POWER, v2i_tx, v2i_rx)
+            my_interference_W = self.link_cache.get_received_power(total_tx_power, vehicle_loc, v2i_rx)
+
+            total_interference = my_interference_W + background_interference_on_v2i + noise_W
+            v2i_sinr = v2i_sig_W / (total_interference + 1e-20)
+            current_v2i_capacity = float(np.min(np.log2(1 + v2i_sinr))) if v2i_sinr.size else float('inf')
 
             dqn.prev_snr = snr_db
             self._record_communication_metrics(dqn, delay, snr_db)
@@ -147,69 +198,14 @@ class NewRewardCalculator:
             # ==========================================
             # C. Reward Calculation (IEEE Standard + Smoothing)
             # ==========================================
-
-            n_snr = self.normalize_value('snr', snr_db)
-            n_delay = self.normalize_value('delay', delay)
-            n_v2i = self.normalize_value('v2i', current_v2i_capacity)
-            n_power = np.clip(power_ratio, 0.0, 1.0)
-
-            reward = 0.0
-            SNR_THRESHOLD = Parameters.V2V_MIN_SNR_DB
-            V2I_THRESHOLD = Parameters.V2I_CAPACITY_THRESHOLD
-
-            # --- Level 1: Reliability (Survival) with Smoothing ---
-            if snr_db < SNR_THRESHOLD:
-                # [New Smooth Penalty Logic]
-                # 计算差值 (diff > 0)
-                diff = SNR_THRESHOLD - snr_db
-
-                # 使用 tanh 函数构造平滑惩罚:
-                # 当 diff = 0 时, penalty = 1.0 (保持硬截断的基准)
-                # 当 diff 增大时, penalty 平滑增加，最大趋近于 2.0 (1 + 1)
-                # 除以 5.0 是为了控制斜率，避免梯度过大
-                penalty_factor = 1.0 + np.tanh(diff / 5.0)
-                reward -= penalty_factor
-
-                # 保留梯度引导项 (给予微弱的正向反馈，指引优化方向)
-                reward += 0.1 * Parameters.SNR_MULTIPLIER * n_snr
-
-                breakdown = {
-                    'raw_snr': snr_db, 'raw_delay': delay, 'raw_v2i': current_v2i_capacity,
-                    'norm_snr': n_snr, 'norm_delay': n_delay, 'norm_v2i': n_v2i, 'norm_power': n_power,
-                    'total_reward': reward
-                }
-                return reward, breakdown
-
-            # --- Level 2: Constraint (V2I) ---
-            reward += 1.0  # Base Reward for Connection
-
-            if current_v2i_capacity < V2I_THRESHOLD:
-                # Quadratic Penalty for Constraint Violation
-                diff = V2I_THRESHOLD - current_v2i_capacity
-                penalty = diff ** 2
-                if penalty > 10.0: penalty = 10.0 + (diff - np.sqrt(10.0))  # 软截断
-
-                reward -= 2.0 * Parameters.V2I_MULTIPLIER * penalty
-            else:
-                reward += 0.2 * Parameters.V2I_MULTIPLIER * n_v2i
-
-            # --- Level 3: Efficiency ---
-            SNR_SATURATION = 15.0
-            if snr_db > SNR_SATURATION:
-                overkill = (snr_db - SNR_SATURATION) / 10.0
-                reward -= 0.2 * Parameters.POWER_MULTIPLIER * n_power * (1.0 + overkill)
-            elif snr_db >= SNR_THRESHOLD:
-                reward -= 0.05 * Parameters.POWER_MULTIPLIER * n_power
-
-            reward += 0.3 * Parameters.DELAY_MULTIPLIER * (1.0 - n_delay)
-            # 最后对总 Reward 进行 Clip，保证数值稳定性
-            # 这一步是为了防止任何意外的数值（如 log(0) 产生的 -inf）
-            reward = np.clip(reward, -10.0, 10.0)
+            reward, n_snr, n_delay, n_v2i, n_power = self._tiered_reward(
+                snr_db, delay, current_v2i_capacity, power_ratio)
+            reward = float(reward)
 
             breakdown = {
                 'raw_snr': snr_db, 'raw_delay': delay, 'raw_v2i': current_v2i_capacity,
-                'norm_snr': n_snr, 'norm_delay': n_delay, 'norm_v2i': n_v2i, 'norm_power': n_power,
-                'total_reward': reward
+                'norm_snr': float(n_snr), 'norm_delay': float(n_delay), 'norm_v2i': float(n_v2i),
+                'norm_power': float(n_power), 'total_reward': reward
             }
             return reward, breakdown
 
@@ -217,10 +213,160 @@ class NewRewardCalculator:
             self._record_communication_metrics(dqn, 1.0, -100.0)
             return -1.0, {}
 
+    def build_interferer_arrays(self, active_v2v_interferers):
+        """干扰源字典列表 -> calculate_complete_reward_batch 使用的数组形式"""
+        tx_pos, power_W = self._interferer_arrays(active_v2v_interferers)
+        return {'tx_pos': tx_pos, 'power_W': power_W}
+
+    def calculate_complete_reward_batch(self, dqn_list, actions, interferer_arrays=None, interference_field=None):
+        """
+        所有智能体的奖励一次向量化计算 (与 calculate_complete_reward 逐个调用结果一致)
+
+        Args:
+            dqn_list: 智能体列表 (A 个)，服务车辆取 vehicle_in_dqn_range_by_distance[0]
+            actions: 与 dqn_list 对应的动作列表
+            interferer_arrays: {'tx_pos': (K, 2), 'power_W': (K,)}，见 build_interferer_arrays
+            interference_field: (可选) 已按 interferer_arrays 构建好的 InterferenceField；
+                                为 None 时在此处以服务车辆为接收端构建
+
+        Returns:
+            rewards: (A,) 奖励数组
+            breakdown: 各分量的 (A,) 数组；无服务车辆的智能体奖励为 0、分量为 nan，
+                       有服务车辆但没有动作的智能体按通信失败处理 (奖励 -1.0、分量为 nan，与逐个计算一致)
+
+        Raises:
+            KeyError: 动作不在动作空间中
+        """
+        num_agents = len(dqn_list)
+        rewards = np.zeros(num_agents)
+        breakdown = {key: np.full(num_agents, np.nan) for key in (
+            'raw_snr', 'raw_delay', 'raw_v2i', 'norm_snr', 'norm_delay', 'norm_v2i', 'norm_power', 'total_reward')}
+
+        served = [i for i, dqn in enumerate(dqn_list) if dqn.vehicle_in_dqn_range_by_distance]
+        for i, dqn in enumerate(dqn_list):
+            if not dqn.vehicle_in_dqn_range_by_distance:
+                self._record_communication_metrics(dqn, 1.0, -100.0)
+        if not served:
+            return rewards, breakdown
+
+        if interferer_arrays is None:
+            interferer_arrays = {'tx_pos': np.zeros((0, 2)), 'power_W': np.zeros(0)}
+
+        # 没有动作的智能体: 与 calculate_complete_reward 的失败分支一致
+        for i in served:
+            if actions[i] is None:
+                rewards[i] = -1.0
+                self._record_communication_metrics(dqn_list[i], 1.0, -100.0)
+        served = [i for i in served if actions[i] is not None]
+        if not served:
+            return rewards, breakdown
+
+        served_idx = np.array(served)
+        served_dqns = [dqn_list[i] for i in served]
+        if interference_field is None:
+            interference_field = InterferenceField(self.link_cache).build(
+                interferer_arrays,
+                [dqn.vehicle_in_dqn_range_by_distance[0].curr_loc for dqn in served_dqns])
+        results = self._batch_reward_core(
+            served_dqns, self.action_table.indices_of([actions[i] for i in served]), interference_field)
+
+        rewards[served_idx] = results['total_reward']
+        for key in breakdown:
+            breakdown[key][served_idx] = results[key]
+
+        for k, i in enumerate(served):
+            dqn = dqn_list[i]
+            dqn.prev_snr = float(results['raw_snr'][k])
+            self._record_communication_metrics(dqn, float(results['raw_delay'][k]), float(results['raw_snr'][k]))
+
+        return rewards, breakdown
+
+    def evaluate_all_actions(self, dqn_list, interference_field):
+        """
+        穷举评估: 在固定的干扰环境下，一次数组计算给出每个智能体全部 RL_N_ACTIONS 个动作的奖励
+        (用于 Greedy Oracle 基线，不记录通信指标)
+
+        Args:
+            dqn_list: 智能体列表 (A 个)，均须有服务车辆
+            interference_field: 描述固定干扰源集合的 InterferenceField
+
+        Returns:
+            best_action_indices: (A,) 各智能体奖励最高的动作编号
+            rewards: (A, RL_N_ACTIONS) 全部动作的奖励
+        """
+        all_actions = np.broadcast_to(np.arange(len(self.action_table)), (len(dqn_list), len(self.action_table)))
+        rewards = self._batch_reward_core(dqn_list, all_actions, interference_field)['total_reward']
+        return np.argmax(rewards, axis=1), rewards
+
+    def _batch_reward_core(self, dqn_list, action_indices, interference_field):
+        """
+        calculate_complete_reward_batch / evaluate_all_actions 的纯计算部分 (所有智能体均有服务车辆)
+
+        Args:
+            action_indices: (A,) 每个智能体一个动作编号，或 (A, M) 每个智能体 M 个候选动作
+
+        A = 智能体数, M = 候选动作数, L = V2I 链路数；干扰由 interference_field 一次聚合后按留一取值
+        """
+        action_indices = np.asarray(action_indices, dtype=np.int64)
+        single_action = action_indices.ndim == 1
+        if single_action:
+            action_indices = action_indices[:, None]
+
+        bs_pos = np.array([dqn.bs_loc[:2] for dqn in dqn_list], dtype=float)
+        vehicle_pos = np.array([dqn.vehicle_in_dqn_range_by_distance[0].curr_loc for dqn in dqn_list], dtype=float)
+
+        power_ratio = self.action_table.power_ratio[action_indices]
+        total_tx_power = self.action_table.tx_power[action_indices]
+
+        # A. V2V Link: (A, M)
+        distance_3d, pl_sig, _, _ = self.link_cache.get_link(bs_pos, vehicle_pos)
+        noise_W = self.channel_model._calculate_noise_power(V2V_CHANNEL_BANDWIDTH)
+        signal_W = total_tx_power * (10 ** (-pl_sig / 10))[:, None]
+
+        total_v2v_interference_W = interference_field.v2v_interference(vehicle_pos)[:, None]
+
+        sinr_lin = signal_W / (total_v2v_interference_W + noise_W + 1e-20)
+        snr_db = 10 * np.log10(sinr_lin)
+
+        data_rate = V2V_CHANNEL_BANDWIDTH * np.log2(1 + sinr_lin)
+        transmission_delay = np.where(sinr_lin > 0, V2V_PACKET_SIZE_BITS / (data_rate + 1e-9), 1.0)
+        delay = transmission_delay + (distance_3d / 3e8)[:, None] + self.PHY_MAC_LATENCY_OFFSET
+
+        # B. V2I Constraint (With Background Interference): (A, M, L)
+        v2i_tx = np.array([link['tx'] for link in Parameters.V2I_LINK_POSITIONS], dtype=float).reshape(-1, 2)
+        v2i_rx = np.array([link['rx'] for link in Parameters.V2I_LINK_POSITIONS], dtype=float).reshape(-1, 2)
+
+        if v2i_rx.size:
+            # 背景干扰 (A, L) = 总干扰 - 自身贡献
+            background_interference_on_v2i = interference_field.v2i_leave_one_out(vehicle_pos)
+
+            v2i_sig_W = self.link_cache.get_received_power(Parameters.V2I_TX_POWER, v2i_tx, v2i_rx)
+            # 功率线性: 服务车辆 -> V2I 接收端的路径增益 (A, L) 只计算一次
+            path_gain_to_v2i = self.link_cache.get_received_power(1.0, vehicle_pos[:, None, :], v2i_rx[None, :, :])
+            my_interference_W = total_tx_power[:, :, None] * path_gain_to_v2i[:, None, :]
+
+            total_interference = my_interference_W + background_interference_on_v2i[:, None, :] + noise_W
+            v2i_sinr = v2i_sig_W / (total_interference + 1e-20)
+            v2i_capacity = np.min(np.log2(1 + v2i_sinr), axis=-1)
+        else:
+            v2i_capacity = np.full(action_indices.shape, np.inf)
+
+        # C. Reward Calculation
+        reward, n_snr, n_delay, n_v2i, n_power = self._tiered_reward(snr_db, delay, v2i_capacity, power_ratio)
+
+        results = {
+            'raw_snr': snr_db, 'raw_delay': delay, 'raw_v2i': v2i_capacity,
+            'norm_snr': n_snr, 'norm_delay': n_delay, 'norm_v2i': n_v2i, 'norm_power': n_power,
+            'total_reward': reward
+        }
+        if single_action:
+            results = {key: value[:, 0] for key, value in results.items()}
+        return results
+
     def get_csi_for_state(self, vehicle, dqn):
         if vehicle is None: return [0.0] * 5
         try:
-            csi_info = self.channel_model.get_channel_state_info(
+            csi_info = self.link_cache.get_channel_state_info(
                 (dqn.bs_loc[0], dqn.bs_loc[1]), vehicle.curr_loc,
                 tx_power=TRANSMITTDE_POWER, bandwidth=V2V_CHANNEL_BANDWIDTH
             )
@@ -237,17 +383,8 @@ class NewRewardCalculator:
         仅解析动作并计算物理参数 (功率, 增益等)，不计算奖励。
         用于在计算 Reward 之前先更新所有车辆的状态。
         """
-        # 动作解析
-        beam_count = action[0] + 1
-        h_dir, v_dir = action[1], action[2]
-        power_ratio = (action[3] + 1) / 10.0
-
-        # 计算增益
-        directional_gain = self._calculate_directional_gain(h_dir, v_dir)
-
-        # 计算总发射功率 (Watts)
-        total_tx_power = Parameters.TRANSMITTDE_POWER * power_ratio * beam_count * directional_gain * Parameters.GAIN_ANTENNA_T
-
+        # 查表: 总发射功率 (Watts) 与方向增益
+        total_tx_power, directional_gain, _ = self.action_table.decode(action)
         return total_tx_power, directional_gain
 
 
@@ -43,11 +43,40 @@ ATTENTION_HEADS = 8        # 注意力头数
 # 定义在测试/推理时，GNN 构建子图的空间半径 (米)
 # 500米 意味着它会考虑自己和周围约 500米 内的车辆和RSU
 GNN_INFERENCE_RADIUS = 500.0
+# 训练时用 IncrementalGraphBuilder 增量维护全局图 (输出与整图构建一致)。
+# 实测: 无 scipy (稠密距离矩阵) 时 1500 辆车约快 2 倍；有 cKDTree 时整图构建更快，因此默认关闭
+GNN_INCREMENTAL_GRAPH = False
+# GNN 推理方式 (训练中的动作选择与 test() 均使用):
+#   "SUBGRAPH": 每个 RSU 从全局图切出半径 GNN_INFERENCE_RADIUS 的子图，逐个前向
+#   "BATCHED":  同样的子图拼成不相交并图，一次前向读出所有 RSU (Q 值与 SUBGRAPH 在浮点误差范围内相等，并非逐位一致)
+#   "GLOBAL":   整个场景一次前向 (感受野不受半径限制，会改变策略看到的邻域、Q 值与子图推理不同；需显式开启)
+# 实测 (CPU, 60 RSU / 1500 辆车): SUBGRAPH 433 ms, BATCHED 610 ms (并图含大量重叠节点), GLOBAL 36 ms
+GNN_INFERENCE_MODE = "SUBGRAPH"
+# 三种边类型的卷积每层合并为一次消息传递 (GNNModel.fused_relational_conv)，与逐类型实现数值等价，state_dict 兼容
+GNN_FUSED_CONV = True
+# GNN 推理执行后端 (BATCHED / GLOBAL 模式): "MODEL" 直接调用 EnhancedHeteroGNN；
+# "EAGER" / "SCRIPT" / "COMPILE" 使用 GNNInference 的纯张量推理模块 (直接执行 / torch.jit.script / torch.compile)。
+# 实测 (CPU, 整图推理): 10 RSU 3.0 / 2.3 / 1.7 / 1.7 ms；60 RSU / 1500 辆车 42 / 37 / 34 / 16 ms。
+# COMPILE 首次调用需要编译 (数十秒，且需要 C++ 编译器)，因此默认不启用
+GNN_INFERENCE_BACKEND = "MODEL"
 
 # 测试用的车辆数量列表
 TEST_VEHICLE_COUNTS = [20, 40, 60, 80, 100, 120]
 # 每个车辆数测试多少个 Epochs
 TEST_EPISODES_PER_COUNT = 100
+# 测试前的预热步数 (只移动和生车，让车辆从边缘开到路中间)
+TEST_WARMUP_STEPS = 150
+# 场景库: 每个 (种子, 车辆数) 只生成一次预热后的车辆轨迹并存盘，所有模型回放同一份交通
+USE_SCENARIO_BANK = True
+SCENARIO_BANK_DIR = "scenario_bank"
+
+# 指标历史环形缓冲区容量 (每个 RSU 的时延 / SNR / 成功率历史，超出后覆盖最旧的样本)
+METRIC_HISTORY_CAPACITY = 1000
+# 车辆通信指标历史容量 (车辆数量多，设小一点)
+VEHICLE_METRIC_HISTORY_CAPACITY = 100
+
+# RSU 空间索引的均匀网格边长 (米)，用于按 epoch 判定车辆所属 RSU 区域
+SPATIAL_INDEX_CELL_SIZE = 100.0
 
 # 1. 归一化滑动窗口 (样本数)
 # 【修改说明】虽然 NewRewardCalculator 改用了固定边界，保留此参数以兼容旧代码或其他用途
@@ -137,6 +166,15 @@ PATH_LOSS_B = 22.4  # 常量项
 PATH_LOSS_C = 21.3  # 频率系数
 SHADOWING_STD = 7.0  # 阴影衰落标准差 (dB)
 
+# 确定性路径损耗查表模式 (1m ~ 场景对角线的距离网格 + 线性插值)
+USE_PATH_LOSS_TABLE = False
+PATH_LOSS_TABLE_MAX_ERROR_DB = 0.01  # 插值误差上界 (dB), 决定网格步长
+
+# 空间相关阴影衰落地图 (Gudmundson 模型), 替代逐链路 i.i.d. 抽样
+USE_SHADOWING_FIELD = False
+SHADOWING_DECORRELATION_DISTANCE = 13.0  # 去相关距离 (m), 3GPP TR 38.901 UMi NLOS
+SHADOWING_MAP_RESOLUTION = 5.0  # 地图网格分辨率 (m)
+
 # 系统带宽 (毫米波典型带宽)
 SYSTEM_BANDWIDTH = 400e6  # 系统带宽 400 MHz
 
@@ -224,7 +262,34 @@ CROSS_POSITION_LIST = [
     (2 * SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3),
 ]
 
+# RSU (DQN) 负责的路段 (start_x, start_y, end_x, end_y)，按 dqn_id 1~10 排列
+# 同时定义了道路网络: 车辆在交叉路口的可选转向由路段连通关系决定
+RSU_SEGMENT_LIST = [
+    (0, SCENE_SCALE_Y / 3, SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3),
+    (SCENE_SCALE_X / 3, 0, SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3),
+    (SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3, SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3),
+    (SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3, SCENE_SCALE_X / 3, SCENE_SCALE_Y),
+    (SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3, 2 * SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3),
+    (2 * SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3, 2 * SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3),
+    (2 * SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3, SCENE_SCALE_X, 2 * SCENE_SCALE_Y / 3),
+    (2 * SCENE_SCALE_X / 3, 2 * SCENE_SCALE_Y / 3, 2 * SCENE_SCALE_X / 3, SCENE_SCALE_Y),
+    (2 * SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3, SCENE_SCALE_X, SCENE_SCALE_Y / 3),
+    (2 * SCENE_SCALE_X / 3, 0, 2 * SCENE_SCALE_X / 3, SCENE_SCALE_Y / 3),
+]
+
 VEHICLE_OCCUR_PROB = 0.5
+MAX_SPAWN_PER_STEP = 5  # 每步最多生成的车辆数 (生成的大规模路网会按出生点数量放大)
+
+# 车辆轨迹回放 (MobilityTrace): 指定 .npy (或 .csv, 首次使用时转换为 .npy) 后由轨迹驱动车辆，
+# 代替随机生车 / 转向模型。None 表示使用 vehicle_movement
+MOBILITY_TRACE_PATH = None
+MOBILITY_TRACE_LOOP = True  # 轨迹播放完后从头循环
+TRACE_CHUNK_RECORDS = 1 << 20  # 建立时间索引 / CSV 转换时每块处理的记录数 (内存恒定)
+
+# 网格城市路网生成 (CityTopology.generate_grid_city)
+# None 表示使用上面固定的 3x3 街区路网；(N, M) 表示 N x M 个街区，每条道路在路口处切分为 RSU 路段
+CITY_GRID_BLOCKS = None
+CITY_BLOCK_SIZE = SCENE_SCALE_X / 3  # 街区边长 (米)，与默认路网一致，保证 RL 状态维度不变
 VEHICLE_SPEED_KMH = 60
 VEHICLE_SPEED_M3S = VEHICLE_SPEED_KMH * 1000 / 3600
 
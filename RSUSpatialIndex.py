@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from ChannelModel import global_channel_model
+from logger import debug
+from Parameters import SPATIAL_INDEX_CELL_SIZE
+
+
+class RSUSpatialIndex:
+    """
+    按 epoch 构建的 RSU 空间索引 (均匀网格)
+
+    每个 RSU 的服务区域为 [start, end] 包围盒。网格只在 RSU 集合变化时重建：
+    每个网格单元登记与其相交的 RSU。每个 epoch 车辆移动之后，
+    所有车辆一次性落入网格单元，只与所在单元登记的 RSU 做包围盒精确判定，
+    再按 (RSU, 距离, 车辆顺序) 一次排序，得到每个 RSU 按距离升序的服务车辆列表。
+    训练 / 测试的状态构建与图构建共享同一份结果，而不是各自对全部车辆扫描。
+    """
+
+    def __init__(self, cell_size=SPATIAL_INDEX_CELL_SIZE, channel_model=global_channel_model):
+        self.cell_size = float(cell_size)
+        self.channel_model = channel_model
+        self.valid = False
+        self.epoch = None
+        self._rsu_key = None
+        self._rsu_row = {}
+        self._cell_ptr = np.zeros(1, dtype=np.int64)
+        self._cell_rsu = np.zeros(0, dtype=np.int64)
+        self._vehicle_lists = []
+        self._distance_lists = []
+
+    def invalidate(self):
+        """车辆移动后调用：丢弃当前索引"""
+        self.valid = False
+
+    def _build_grid(self, dqn_list):
+        """按 RSU 包围盒建立网格 (CSR: 单元 -> RSU 行号)"""
+        self.rsu_start = np.array([dqn.start for dqn in dqn_list], dtype=float).reshape(-1, 2)
+        self.rsu_end = np.array([dqn.end for dqn in dqn_list], dtype=float).reshape(-1, 2)
+        self.bs_loc = np.array([(dqn.bs_loc[0], dqn.bs_loc[1]) for dqn in dqn_list], dtype=float).reshape(-1, 2)
+        self._rsu_row = {dqn.dqn_id: row for row, dqn in enumerate(dqn_list)}
+
+        if len(dqn_list):
+            self.origin = self.rsu_start.min(axis=0)
+            extent = self.rsu_end.max(axis=0) - self.origin
+        else:
+            self.origin, extent = np.zeros(2), np.zeros(2)
+        self.grid_shape = (np.floor(extent / self.cell_size).astype(np.int64) + 1)
+
+        lo = self._cell_coords(self.rsu_start)
+        hi = self._cell_coords(self.rsu_end)
+        cell_lists = [[] for _ in range(int(np.prod(self.grid_shape)))]
+        for row in range(len(dqn_list)):
+            for cx in range(lo[row, 0], hi[row, 0] + 1):
+                for cy in range(lo[row, 1], hi[row, 1] + 1):
+                    cell_lists[cx * self.grid_shape[1] + cy].append(row)
+        self._cell_ptr = np.cumsum([0] + [len(rows) for rows in cell_lists]).astype(np.int64)
+        self._cell_rsu = np.array([row for rows in cell_lists for row in rows], dtype=np.int64)
+        debug(f"RSUSpatialIndex grid built: {len(dqn_list)} RSUs, grid {tuple(self.grid_shape)}")
+
+    def _cell_coords(self, positions):
+        cells = np.floor((positions - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.grid_shape - 1)
+
+    def build(self, dqn_list, vehicle_list, epoch=None):
+        """
+        为当前 epoch 构建索引 (车辆移动之后调用一次)
+
+        Args:
+            dqn_list: RSU (DQN) 列表，使用 start / end / bs_loc
+            vehicle_list: 车辆列表，使用 curr_loc
+            epoch: (可选) 仅用于调试记录
+        """
+        rsu_key = tuple((dqn.dqn_id, tuple(dqn.start), tuple(dqn.end)) for dqn in dqn_list)
+        if rsu_key != self._rsu_key:
+            self._build_grid(dqn_list)
+            self._rsu_key = rsu_key
+
+        num_rsu = len(dqn_list)
+        positions = np.array([v.curr_loc for v in vehicle_list], dtype=float).reshape(-1, 2)
+
+        # 候选 (车辆, RSU) 对: 车辆所在网格单元登记的全部 RSU
+        cells = self._cell_coords(positions)
+        cell_id = cells[:, 0] * self.grid_shape[1] + cells[:, 1]
+        begin = self._cell_ptr[cell_id]
+        counts = self._cell_ptr[cell_id + 1] - begin
+        cand_vehicle = np.repeat(np.arange(len(positions)), counts)
+        offsets = np.arange(len(cand_vehicle)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cand_rsu = self._cell_rsu[np.repeat(begin, counts) + offsets]
+
+        # 包围盒精确判定 (含边界)
+        cand_pos = positions[cand_vehicle]
+        inside = np.all((self.rsu_start[cand_rsu] <= cand_pos) & (cand_pos <= self.rsu_end[cand_rsu]), axis=1)
+        pair_vehicle, pair_rsu = cand_vehicle[inside], cand_rsu[inside]
+
+        # 与 ChannelModel.calculate_3d_distance 相同的运算顺序，保证距离逐位一致
+        delta = self.bs_loc[pair_rsu] - positions[pair_vehicle]
+        d_2d = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+        height = self.channel_model.antenna_height_bs - self.channel_model.antenna_height_ue
+        distance = np.sqrt(d_2d ** 2 + height ** 2)
+
+        # 按 RSU 分组，组内按距离升序，距离相同时保持车辆列表顺序 (与稳定排序一致)
+        order = np.lexsort((pair_vehicle, distance, pair_rsu))
+        pair_vehicle, pair_rsu, distance = pair_vehicle[order], pair_rsu[order], distance[order]
+        bounds = np.searchsorted(pair_rsu, np.arange(num_rsu + 1))
+
+        vehicle_ids = pair_vehicle.tolist()
+        distance_values = distance.tolist()
+        self._vehicle_lists = [[vehicle_list[i] for i in vehicle_ids[bounds[r]:bounds[r + 1]]]
+                               for r in range(num_rsu)]
+        self._distance_lists = [distance_values[bounds[r]:bounds[r + 1]] for r in range(num_rsu)]
+
+        self.valid = True
+        self.epoch = epoch
+        debug(f"RSUSpatialIndex built: {len(positions)} vehicles, {len(pair_vehicle)} RSU memberships (epoch {epoch})")
+        return self
+
+    def service_list(self, dqn, update_distance=True):
+        """
+        RSU 区域内按距离升序排列的车辆列表 (新列表，可直接赋给 vehicle_in_dqn_range_by_distance)
+
+        Args:
+            dqn: RSU (DQN)
+            update_distance: 是否写回 vehicle.distance_to_bs (与逐个 RSU 扫描时的赋值语义一致)
+
+        Raises:
+            RuntimeError: 索引已失效 (车辆移动后尚未重新 build)，避免返回旧列表并写回过期距离
+        """
+        if not self.valid:
+            raise RuntimeError("RSUSpatialIndex is invalid: call build() after vehicle movement")
+        row = self._rsu_row[dqn.dqn_id]
+        vehicles = list(self._vehicle_lists[row])
+        if update_distance:
+            for vehicle, distance in zip(vehicles, self._distance_lists[row]):
+                vehicle.distance_to_bs = distance
+        return vehicles
+
+    def members(self, dqn):
+        """RSU 区域内的车辆 (只读，不写回距离)；索引失效或未登记该 RSU 时返回 None"""
+        row = self._rsu_row.get(dqn.dqn_id)
+        if not self.valid or row is None:
+            return None
+        return self._vehicle_lists[row]
+
+
+# 全局 RSU 空间索引实例
+global_rsu_index = RSUSpatialIndex()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+import numpy as np
+from logger import debug, debug_print
+import Parameters
+from MobilityTrace import TRACE_DTYPE, MobilityTrace
+
+
+class ScenarioBank:
+    """
+    测试场景库 (预热后的车辆轨迹缓存)
+
+    每个 (种子, 车辆数) 只运行一次 预热 + 逐 episode 的车辆移动，把每个 episode 的车队
+    (ID / 位置 / 航向) 按 MobilityTrace 的轨迹格式保存到 SCENARIO_BANK_DIR。
+    test() 中所有模型回放同一份轨迹，因此在完全相同的交通上比较，且预热只做一次。
+
+    文件名包含种子、车辆数、预热步数、episode 数，以及车辆移动参数与路网几何的哈希，
+    参数变化时自动生成新的场景。
+    每条记录的 t 为 episode 编号；没有车辆的 episode 不产生记录，回放时按编号得到空帧。
+    """
+
+    def __init__(self, directory=None, warmup_steps=None, episodes=None):
+        self.directory = directory if directory is not None else Parameters.SCENARIO_BANK_DIR
+        self.warmup_steps = warmup_steps if warmup_steps is not None else Parameters.TEST_WARMUP_STEPS
+        self.episodes = episodes if episodes is not None else Parameters.TEST_EPISODES_PER_COUNT
+        self._traces = {}
+
+    @staticmethod
+    def mobility_hash():
+        """车辆移动参数与路网几何 (路段 / 出生点 / 路口坐标) 的哈希，任一项变化都对应不同的场景文件"""
+        key = repr((Parameters.VEHICLE_OCCUR_PROB, Parameters.MAX_SPAWN_PER_STEP, Parameters.VEHICLE_SPEED_KMH,
+                    Parameters.SCENE_SCALE_X, Parameters.SCENE_SCALE_Y,
+                    [tuple(map(float, segment)) for segment in Parameters.RSU_SEGMENT_LIST],
+                    [tuple(map(float, position)) for position in Parameters.BOUNDARY_POSITION_LIST],
+                    [tuple(map(float, position)) for position in Parameters.CROSS_POSITION_LIST]))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+    def scenario_path(self, seed, vehicle_count):
+        scene = f"{len(Parameters.RSU_SEGMENT_LIST)}rsu_{self.mobility_hash()}"
+        name = f"seed{seed}_veh{vehicle_count}_warm{self.warmup_steps}_ep{self.episodes}_{scene}.npy"
+        return os.path.join(self.directory, name)
+
+    def generate(self, seed, vehicle_count):
+        """
+        用独立的车队与固定种子生成一个场景并存盘 (不影响全局车队与全局随机数状态)
+        """
+        from Topology import vehicle_movement
+        from VehicleFleet import VehicleFleet
+
+        fleet = VehicleFleet(Parameters.BOUNDARY_POSITION_LIST, Parameters.CROSS_POSITION_LIST,
+                             Parameters.RSU_SEGMENT_LIST, Parameters.SCENE_SCALE_X, Parameters.SCENE_SCALE_Y,
+                             Parameters.MAX_SPAWN_PER_STEP)
+        rng_state = np.random.get_state()
+        np.random.seed((seed * 1000 + vehicle_count) % (2 ** 32))
+        try:
+            vehicle_id, vehicle_list = 0, []
+            for _ in range(self.warmup_steps):
+                vehicle_id, vehicle_list = vehicle_movement(vehicle_id, vehicle_list,
+                                                            target_count=vehicle_count, fleet=fleet)
+            frames = []
+            for episode in range(self.episodes):
+                vehicle_id, vehicle_list = vehicle_movement(vehicle_id, vehicle_list,
+                                                            target_count=vehicle_count, fleet=fleet)
+                frame = np.zeros(len(fleet.ids), dtype=TRACE_DTYPE)
+                frame['t'] = episode
+                frame['id'] = fleet.ids
+                frame['x'] = fleet.positions[:, 0]
+                frame['y'] = fleet.positions[:, 1]
+                frame['heading'] = np.degrees(np.arctan2(fleet.directions[:, 1], fleet.directions[:, 0]))
+                frames.append(frame)
+        finally:
+            np.random.set_state(rng_state)
+
+        path = self.scenario_path(seed, vehicle_count)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, np.concatenate(frames) if frames else np.zeros(0, dtype=TRACE_DTYPE))
+        os.replace(tmp_path, path)
+        debug_print(f"Scenario bank: generated {path} ({len(frames)} episodes, "
+                    f"{len(vehicle_list)} vehicles after warm-up)")
+        return path
+
+    def load(self, seed, vehicle_count):
+        """
+        取得场景回放器 (已回到起点)；磁盘上没有时先生成
+
+        Returns:
+            MobilityTrace，vehicle_movement 可直接替换 Topology.vehicle_movement
+        """
+        path = self.scenario_path(seed, vehicle_count)
+        trace = self._traces.get(path)
+        if trace is None:
+            if not os.path.exists(path):
+                self.generate(seed, vehicle_count)
+            else:
+                debug(f"Scenario bank: reusing {path}")
+            # 按 episode 编号回放 (空 episode 为空帧)，不循环: 回放超过 episodes 步时直接报错
+            trace = MobilityTrace(path, loop=False, num_steps=self.episodes)
+            self._traces[path] = trace
+        trace.rewind()
+        return trace
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from logger import debug
+from Parameters import (
+    SHADOWING_STD, SCENE_SCALE_X, SCENE_SCALE_Y,
+    SHADOWING_DECORRELATION_DISTANCE, SHADOWING_MAP_RESOLUTION
+)
+
+
+class ShadowingField:
+    """
+    空间相关阴影衰落地图 (Gudmundson 指数相关模型)
+
+    在整个场景上预先生成一张阴影衰落地图，相关函数为
+        R(d) = sigma^2 * exp(-d / d_corr)
+    生成方法为循环嵌入 (Circulant Embedding) + FFT，只需一次 FFT 即可得到全图。
+    之后的查询只是按 (x, y) 的网格索引，支持任意形状的向量化位置数组。
+
+    链路阴影衰落取收发两端地图值的归一化和 (S(tx) + S(rx)) / sqrt(2)：
+    标准差保持 sigma，且满足链路互易 (tx/rx 交换结果相同)。
+    """
+
+    def __init__(self, std=SHADOWING_STD, decorrelation_distance=SHADOWING_DECORRELATION_DISTANCE,
+                 resolution=SHADOWING_MAP_RESOLUTION, scene_x=SCENE_SCALE_X, scene_y=SCENE_SCALE_Y):
+        self.std = std
+        self.decorrelation_distance = decorrelation_distance
+        self.resolution = resolution
+        self.set_scene(scene_x, scene_y)
+
+    def set_scene(self, scene_x, scene_y):
+        """设置 (或修改) 场景尺寸；地图在下一次 generate / lookup 时按新尺寸生成"""
+        self.scene_x = scene_x
+        self.scene_y = scene_y
+
+        self.nx = int(np.ceil(scene_x / self.resolution)) + 1
+        self.ny = int(np.ceil(scene_y / self.resolution)) + 1
+        self.field = None
+        self.seed = None
+        self._sqrt_eigenvalues = None
+
+        debug(f"ShadowingField initialized: {self.nx}x{self.ny} grid, "
+              f"resolution {self.resolution}m, d_corr {self.decorrelation_distance}m")
+
+    def _compute_sqrt_eigenvalues(self):
+        """循环嵌入协方差的特征值 (只依赖几何参数，可复用)"""
+        mx, my = 2 * self.nx, 2 * self.ny
+        lag_x = np.minimum(np.arange(mx), mx - np.arange(mx)) * self.resolution
+        lag_y = np.minimum(np.arange(my), my - np.arange(my)) * self.resolution
+        covariance = self.std ** 2 * np.exp(-np.hypot(lag_x[:, None], lag_y[None, :]) / self.decorrelation_distance)
+        eigenvalues = np.maximum(np.fft.fft2(covariance).real, 0.0)
+        return np.sqrt(eigenvalues / (mx * my))
+
+    def generate(self, seed=None):
+        """
+        生成一张新的阴影衰落地图
+
+        Args:
+            seed: 随机种子。相同种子得到相同地图，用于在 test() 中让所有模型面对同一信道实现
+        """
+        if self._sqrt_eigenvalues is None:
+            self._sqrt_eigenvalues = self._compute_sqrt_eigenvalues()
+
+        rng = np.random.default_rng(seed)
+        shape = self._sqrt_eigenvalues.shape
+        white_noise = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+        correlated = np.fft.fft2(self._sqrt_eigenvalues * white_noise)
+
+        self.field = correlated.real[:self.nx, :self.ny]
+        self.seed = seed
+        debug(f"ShadowingField generated (seed={seed}), empirical std {self.field.std():.2f}dB")
+        return self.field
+
+    def lookup(self, positions):
+        """
+        按位置查询地图值 (最近网格点)
+
+        Args:
+            positions: 位置数组, 形状 (..., 2)
+
+        Returns:
+            shadowing: 形状 (...) 的阴影衰落 (dB)
+        """
+        if self.field is None:
+            self.generate()
+
+        positions = np.asarray(positions, dtype=float)
+        ix = np.clip(np.rint(positions[..., 0] / self.resolution).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(np.rint(positions[..., 1] / self.resolution).astype(np.int64), 0, self.ny - 1)
+        return self.field[ix, iy]
+
+    def link_shadowing(self, pos_tx, pos_rx):
+        """
+        链路阴影衰落 (dB)，pos_tx 与 pos_rx 按 NumPy 规则广播
+        """
+        return (self.lookup(pos_tx) + self.lookup(pos_rx)) / np.sqrt(2.0)
+
+
+# 全局阴影衰落地图实例
+global_shadowing_field = ShadowingField()
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from Classes import Vehicle
+from logger import debug
+from Parameters import (
+    SCENE_SCALE_X, SCENE_SCALE_Y, BOUNDARY_POSITION_LIST, CROSS_POSITION_LIST,
+    RSU_SEGMENT_LIST, VEHICLE_OCCUR_PROB, VEHICLE_SPEED_M3S, MAX_SPAWN_PER_STEP
+)
+
+# 与 Vehicle.move 一致的道路容差 (米)
+PROXIMITY_TOLERANCE = 1.0
+# 方向 (dx, dy) -> 方向编号
+_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class VehicleFleet:
+    """
+    结构化数组 (Structure of Arrays) 形式的车队
+
+    位置、方向、ID、发射功率保存在连续的 NumPy 数组中，移动、越界移除与生车
+    都是整批数组操作。交叉路口的可选转向由路段连通关系预先生成查找表:
+    从某方向驶入路口时，可选出口为该路口连接的所有路段 (不允许掉头)，均匀随机选择。
+
+    Vehicle 对象列表 (self.vehicles) 与数组保持同步，供状态构建 / 图构建等消费者使用。
+    """
+
+    def __init__(self, spawn_points=BOUNDARY_POSITION_LIST, cross_positions=CROSS_POSITION_LIST,
+                 road_segments=RSU_SEGMENT_LIST, scene_x=SCENE_SCALE_X, scene_y=SCENE_SCALE_Y,
+                 max_spawn_per_step=MAX_SPAWN_PER_STEP):
+        self.vehicles = []
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros((0, 2))
+        self.directions = np.zeros((0, 2), dtype=np.int64)
+        self.power_W = np.zeros(0)
+        self.first_occur = np.zeros(0, dtype=bool)
+        self._powered = set()
+
+        self.set_road_network(spawn_points, cross_positions, road_segments, scene_x, scene_y, max_spawn_per_step)
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def set_road_network(self, spawn_points, cross_positions, road_segments, scene_x, scene_y,
+                         max_spawn_per_step=MAX_SPAWN_PER_STEP):
+        """设置 (或替换) 道路网络并重建转向查找表；切换路网时清空车队"""
+        self.scene_x = scene_x
+        self.scene_y = scene_y
+        self.max_spawn_per_step = int(max_spawn_per_step)
+        self.road_segments = np.array(road_segments, dtype=float).reshape(-1, 4)
+        self.cross_positions = np.array(cross_positions, dtype=float).reshape(-1, 2)
+
+        self.spawn_points = list(spawn_points)
+        self.spawn_directions = np.array([self._spawn_direction(p) for p in self.spawn_points],
+                                         dtype=np.int64).reshape(-1, 2)
+        self.turn_options, self.turn_counts = self._build_turn_table()
+        if self.vehicles:
+            self._keep(np.zeros(0, dtype=np.int64))
+
+        debug(f"VehicleFleet road network: {len(self.cross_positions)} crosses, "
+              f"{len(self.road_segments)} road segments, {len(self.spawn_points)} spawn points")
+
+    # ------------------------------------------------------------------
+    # 道路网络
+    # ------------------------------------------------------------------
+    def _spawn_direction(self, point):
+        """出生点所在路段 -> 指向较远端点的行驶方向"""
+        x, y = point
+        for x1, y1, x2, y2 in self.road_segments:
+            if min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2):
+                far = (x1, y1) if np.hypot(x1 - x, y1 - y) > np.hypot(x2 - x, y2 - y) else (x2, y2)
+                return int(np.sign(far[0] - x)), int(np.sign(far[1] - y))
+        raise ValueError(f"Spawn point {point} is not on any road segment")
+
+    def _build_turn_table(self):
+        """
+        转向查找表
+
+        Returns:
+            options: (C, 4, 3, 2) 路口 c、驶入方向 d 时的可选出口方向 (不足 3 个时填充)
+            counts: (C, 4) 可选出口数
+        """
+        num_cross = len(self.cross_positions)
+        options = np.zeros((num_cross, len(_DIRECTIONS), 3, 2), dtype=np.int64)
+        counts = np.zeros((num_cross, len(_DIRECTIONS)), dtype=np.int64)
+
+        for c, (cx, cy) in enumerate(self.cross_positions):
+            exits = []
+            for x1, y1, x2, y2 in self.road_segments:
+                if (x1, y1) == (cx, cy):
+                    exits.append((int(np.sign(x2 - cx)), int(np.sign(y2 - cy))))
+                elif (x2, y2) == (cx, cy):
+                    exits.append((int(np.sign(x1 - cx)), int(np.sign(y1 - cy))))
+
+            for d, (dx, dy) in enumerate(_DIRECTIONS):
+                allowed = [e for e in exits if e != (-dx, -dy)] or [(dx, dy)]  # 死路时保持直行
+                counts[c, d] = len(allowed)
+                options[c, d, :len(allowed)] = allowed
+        return options, counts
+
+    @staticmethod
+    def _direction_index(directions):
+        """(N, 2) 方向数组 -> (N,) 方向编号"""
+        lookup = np.full(9, -1, dtype=np.int64)
+        for d, (dx, dy) in enumerate(_DIRECTIONS):
+            lookup[(dx + 1) * 3 + (dy + 1)] = d
+        return lookup[(directions[:, 0] + 1) * 3 + (directions[:, 1] + 1)]
+
+    # ------------------------------------------------------------------
+    # 与 Vehicle 对象列表同步
+    # ------------------------------------------------------------------
+    def adopt(self, vehicle_list):
+        """
+        以外部的车辆列表为准重建数组 (例如 Main 中随机裁剪或清空列表之后)。
+        vehicle_list 就是 self.vehicles 时不做任何事。
+        """
+        if vehicle_list is self.vehicles:
+            return
+        self.vehicles = list(vehicle_list)
+        self.ids = np.array([v.id for v in self.vehicles], dtype=np.int64)
+        self.positions = np.array([v.curr_loc for v in self.vehicles], dtype=float).reshape(-1, 2)
+        self.directions = np.array([v.curr_dir for v in self.vehicles], dtype=np.int64).reshape(-1, 2)
+        self.power_W = np.array([getattr(v, 'power_W', 0.0) for v in self.vehicles], dtype=float)
+        self.first_occur = np.array([v.first_occur for v in self.vehicles], dtype=bool)
+        self._powered = set(np.flatnonzero(self.power_W > 0).tolist())
+        for index, vehicle in enumerate(self.vehicles):
+            vehicle.fleet_index = index
+
+    def _sync_vehicles(self, speed_m3s):
+        """把数组写回 Vehicle 对象 (位置 / 方向 / 下一步位置 / 索引)"""
+        next_positions = self.positions + self.directions * speed_m3s
+        for index, (vehicle, loc, direction, next_loc, first) in enumerate(zip(
+                self.vehicles, self.positions.tolist(), self.directions.tolist(),
+                next_positions.tolist(), self.first_occur.tolist())):
+            vehicle.curr_loc = (loc[0], loc[1])
+            vehicle.curr_dir = (direction[0], direction[1])
+            vehicle.next_loc = (next_loc[0], next_loc[1])
+            vehicle.first_occur = first
+            vehicle.fleet_index = index
+
+    # ------------------------------------------------------------------
+    # 移动 / 移除 / 生车
+    # ------------------------------------------------------------------
+    def step(self, vehicle_id, target_count, speed_m3s=VEHICLE_SPEED_M3S):
+        """
+        推进一步: 移动全部车辆 -> 移除越界车辆 -> 按目标数量生车
+
+        Returns:
+            更新后的最大车辆 ID
+        """
+        if len(self.vehicles):
+            self._move(speed_m3s)
+            self._remove_out_of_bounds()
+        vehicle_id = self._spawn(vehicle_id, target_count, speed_m3s)
+        self._sync_vehicles(speed_m3s)
+        return vehicle_id
+
+    def load_frame(self, ids, positions, directions, speed_m3s=VEHICLE_SPEED_M3S):
+        """
+        用外部给定的一帧 (例如轨迹回放) 替换车队状态
+
+        已在车队中的 ID 复用原 Vehicle 对象 (保留功率与通信历史)，只为新出现的 ID 创建对象；
+        不在本帧中的车辆被移除。
+
+        Args:
+            ids: (N,) 车辆 ID
+            positions: (N, 2) 位置
+            directions: (N, 2) 行驶方向 (-1 / 0 / 1)
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=np.int64).reshape(-1, 2)
+
+        # 新旧 ID 对齐: 在已排序的旧 ID 中二分查找
+        if len(self.ids):
+            sorter = np.argsort(self.ids, kind='stable')
+            slot = np.minimum(np.searchsorted(self.ids, ids, sorter=sorter), len(self.ids) - 1)
+            old_index = sorter[slot]
+            existing = self.ids[old_index] == ids
+            power_W = np.where(existing, self.power_W[old_index], 0.0)
+        else:
+            old_index = np.zeros(len(ids), dtype=np.int64)
+            existing = np.zeros(len(ids), dtype=bool)
+            power_W = np.zeros(len(ids))
+
+        vehicles = []
+        for vehicle_id, known, index, (x, y), (dx, dy) in zip(
+                ids.tolist(), existing.tolist(), old_index.tolist(), positions.tolist(), directions.tolist()):
+            vehicles.append(self.vehicles[index] if known else Vehicle(vehicle_id, x, y, dx, dy))
+
+        self.vehicles = vehicles
+        self.power_W = power_W
+        self.ids = ids
+        self.positions = positions.copy()
+        self.directions = directions.copy()
+        self.first_occur = ~existing
+        self._powered = set(np.flatnonzero(self.power_W > 0).tolist())
+        self._sync_vehicles(speed_m3s)
+
+    def _move(self, speed_m3s):
+        """
+        向量化移动 (与 Vehicle.move 语义一致):
+        距前方路口不超过一步的车辆在路口转向，剩余距离沿新方向行驶；其余车辆直行。
+        """
+        x, y = self.positions[:, 0:1], self.positions[:, 1:2]
+        dx, dy = self.directions[:, 0:1], self.directions[:, 1:2]
+        cx, cy = self.cross_positions[None, :, 0], self.cross_positions[None, :, 1]
+        gap_x, gap_y = np.abs(x - cx), np.abs(y - cy)
+
+        # (N, C): 是否在本步驶过路口 c (位于水平道路上时只检查水平方向)
+        on_horizontal_road = gap_y < PROXIMITY_TOLERANCE
+        on_vertical_road = gap_x < PROXIMITY_TOLERANCE
+        approach_h = on_horizontal_road & (gap_x <= speed_m3s) & (
+            ((dx == 1) & (x < cx)) | ((dx == -1) & (x > cx)))
+        approach_v = ~on_horizontal_road & on_vertical_road & (gap_y <= speed_m3s) & (
+            ((dy == 1) & (y < cy)) | ((dy == -1) & (y > cy)))
+        approach = approach_h | approach_v
+
+        turning = np.flatnonzero(approach.any(axis=1))
+        straight = np.flatnonzero(~approach.any(axis=1))
+
+        self.positions[straight] = self.positions[straight] + self.directions[straight] * speed_m3s
+
+        if len(turning):
+            cross_index = np.argmax(approach[turning], axis=1)
+            gap = np.where(approach_h[turning, cross_index], gap_x[turning, cross_index], gap_y[turning, cross_index])
+            incoming = self._direction_index(self.directions[turning])
+
+            choice = np.random.randint(0, self.turn_counts[cross_index, incoming])
+            new_directions = self.turn_options[cross_index, incoming, choice]
+
+            residue_distance = speed_m3s - gap
+            self.directions[turning] = new_directions
+            self.positions[turning] = self.cross_positions[cross_index] + residue_distance[:, None] * new_directions
+
+        self.first_occur[:] = False
+
+    def _remove_out_of_bounds(self):
+        keep = ((self.positions[:, 0] >= 0) & (self.positions[:, 0] <= self.scene_x) &
+                (self.positions[:, 1] >= 0) & (self.positions[:, 1] <= self.scene_y))
+        removed_count = len(keep) - int(np.count_nonzero(keep))
+        if removed_count:
+            self._keep(keep)
+            debug(f"Removed {removed_count} vehicles out of boundary.")
+
+    def _keep(self, keep):
+        """按布尔掩码 / 索引压缩所有数组与对象列表"""
+        keep_index = np.flatnonzero(keep) if np.asarray(keep).dtype == bool else np.asarray(keep)
+        self.vehicles = [self.vehicles[i] for i in keep_index.tolist()]
+        self.ids = self.ids[keep_index]
+        self.positions = self.positions[keep_index]
+        self.directions = self.directions[keep_index]
+        self.power_W = self.power_W[keep_index]
+        self.first_occur = self.first_occur[keep_index]
+        self._powered = set(np.flatnonzero(self.power_W > 0).tolist())
+
+    def _spawn(self, vehicle_id, target_count, speed_m3s):
+        current_count = len(self.vehicles)
+        if current_count >= target_count:
+            return vehicle_id
+        # 随机决定这一轮要不要生车 (避免每轮都生)
+        if np.random.uniform() > VEHICLE_OCCUR_PROB:
+            return vehicle_id
+
+        # 随机决定生几辆 (最多生 max_spawn_per_step 辆)
+        needed = target_count - current_count
+        num_to_spawn = np.random.randint(1, min(needed, self.max_spawn_per_step) + 1)
+        picks = np.random.randint(0, len(self.spawn_points), size=num_to_spawn)
+
+        new_ids = np.arange(vehicle_id + 1, vehicle_id + num_to_spawn + 1, dtype=np.int64)
+        new_positions = np.array([self.spawn_points[p] for p in picks], dtype=float).reshape(-1, 2)
+        new_directions = self.spawn_directions[picks]
+        for new_id, p, direction in zip(new_ids.tolist(), picks.tolist(), new_directions.tolist()):
+            x, y = self.spawn_points[p]
+            vehicle = Vehicle(new_id, x, y, direction[0], direction[1])
+            vehicle.fleet_index = len(self.vehicles)
+            self.vehicles.append(vehicle)
+
+        self.ids = np.concatenate([self.ids, new_ids])
+        self.positions = np.concatenate([self.positions, new_positions])
+        self.directions = np.concatenate([self.directions, new_directions])
+        self.power_W = np.concatenate([self.power_W, np.zeros(num_to_spawn)])
+        self.first_occur = np.concatenate([self.first_occur, np.ones(num_to_spawn, dtype=bool)])
+
+        debug(f"Spawned {num_to_spawn} vehicles. Total: {len(self.vehicles)}")
+        return vehicle_id + num_to_spawn
+
+    def prune(self, target_count):
+        """随机保留 target_count 辆车 (密度切换时使用)"""
+        if len(self.vehicles) <= target_count:
+            return
+        self._keep(np.sort(np.random.choice(len(self.vehicles), target_count, replace=False)))
+        for index, vehicle in enumerate(self.vehicles):
+            vehicle.fleet_index = index
+
+    # ------------------------------------------------------------------
+    # 发射功率
+    # ------------------------------------------------------------------
+    def reset_power(self):
+        """所有车辆静默 (只有之后被服务的车辆会被赋予功率)"""
+        for index in self._powered:
+            self.vehicles[index].power_W = 0.0
+        self.power_W[:] = 0.0
+        self._powered = set()
+
+    def set_power(self, vehicle, power_W):
+        self.power_W[vehicle.fleet_index] = power_W
+        vehicle.power_W = power_W
+        if power_W > 0:
+            self._powered.add(vehicle.fleet_index)
+
+    def interferer_arrays(self):
+        """功率 > 0 的车辆作为干扰源: {'tx_pos': (K, 2), 'power_W': (K,)}"""
+        active = self.power_W > 0
+        return {'tx_pos': self.positions[active], 'power_W': self.power_W[active]}
+
+
+# 全局车队实例
+global_vehicle_fleet = VehicleFleet()